@@ -1,8 +1,15 @@
 import os
 from flask import Flask, g, session
+from werkzeug.utils import import_string
 import db
 import auth
+import metrics
+import logs
+import fragments
+import assets
+import compression
 from routes import register_routes
+from commands import register_commands
 from config import Config
 from datetime import datetime
 
@@ -11,6 +18,15 @@ def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
     
+    # Logs are written by a background thread as JSON lines tagged with request ids
+    logs.init_app(app)
+    
+    # API responses are encoded by a faster JSON provider (orjson when installed)
+    app.json = import_string(app.config['JSON_PROVIDER'] or 'json_provider.RecordJSONProvider')(app)
+    
+    # Text responses are gzip/brotli compressed when COMPRESSION_ENABLED
+    compression.init_app(app)
+    
     # Custom template filters
     @app.template_filter('datetime')
     def format_datetime(value):
@@ -30,12 +46,17 @@ def create_app(config_class=Config):
             return value.replace('\n', '<br>')
         return ''
     
-    # Initialize database at application startup
-    with app.app_context():
-        try:
-            db.init_db()
-        except Exception as e:
-            app.logger.error(f"Failed to initialize database: {str(e)}")
+    # Compiled templates are cached on disk; note cards are cached once rendered
+    fragments.init_app(app)
+    
+    # Bundled, content-hashed static files built by `flask assets build`
+    assets.init_app(app)
+    
+    # Query counts and timings per request (Server-Timing, /admin/metrics)
+    metrics.init_app(app)
+    
+    # Schema changes are applied with `flask db upgrade`, not at startup
+    register_commands(app)
     
     # Register database close function
     @app.teardown_appcontext
@@ -0,0 +1,282 @@
+"""ASGI entry point serving NoteSmart on an asyncio MySQL driver.
+
+Run it with an ASGI server, e.g. ``uvicorn asgi:app --workers 4``.
+
+The read endpoints that clients poll (GET /api/notes, /api/notes/<id> and
+/api/categories) are served natively on the event loop through aiomysql and
+an async connection pool, so a single process can keep thousands of such
+requests waiting on MySQL without a thread each. Every other route that
+register_routes defines is handed to the Flask app through asgiref's WSGI
+adapter and behaves exactly as under the WSGI server. The native handlers
+accept bearer access tokens as well as the session cookie.
+
+Needs the optional aiomysql and asgiref packages.
+"""
+import asyncio
+import re
+from datetime import datetime
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qs
+from werkzeug.http import parse_etags, parse_date, http_date
+
+try:
+    import aiomysql
+    from asgiref.wsgi import WsgiToAsgi
+except ImportError:
+    raise RuntimeError("The ASGI entry point requires the aiomysql and asgiref packages")
+
+import db
+import tokens
+from app import app as flask_app
+from routes import listing_etag, note_etag, parse_note_fields, select_fields
+
+NOTE_PATH = re.compile(r'^/api/notes/(\d+)$')
+
+class AsyncNoteSmart:
+    """ASGI application wrapping a NoteSmart Flask app."""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+        self.pool = None
+        self._pool_lock = asyncio.Lock()
+        self._sessions = flask_app.session_interface.get_signing_serializer(flask_app)
+        self._session_max_age = int(flask_app.permanent_session_lifetime.total_seconds())
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+
+        if scope['type'] == 'http' and scope['method'] == 'GET':
+            path = scope['path']
+            match = NOTE_PATH.match(path)
+            if path == '/api/notes':
+                await self.authenticated(scope, send, self.list_notes)
+                return
+            if path == '/api/categories':
+                await self.authenticated(scope, send, self.list_categories)
+                return
+            if match:
+                await self.authenticated(scope, send, self.get_note, int(match.group(1)))
+                return
+
+        await self.wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await self.get_pool()
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self.pool is not None:
+                    self.pool.close()
+                    await self.pool.wait_closed()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def get_pool(self):
+        """Get the aiomysql pool, creating it on first use."""
+        if self.pool is None:
+            async with self._pool_lock:
+                if self.pool is None:
+                    config = self.flask_app.config
+                    self.pool = await aiomysql.create_pool(
+                        host=config['DB_HOST'],
+                        port=config['DB_PORT'],
+                        user=config['DB_USER'],
+                        password=config['DB_PASSWORD'],
+                        db=config['DB_NAME'],
+                        charset='utf8mb4',
+                        autocommit=True,
+                        minsize=config['ASYNC_DB_POOL_MIN'],
+                        maxsize=config['ASYNC_DB_POOL_MAX'],
+                        pool_recycle=int(config['DB_POOL_MAX_IDLE'])
+                    )
+        return self.pool
+
+    async def fetch(self, query, params, one=False, records=False):
+        """Run a query; rows are dicts, or db.Record tuples with records=True."""
+        pool = await self.get_pool()
+        async with pool.acquire() as conn:
+            async with conn.cursor(aiomysql.Cursor if records else aiomysql.DictCursor) as cursor:
+                await cursor.execute(query, params)
+                if one:
+                    return await cursor.fetchone()
+                rows = await cursor.fetchall()
+                return db.as_records(cursor.description, rows) if records else rows
+
+    def session_user_id(self, scope):
+        """Read user_id from the Flask session cookie, or None."""
+        cookie_name = self.flask_app.config['SESSION_COOKIE_NAME']
+        for name, value in scope['headers']:
+            if name == b'cookie':
+                morsel = SimpleCookie(value.decode('latin-1')).get(cookie_name)
+                if morsel is None:
+                    continue
+                try:
+                    session = self._sessions.loads(morsel.value, max_age=self._session_max_age)
+                except Exception:
+                    return None
+                return session.get('user_id')
+        return None
+
+    async def token_user_id(self, token):
+        """Verify a bearer access token; returns its user id or raises TokenError."""
+        with self.flask_app.app_context():
+            revocations = tokens.get_revocation_list()
+        # Reload a stale revocation list here, so that load_token() does not
+        # block the event loop with a synchronous query
+        if revocations.ttl and revocations.stale():
+            rows = await self.fetch('SELECT jti FROM revoked_token WHERE expires_at > %s',
+                                    (datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'),))
+            revocations.replace(row['jti'] for row in rows)
+        with self.flask_app.app_context():
+            return tokens.load_token(token, tokens.ACCESS)['uid']
+
+    async def authenticated(self, scope, send, handler, *args):
+        """Run handler for the bearer token's or session's user, like auth.api_auth_required."""
+        header = dict(scope['headers']).get(b'authorization', b'').decode('latin-1')
+        if header[:7].lower() == 'bearer ':
+            try:
+                user_id = await self.token_user_id(header[7:].strip())
+            except tokens.TokenError as e:
+                await self.send_json(send, {'error': str(e)}, 401, headers=[(b'www-authenticate', b'Bearer')])
+                return
+        else:
+            user_id = self.session_user_id(scope)
+        if user_id is None:
+            await self.send_json(send, {'error': 'Authentication required'}, 401,
+                                 headers=[(b'www-authenticate', b'Bearer')])
+            return
+        await handler(scope, send, user_id, *args)
+
+    async def user_version(self, user_id):
+        row = await self.fetch('SELECT data_version, data_modified FROM user WHERE id = %s',
+                               (user_id,), one=True)
+        if not row:
+            return 0, None
+        return row['data_version'], row['data_modified']
+
+    async def list_notes(self, scope, send, user_id):
+        # Blank values are kept, as in request.args: ?cursor= asks for the first page
+        query = parse_qs(scope['query_string'].decode('latin-1'), keep_blank_values=True)
+        args = {key: values[0] for key, values in query.items()}
+        category_id = args.get('category')
+        category_id = int(category_id) if category_id and category_id.isdigit() else None
+        search = args.get('search')
+        limit = args.get('limit')
+        cursor = args.get('cursor')
+
+        try:
+            full, fields = parse_note_fields(args.get('fields'))
+        except ValueError as e:
+            await self.send_json(send, {'error': str(e)}, 400)
+            return
+
+        version, last_modified = await self.user_version(user_id)
+        etag = listing_etag('notes', user_id, version, scope['query_string'])
+        if self.not_modified(scope, etag, last_modified):
+            await self.send_not_modified(send, etag, last_modified)
+            return
+
+        paged = limit is not None or cursor is not None
+        if paged:
+            if limit is None:
+                limit = self.flask_app.config['NOTES_PAGE_SIZE']
+            elif limit.isdigit() and int(limit) > 0:
+                limit = min(int(limit), self.flask_app.config['API_PAGE_MAX'])
+            else:
+                await self.send_json(send, {'error': 'limit must be a positive integer'}, 400)
+                return
+
+        # Query building reads app config, so it needs an app context
+        with self.flask_app.app_context():
+            try:
+                query, params, sort_key = db._notes_query(user_id, category_id, search, cursor,
+                                                          limit + 1 if paged else None, full)
+            except ValueError:
+                await self.send_json(send, {'error': 'Invalid cursor'}, 400)
+                return
+
+        notes = await self.fetch(query, params, records=True)
+        if not paged:
+            await self.send_json(send, select_fields(notes, fields), etag=etag, last_modified=last_modified)
+            return
+
+        next_cursor = None
+        if len(notes) > limit:
+            notes = notes[:limit]
+            next_cursor = db.encode_cursor([notes[-1][key] for key in sort_key])
+        await self.send_json(send, {'notes': select_fields(notes, fields), 'next_cursor': next_cursor},
+                             etag=etag, last_modified=last_modified)
+
+    async def get_note(self, scope, send, user_id, note_id):
+        note = await self.fetch(
+            f'''SELECT n.*, {db.IMPORTANCE_LABEL_SQL} AS importance, c.name as category_name
+               FROM note n
+               LEFT JOIN category c ON n.category_id = c.id
+               WHERE n.id = %s AND n.user_id = %s''',
+            (note_id, user_id), one=True
+        )
+        if not note:
+            await self.send_json(send, {'error': 'Note not found'}, 404)
+            return
+
+        etag = note_etag(note)
+        if self.not_modified(scope, etag):
+            await self.send_not_modified(send, etag)
+            return
+        await self.send_json(send, note, etag=etag)
+
+    async def list_categories(self, scope, send, user_id):
+        version, last_modified = await self.user_version(user_id)
+        etag = listing_etag('categories', user_id, version, scope['query_string'])
+        if self.not_modified(scope, etag, last_modified):
+            await self.send_not_modified(send, etag, last_modified)
+            return
+
+        categories = await self.fetch('SELECT * FROM category WHERE user_id = %s ORDER BY name', (user_id,))
+        await self.send_json(send, categories, etag=etag, last_modified=last_modified)
+
+    @staticmethod
+    def not_modified(scope, etag, last_modified=None):
+        """Mirror of routes.not_modified for raw ASGI request headers."""
+        headers = dict(scope['headers'])
+        if_none_match = headers.get(b'if-none-match')
+        if if_none_match:
+            return parse_etags(if_none_match.decode('latin-1')).contains(etag)
+        if_modified_since = headers.get(b'if-modified-since')
+        if if_modified_since and last_modified:
+            since = parse_date(if_modified_since.decode('latin-1'))
+            return since is not None and last_modified <= since.replace(tzinfo=None)
+        return False
+
+    @staticmethod
+    def validator_headers(etag, last_modified):
+        headers = [(b'etag', f'"{etag}"'.encode('latin-1')),
+                   (b'cache-control', b'private, no-cache')]
+        if last_modified:
+            headers.append((b'last-modified', http_date(last_modified).encode('latin-1')))
+        return headers
+
+    async def send_not_modified(self, send, etag, last_modified=None):
+        await send({'type': 'http.response.start', 'status': 304,
+                    'headers': self.validator_headers(etag, last_modified)})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def send_json(self, send, obj, status=200, etag=None, last_modified=None, headers=None):
+        body = (self.flask_app.json.dumps(obj) + '\n').encode('utf-8')
+        headers = [(b'content-type', b'application/json'),
+                   (b'content-length', str(len(body)).encode('latin-1'))] + (headers or [])
+        if etag:
+            headers.extend(self.validator_headers(etag, last_modified))
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+app = AsyncNoteSmart(flask_app)
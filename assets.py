@@ -0,0 +1,319 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+from flask import current_app, request, url_for, send_file, make_response, abort
+import logging
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# Bundles served under /assets/, each built from files in static/ in order.
+# A page includes one bundle per purpose rather than each source file.
+BUNDLES = {
+    'app.css': ['css/style.css'],
+    'app.js': ['js/animations.js'],
+    'dashboard.js': ['js/live.js', 'js/load_more.js'],
+    'todos.js': ['js/live.js', 'js/load_more.js', 'js/todos.js'],
+    'tasks.js': ['js/script.js'],
+}
+
+# Built files are named after their content, so they never change
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# Only kept when at least this much smaller than the uncompressed file
+MIN_COMPRESSION_SAVING = 0.1
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_CSS_PUNCTUATION_RE = re.compile(r' ?([{};,>]) ?')
+_JS_LINE_BREAK_RE = re.compile(r'[ \t]*(?:\r?\n[ \t]*)+')
+_JS_SPACES_RE = re.compile(r'[ \t]+')
+
+# Characters and keywords after which a '/' starts a regular expression rather than a division
+_JS_REGEX_PRECEDERS = set('(,=:[!&|?{};+-*%<>~^')
+_JS_REGEX_KEYWORDS = frozenset(['return', 'typeof', 'case', 'in', 'of', 'void', 'delete', 'throw'])
+
+def _string_end(source, start):
+    """Index just past the quoted string or template literal starting at start."""
+    quote = source[start]
+    i = start + 1
+    while i < len(source):
+        c = source[i]
+        if c == '\\':
+            i += 2
+            continue
+        if c == quote:
+            return i + 1
+        if quote == '`' and source.startswith('${', i):
+            i = _expression_end(source, i + 2)
+            continue
+        i += 1
+    return len(source)
+
+def _expression_end(source, start):
+    """Index just past the '}' closing a template literal's ${...} expression."""
+    depth = 1
+    i = start
+    while i < len(source):
+        c = source[i]
+        if c in '\'"`':
+            i = _string_end(source, i)
+            continue
+        if c == '{':
+            depth += 1
+        elif c == '}':
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return len(source)
+
+def _regex_end(source, start):
+    """Index just past the regular expression literal (and flags) starting at start."""
+    i = start + 1
+    in_class = False
+    while i < len(source) and source[i] != '\n':
+        c = source[i]
+        if c == '\\':
+            i += 2
+            continue
+        if c == '[':
+            in_class = True
+        elif c == ']':
+            in_class = False
+        elif c == '/' and not in_class:
+            i += 1
+            while i < len(source) and source[i].isalpha():
+                i += 1
+            return i
+        i += 1
+    return i
+
+def _starts_regex(source, i, last):
+    """Whether the '/' at i starts a regular expression, given the code's last non-space character."""
+    if not last or last in _JS_REGEX_PRECEDERS:
+        return True
+    # After a keyword, unless it is a property name such as x.return
+    end = i
+    while source[end - 1].isspace():
+        end -= 1
+    start = end
+    while start > 0 and (source[start - 1].isalnum() or source[start - 1] in '_$'):
+        start -= 1
+    return source[start:end] in _JS_REGEX_KEYWORDS and not source[:start].rstrip().endswith('.')
+
+def _split_js(source):
+    """Split JavaScript into (is_literal, text) pieces, dropping comments."""
+    pieces = []
+    code_start = 0
+    last = ''
+    i = 0
+    while i < len(source):
+        c = source[i]
+        if c in '\'"`' or (c == '/' and not source.startswith(('//', '/*'), i) and
+                           _starts_regex(source, i, last)):
+            end = _string_end(source, i) if c != '/' else _regex_end(source, i)
+            pieces.append((False, source[code_start:i]))
+            pieces.append((True, source[i:end]))
+            code_start = i = end
+            last = 'a'
+            continue
+        if source.startswith('//', i):
+            end = source.find('\n', i)
+            end = len(source) if end == -1 else end
+            pieces.append((False, source[code_start:i]))
+            code_start = i = end
+            continue
+        if source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            end = len(source) if end == -1 else end + 2
+            pieces.append((False, source[code_start:i]))
+            # Keep a line break the comment spanned, for semicolon insertion
+            pieces.append((False, '\n' if '\n' in source[i:end] else ' '))
+            code_start = i = end
+            continue
+        if not c.isspace():
+            last = c
+        i += 1
+    pieces.append((False, source[code_start:]))
+    return pieces
+
+def minify_js(source):
+    """Strip comments, indentation and blank lines from JavaScript.
+
+    Line breaks are kept, so automatic semicolon insertion works as before;
+    strings, template literals and regular expressions are left untouched.
+    """
+    out = []
+    code = []
+    for is_literal, text in _split_js(source) + [(True, '')]:
+        if not is_literal:
+            code.append(text)
+            continue
+        out.append(_JS_SPACES_RE.sub(' ', _JS_LINE_BREAK_RE.sub('\n', ''.join(code))))
+        out.append(text)
+        code.clear()
+    return ''.join(out).strip() + '\n'
+
+def minify_css(source):
+    """Strip comments and unneeded whitespace from CSS, leaving strings untouched."""
+    out = []
+    code = []
+    i = 0
+    code_start = 0
+
+    def flush_code():
+        text = _WHITESPACE_RE.sub(' ', ''.join(code))
+        out.append(_CSS_PUNCTUATION_RE.sub(r'\1', text).replace(';}', '}'))
+        code.clear()
+
+    while i < len(source):
+        if source[i] in '\'"':
+            end = _string_end(source, i)
+            code.append(source[code_start:i])
+            flush_code()
+            out.append(source[i:end])
+            code_start = i = end
+        elif source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            end = len(source) if end == -1 else end + 2
+            code.append(source[code_start:i] + ' ')
+            code_start = i = end
+        else:
+            i += 1
+    code.append(source[code_start:])
+    flush_code()
+    return ''.join(out).strip() + '\n'
+
+def bundle_source(name, static_folder):
+    """Concatenate a bundle's source files, unminified."""
+    sources = []
+    for path in BUNDLES[name]:
+        with open(os.path.join(static_folder, path), encoding='utf-8') as f:
+            sources.append(f.read())
+    # A statement left open at the end of one script must not run into the next
+    separator = '\n;\n' if name.endswith('.js') else '\n'
+    return separator.join(sources)
+
+def hashed_name(name, content):
+    """Name a built file after its content, e.g. app.css -> app.1a2b3c4d5e.css."""
+    digest = hashlib.sha256(content).hexdigest()[:10]
+    base, ext = os.path.splitext(name)
+    return f'{base}.{digest}{ext}'
+
+def _compressed(content):
+    """Yield (encoding, file suffix, data) for each worthwhile compressed variant."""
+    variants = [('gzip', '.gz', gzip.compress(content, 9, mtime=0))]
+    if brotli is not None:
+        variants.append(('br', '.br', brotli.compress(content, quality=11)))
+    for encoding, suffix, data in variants:
+        if len(data) <= len(content) * (1 - MIN_COMPRESSION_SAVING):
+            yield encoding, suffix, data
+
+def build(static_folder, dist_folder):
+    """Build every bundle into dist_folder and write its manifest.json.
+
+    Each bundle is minified, named after its content hash and stored next
+    to gzip (and, with the brotli package, brotli) compressed copies.
+    Returns the manifest: bundle name -> {'file', 'size', 'encodings'}.
+    """
+    if os.path.isdir(dist_folder):
+        shutil.rmtree(dist_folder)
+    os.makedirs(dist_folder)
+
+    manifest = {}
+    for name in BUNDLES:
+        source = bundle_source(name, static_folder)
+        minified = minify_js(source) if name.endswith('.js') else minify_css(source)
+        content = minified.encode('utf-8')
+        filename = hashed_name(name, content)
+        with open(os.path.join(dist_folder, filename), 'wb') as f:
+            f.write(content)
+        encodings = {}
+        for encoding, suffix, data in _compressed(content):
+            with open(os.path.join(dist_folder, filename + suffix), 'wb') as f:
+                f.write(data)
+            encodings[encoding] = len(data)
+        manifest[name] = {'file': filename, 'size': len(content), 'source_size': len(source.encode('utf-8')),
+                          'encodings': encodings}
+
+    with open(os.path.join(dist_folder, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+def dist_folder(app):
+    return os.path.join(app.static_folder, 'dist')
+
+def get_manifest():
+    """Get the built assets' manifest, or {} before `flask assets build` has run."""
+    manifest = current_app.extensions.get('assets_manifest')
+    if manifest is None:
+        path = os.path.join(dist_folder(current_app), 'manifest.json')
+        try:
+            with open(path, encoding='utf-8') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            logger.debug("No asset manifest at %s; serving unbuilt bundles", path)
+            manifest = {}
+        manifest = current_app.extensions.setdefault('assets_manifest', manifest)
+        current_app.extensions.setdefault('assets_files', {entry['file']: entry for entry in manifest.values()})
+    return manifest
+
+def asset_url(name, **values):
+    """URL of a bundle, like url_for('asset', filename=name, **values).
+
+    Once built, the URL names the content-hashed file, so it changes
+    whenever the bundle does.
+    """
+    entry = get_manifest().get(name)
+    return url_for('asset', filename=entry['file'] if entry else name, **values)
+
+def _accepted(encoding):
+    return request.accept_encodings[encoding] > 0
+
+def serve_asset(filename):
+    """Serve a built bundle, compressed if the client accepts it, as immutable.
+
+    Before a build, bundle names are served from their unminified sources
+    and revalidated on every request, for development.
+    """
+    get_manifest()
+    entry = current_app.extensions['assets_files'].get(filename)
+    if entry is None:
+        if filename not in BUNDLES:
+            abort(404)
+        response = make_response(bundle_source(filename, current_app.static_folder))
+        response.mimetype = mimetypes.guess_type(filename)[0]
+        response.add_etag()
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+
+    path = os.path.join(dist_folder(current_app), filename)
+    encoding = None
+    for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if candidate in entry['encodings'] and _accepted(candidate):
+            encoding = candidate
+            path += suffix
+            break
+
+    response = send_file(path, mimetype=mimetypes.guess_type(filename)[0], max_age=IMMUTABLE_MAX_AGE,
+                         conditional=True)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+def init_app(app):
+    """Serve bundles at /assets/ and make asset_url() available to templates."""
+    app.add_url_rule('/assets/<path:filename>', 'asset', serve_asset)
+    app.add_template_global(asset_url)
@@ -1,13 +1,18 @@
-from werkzeug.security import generate_password_hash, check_password_hash
-from flask import session, redirect, url_for, flash, request
+from flask import session, redirect, url_for, flash, request, g, current_app, jsonify
 from functools import wraps
+from cache import TTLCache
+from passwords import PasswordHasher, HasherBusy
+from ratelimit import TokenBucketLimiter
 import db
+import tokens
+import threading
 import logging
 
 # Setup logging
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+_lock = threading.Lock()
+
 # Simple user class
 class User:
     def __init__(self, id, username, email):
@@ -16,6 +21,110 @@ class User:
         self.email = email
         self.is_authenticated = True
 
+# User lookup caching
+def _shared_user_cache():
+    """Get the process-wide User cache, or None when it is disabled."""
+    if not current_app.config['USER_CACHE_ENABLED']:
+        return None
+    cache = current_app.extensions.get('user_cache')
+    if cache is None:
+        cache = current_app.extensions.setdefault('user_cache', TTLCache(
+            maxsize=current_app.config['USER_CACHE_SIZE'],
+            ttl=current_app.config['USER_CACHE_TTL']
+        ))
+    return cache
+
+def user_cache_stats():
+    """Return the User cache's counters (see TTLCache.stats), or None when it is disabled."""
+    cache = _shared_user_cache()
+    return cache.stats() if cache is not None else None
+
+def get_user(user_id):
+    """Load a User by id, querying the database at most once per request."""
+    request_cache = g.setdefault('_users', {})
+    if user_id in request_cache:
+        return request_cache[user_id]
+    
+    shared_cache = _shared_user_cache()
+    user = shared_cache.get(user_id) if shared_cache is not None else None
+    if user is None:
+        user_data = db.get_user_by_id(user_id)
+        if user_data:
+            user = User(user_data['id'], user_data['username'], user_data['email'])
+            if shared_cache is not None:
+                shared_cache.set(user_id, user)
+    
+    request_cache[user_id] = user
+    return user
+
+def invalidate_user(user_id):
+    """Drop a user from the caches; call this after changing the user's row."""
+    g.get('_users', {}).pop(user_id, None)
+    shared_cache = _shared_user_cache()
+    if shared_cache is not None:
+        shared_cache.delete(user_id)
+
+# Password hashing and login throttling
+def _password_hasher():
+    """Get the app's PasswordHasher, creating it on first use."""
+    hasher = current_app.extensions.get('password_hasher')
+    if hasher is None:
+        with _lock:
+            hasher = current_app.extensions.get('password_hasher')
+            if hasher is None:
+                config = current_app.config
+                hasher = PasswordHasher(
+                    method=config['PASSWORD_HASH_METHOD'],
+                    workers=config['PASSWORD_HASH_WORKERS'],
+                    max_pending=config['PASSWORD_HASH_QUEUE'],
+                    timeout=config['PASSWORD_HASH_TIMEOUT']
+                )
+                current_app.extensions['password_hasher'] = hasher
+    return hasher
+
+def _login_limiter(kind):
+    """Get the 'ip' or 'username' login TokenBucketLimiter, or None when disabled."""
+    config = current_app.config
+    rate = config[f'LOGIN_RATE_PER_{kind.upper()}']
+    if not rate:
+        return None
+    name = f'login_limiter_{kind}'
+    limiter = current_app.extensions.get(name)
+    if limiter is None:
+        limiter = current_app.extensions.setdefault(name, TokenBucketLimiter(
+            rate=rate / 60.0,
+            burst=config[f'LOGIN_BURST_PER_{kind.upper()}']
+        ))
+    return limiter
+
+def throttle_attempt(username=None):
+    """Count a login or registration attempt from this client (and for username).
+
+    Returns 0 if the attempt may go ahead, otherwise the seconds to wait.
+    """
+    retry_after = 0
+    ip_limiter = _login_limiter('ip')
+    if ip_limiter is not None:
+        retry_after = ip_limiter.allow(request.remote_addr)
+    username_limiter = _login_limiter('username')
+    if username and username_limiter is not None:
+        retry_after = max(retry_after, username_limiter.allow(username.lower()))
+    if retry_after:
+        logger.warning("Throttled attempt from %s (username: %s)", request.remote_addr, username)
+    return retry_after
+
+def _upgrade_password_hash(user, password):
+    """Re-hash a just-verified password if its hash uses outdated parameters."""
+    hasher = _password_hasher()
+    try:
+        if hasher.needs_rehash(user['password_hash']):
+            db.update_user_password_hash(user['id'], hasher.hash(password))
+            invalidate_user(user['id'])
+            logger.debug("Rehashed password of user %s with %s", user['id'], hasher.method)
+    except Exception as e:
+        # The login itself succeeded; try again next time
+        logger.warning("Could not rehash password of user %s: %s", user['id'], e)
+
 # Core authentication functions
 def login_required(f):
     """Decorator to require login for a view."""
@@ -27,79 +136,131 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def is_admin(user):
+    """Check if a user is listed in ADMIN_USERNAMES."""
+    return user is not None and user.username in current_app.config['ADMIN_USERNAMES']
+
 def current_user():
     """Get the current logged-in user or None."""
     if 'user_id' in session:
-        user_data = db.get_user_by_id(session['user_id'])
-        if user_data:
-            return User(user_data['id'], user_data['username'], user_data['email'])
+        return get_user(session['user_id'])
     return None
 
 def is_authenticated():
     """Check if the user is authenticated."""
     is_auth = 'user_id' in session
     user_id = session.get('user_id')
-    print(f"is_authenticated check: {is_auth}, user_id: {user_id}")
     
     if is_auth and user_id:
         # Verify this user actually exists
-        user = db.get_user_by_id(user_id)
+        user = get_user(user_id)
         if not user:
-            print(f"User ID {user_id} not found in database")
+            logger.debug("User ID %s not found in database", user_id)
             return False
     return is_auth
 
-def login_user(username, password):
-    """Authenticate and log in a user."""
+def api_auth_required(f):
+    """Decorator for API views: requires a bearer access token or a login session.
+    
+    Sets g.user_id. Bearer tokens are checked by signature alone (plus the
+    cached revocation list), without a database query.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        header = request.headers.get('Authorization', '')
+        if header[:7].lower() == 'bearer ':
+            try:
+                payload = tokens.load_token(header[7:].strip(), tokens.ACCESS)
+            except tokens.TokenError as e:
+                return _api_unauthorized(str(e))
+            g.user_id = payload['uid']
+        elif 'user_id' in session:
+            g.user_id = session['user_id']
+        else:
+            return _api_unauthorized('Authentication required')
+        return f(*args, **kwargs)
+    return decorated_function
+
+def _api_unauthorized(message):
+    return jsonify({'error': message}), 401, {'WWW-Authenticate': 'Bearer'}
+
+def authenticate(username, password):
+    """Check a username and password without logging in.
+    
+    Returns (True, user row) or (False, error message).
+    """
     user = db.get_user_by_username(username)
     
     if not user:
-        logger.debug(f"Login failed: User {username} not found")
+        logger.debug("Login failed: User %s not found", username)
         return False, "Invalid username or password"
     
-    if not check_password_hash(user['password_hash'], password):
-        logger.debug(f"Login failed: Invalid password for {username}")
+    try:
+        valid = _password_hasher().verify(user['password_hash'], password)
+    except HasherBusy:
+        logger.warning("Login rejected: password hasher busy (%s)", username)
+        return False, "The server is busy, please try again in a moment"
+    
+    if not valid:
+        logger.debug("Login failed: Invalid password for %s", username)
         return False, "Invalid username or password"
     
+    _upgrade_password_hash(user, password)
+    username_limiter = _login_limiter('username')
+    if username_limiter is not None:
+        username_limiter.reset(username.lower())
+    return True, user
+
+def login_user(username, password):
+    """Authenticate and log in a user."""
+    success, user = authenticate(username, password)
+    if not success:
+        return False, user
+    
     # Store user info in session
     session.clear()
     session['user_id'] = user['id']
     session['username'] = user['username']
     
-    logger.debug(f"User logged in: {username} (ID: {user['id']})")
+    logger.debug("User logged in: %s (ID: %s)", username, user['id'])
     return True, User(user['id'], user['username'], user['email'])
 
 def logout_user():
     """Log out the current user."""
-    logger.debug(f"User logged out: {session.get('username', 'Unknown')}")
+    logger.debug("User logged out: %s", session.get('username', 'Unknown'))
     session.clear()
 
 def register_user(username, email, password):
     """Register a new user."""
     # Check if username already exists
     if db.get_user_by_username(username):
-        logger.debug(f"Registration failed: Username {username} already exists")
+        logger.debug("Registration failed: Username %s already exists", username)
         return False, "Username already exists"
     
     # Check if email already exists
     if db.get_user_by_email(email):
-        logger.debug(f"Registration failed: Email {email} already exists")
+        logger.debug("Registration failed: Email %s already exists", email)
         return False, "Email already exists"
     
     # Hash the password and create user
-    password_hash = generate_password_hash(password)
+    try:
+        password_hash = _password_hasher().hash(password)
+    except HasherBusy:
+        logger.warning("Registration rejected: password hasher busy (%s)", username)
+        return False, "The server is busy, please try again in a moment"
     
     try:
         # Create the user
         user_id = db.create_user(username, email, password_hash)
-        logger.debug(f"User registered: {username} (ID: {user_id})")
+        invalidate_user(user_id)
+        logger.debug("User registered: %s (ID: %s)", username, user_id)
         
         # Create default categories
         db.create_category("Work", user_id)
         db.create_category("Personal", user_id)
-        logger.debug(f"Created default categories for user {user_id}")
+        logger.debug("Created default categories for user %s", user_id)
         
         return True, user_id
     except Exception as e:
-        logger.error(f"Error registering user: {str(e)}")
+        logger.error("Error registering user: %s", e)
         return False, "An error occurred during registration"
\ No newline at end of file
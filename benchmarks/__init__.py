@@ -0,0 +1,11 @@
+"""Benchmarks for NoteSmart. Each module is runnable with ``python -m benchmarks.<name>``.
+
+    seed         create bench_<notes> users with synthetic categories and notes
+    queries      microbenchmark every db.py function at several scales
+    http_load    concurrent load on /dashboard, /todos and the notes API
+    search       FULLTEXT search against the LIKE scan it replaced
+    asgi_vs_wsgi compare the two serving modes under API polling
+
+All of them run against the MySQL database configured in .env; point it at
+a local or disposable database.
+"""
@@ -0,0 +1,65 @@
+"""Compare the WSGI and ASGI serving modes under concurrent API polling.
+
+Usage:
+    gunicorn -w 4 --threads 8 -b 127.0.0.1:8000 app:app
+    uvicorn asgi:app --workers 4 --port 8001
+    python -m benchmarks.asgi_vs_wsgi --wsgi http://127.0.0.1:8000 --asgi http://127.0.0.1:8001
+
+Both servers must use the same database. A benchmark user is registered
+through the first server and its notes are topped up to --notes; each
+server is then polled with GET /api/notes pages, single notes and the
+category list at every --concurrency level.
+"""
+import argparse
+import asyncio
+import db
+from app import app
+from benchmarks.common import seed_notes
+from benchmarks.load import run_load, login, register
+
+USERNAME = 'bench_asgi'
+PASSWORD = 'bench-password'
+
+def polling_requests(cookie, note_ids):
+    headers = {'Cookie': cookie}
+
+    def next_request(worker, i):
+        kind = i % 4
+        if kind == 0:
+            return 'GET', '/api/notes?limit=50&fields=slim', headers, b''
+        if kind == 1:
+            return 'GET', '/api/categories', headers, b''
+        note_id = note_ids[(worker * 31 + i) % len(note_ids)]
+        return 'GET', f'/api/notes/{note_id}', headers, b''
+    return next_request
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--wsgi', required=True, help='Base URL of the WSGI server')
+    parser.add_argument('--asgi', required=True, help='Base URL of the ASGI server')
+    parser.add_argument('--notes', type=int, default=10000)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[50, 200, 1000])
+    parser.add_argument('--duration', type=float, default=10.0)
+    args = parser.parse_args()
+
+    register(args.wsgi, USERNAME, PASSWORD)
+    with app.app_context():
+        conn = db.get_db()
+        user_id = db.get_user_by_username(USERNAME)['id']
+        seed_notes(conn, user_id, args.notes)
+        with conn.cursor() as cursor:
+            cursor.execute('SELECT id FROM note WHERE user_id = %s ORDER BY id LIMIT 1000', (user_id,))
+            note_ids = [row['id'] for row in cursor.fetchall()]
+
+    print(f"{'mode':<6} {'clients':>7} {'requests':>9} {'errors':>7} {'req/s':>9} "
+          f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for mode, base_url in (('wsgi', args.wsgi), ('asgi', args.asgi)):
+        next_request = polling_requests(login(base_url, USERNAME, PASSWORD), note_ids)
+        for concurrency in args.concurrency:
+            result = asyncio.run(run_load(base_url, next_request, concurrency, args.duration))
+            print(f"{mode:<6} {concurrency:>7} {result['requests']:>9} {result['errors']:>7} "
+                  f"{result['throughput']:>9.1f} {result.get('p50', 0):>9.2f} "
+                  f"{result.get('p95', 0):>9.2f} {result.get('p99', 0):>9.2f}")
+
+if __name__ == '__main__':
+    main()
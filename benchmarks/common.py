@@ -0,0 +1,133 @@
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+from werkzeug.security import generate_password_hash
+import migrations
+
+# Small vocabulary so that searches hit a realistic share of notes
+WORDS = (
+    'meeting agenda project budget review design draft notes idea plan '
+    'release deadline customer invoice travel recipe grocery workout book '
+    'reading research report summary todo call email follow schedule '
+    'launch marketing sales hiring interview feedback roadmap sprint bug '
+    'feature deploy server database backup security holiday birthday gift'
+).split()
+
+# Password of the users created by seed_user, for benchmarks that log in
+BENCH_PASSWORD = 'bench-password'
+
+def random_text(rng, min_words, max_words):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words)))
+
+def get_or_create_user(conn, username, password=None):
+    """Return the id of a benchmark user, creating it if needed.
+
+    Without a password the user cannot log in, which is enough for
+    benchmarks that call db.py directly.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute('SELECT id FROM user WHERE username = %s', (username,))
+        row = cursor.fetchone()
+        if row:
+            return row['id']
+        cursor.execute(
+            'INSERT INTO user (username, email, password_hash) VALUES (%s, %s, %s)',
+            (username, f'{username}@bench.invalid',
+             generate_password_hash(password) if password else '!')
+        )
+        user_id = cursor.lastrowid
+    conn.commit()
+    return user_id
+
+def count_notes(conn, user_id):
+    with conn.cursor() as cursor:
+        cursor.execute('SELECT COUNT(*) AS n FROM note WHERE user_id = %s', (user_id,))
+        return cursor.fetchone()['n']
+
+def sequence_seeded(cursor, user_id):
+    """Number rows seeded past db.py as changes, for delta sync.
+
+    This moves the user's data_version on too, invalidating ETags held by clients.
+    """
+    migrations.sequence_changes(cursor, user_id, unsequenced_only=True)
+
+def seed_categories(conn, user_id, count):
+    """Make sure a user has ``count`` benchmark categories; returns their ids."""
+    with conn.cursor() as cursor:
+        cursor.executemany(
+            'INSERT IGNORE INTO category (name, user_id) VALUES (%s, %s)',
+            [(f'Category {i}', user_id) for i in range(count)]
+        )
+        cursor.execute(
+            "SELECT id FROM category WHERE user_id = %s AND name LIKE 'Category %%' ORDER BY id LIMIT %s",
+            (user_id, count)
+        )
+        rows = cursor.fetchall()
+        sequence_seeded(cursor, user_id)
+    conn.commit()
+    return [row['id'] for row in rows]
+
+def seed_notes(conn, user_id, total, batch_size=1000, seed=42, category_ids=None):
+    """Top up a user's notes to ``total`` rows with random titles and content.
+
+    With category_ids, each note is put in one of them or left uncategorised.
+    """
+    rng = random.Random(seed)
+    categories = list(category_ids or []) + [None]
+    existing = count_notes(conn, user_id)
+    start = datetime(2024, 1, 1)
+    for offset in range(existing, total, batch_size):
+        rows = []
+        for i in range(offset, min(offset + batch_size, total)):
+            stamp = (start + timedelta(minutes=i)).strftime('%Y-%m-%d %H:%M:%S')
+            rows.append((
+                random_text(rng, 2, 6), random_text(rng, 20, 120), stamp, stamp,
+                1 if rng.random() < 0.3 else 0, 1 if rng.random() < 0.5 else 0,
+                rng.choice((0, 1, 2)), 'blue',
+                rng.choice(categories) if category_ids else None, user_id
+            ))
+        with conn.cursor() as cursor:
+            cursor.executemany(
+                '''INSERT INTO note
+                   (title, content, created_date, updated_date, is_todo, completed, importance_rank, color,
+                    category_id, user_id)
+                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)''',
+                rows
+            )
+            sequence_seeded(cursor, user_id)
+        conn.commit()
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def measure(func, runs):
+    """Call func ``runs`` times; return per-call latencies in milliseconds."""
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+def summarize(samples):
+    return {
+        'p50': statistics.median(samples),
+        'p95': percentile(samples, 95),
+        'p99': percentile(samples, 99),
+        'mean': statistics.fmean(samples),
+    }
+
+def seed_user(conn, total, categories=10):
+    """Create (or top up) the benchmark user for a scale; returns its id.
+
+    The user is called bench_<total>, can log in with BENCH_PASSWORD and has
+    ``total`` notes spread over ``categories`` categories.
+    """
+    user_id = get_or_create_user(conn, f'bench_{total}', BENCH_PASSWORD)
+    category_ids = seed_categories(conn, user_id, categories)
+    if count_notes(conn, user_id) < total:
+        seed_notes(conn, user_id, total, category_ids=category_ids)
+    return user_id
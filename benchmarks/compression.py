@@ -0,0 +1,69 @@
+"""Compare response compression settings: CPU time against bytes sent.
+
+Usage: python -m benchmarks.compression [--notes 500] [--runs 20] [--mbps 5]
+
+Needs no database: builds an /api/notes JSON page and a dashboard HTML page
+of note cards, and passes each through CompressionMiddleware at several
+gzip levels and brotli qualities. The last column adds the time to send the
+result over a --mbps link, as a mobile client would see it.
+"""
+import argparse
+from werkzeug.test import create_environ
+import compression
+import db
+import json_provider
+from app import app
+from benchmarks.common import measure, summarize
+from benchmarks.json_rows import FIELDS, raw_rows
+from benchmarks.render import note_rows
+
+SETTINGS = [('identity', None)] + [('gzip', level) for level in (1, 6, 9)] + \
+    [('br', quality) for quality in (1, 4, 5, 6, 11)]
+
+def bodies(count):
+    """(label, content type, body) of the responses compressed."""
+    records = db.as_records([(name,) for name in FIELDS], raw_rows(count))
+    with app.app_context():
+        json_body = json_provider.FastJSONProvider(app).response(records).get_data()
+    with app.test_request_context():
+        cards = app.jinja_env.from_string("{% for note in notes %}{% include '_note_card.html' %}{% endfor %}")
+        html_body = cards.render(notes=note_rows(count)).encode('utf-8')
+    return [('json', 'application/json', json_body), ('html', 'text/html; charset=utf-8', html_body)]
+
+def middleware(body, content_type, encoding, level):
+    def wsgi_app(environ, start_response):
+        start_response('200 OK', [('Content-Type', content_type), ('Content-Length', str(len(body)))])
+        return [body]
+    return compression.CompressionMiddleware(
+        wsgi_app, [content_type.split(';')[0]], min_size=0, gzip_level=level or 6,
+        brotli_quality=level or 6, encodings=[encoding])
+
+def respond(app_, environ):
+    return b''.join(app_(dict(environ), lambda status, headers, exc_info=None: None))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--notes', type=int, default=500)
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--mbps', type=float, default=5.0, help='Link speed for the transfer estimate.')
+    args = parser.parse_args()
+
+    if compression.brotli is None:
+        print('brotli is not installed; skipping brotli settings')
+    print(f"{args.notes} notes per page, {args.mbps:g} Mbit/s link")
+    print(f"{'case':<18} {'bytes':>9} {'ratio':>7} {'p50 ms':>9} {'p95 ms':>9} {'+send ms':>9}")
+    for label, content_type, body in bodies(args.notes):
+        for encoding, level in SETTINGS:
+            if encoding == 'br' and compression.brotli is None:
+                continue
+            environ = create_environ('/', headers={'Accept-Encoding': encoding})
+            wrapped = middleware(body, content_type, encoding, level)
+            size = len(respond(wrapped, environ))
+            stats = summarize(measure(lambda: respond(wrapped, environ), args.runs))
+            send_ms = size * 8 / (args.mbps * 1000)
+            case = f"{label} {encoding}" + (f" {level}" if level else '')
+            print(f"{case:<18} {size:>9} {len(body) / size:>6.1f}x {stats['p50']:>9.2f} {stats['p95']:>9.2f} "
+                  f"{stats['p50'] + send_ms:>9.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Load-test the HTML and JSON routes with concurrent keep-alive clients.
+
+Usage: python -m benchmarks.http_load [--url http://127.0.0.1:8000] [--notes 10000]
+                                      [--concurrency 10 50] [--duration 10]
+                                      [--scenario dashboard todos ...]
+
+Seeds the bench_<notes> user, logs in and runs each scenario for --duration
+seconds at every --concurrency level, reporting throughput and p50/p95/p99
+latency. Without --url the app is served from a thread of this process by
+Werkzeug's threaded server; that is handy for spotting regressions, but the
+load generator then shares the interpreter with the server, so compare
+production-like numbers against a real server (gunicorn, uvicorn asgi:app).
+"""
+import argparse
+import asyncio
+import json
+import threading
+from werkzeug.serving import make_server
+import db
+from app import app
+from benchmarks.common import seed_user, BENCH_PASSWORD
+from benchmarks.load import run_load, login
+
+def page_scenario(path):
+    def scenario(cookie):
+        headers = {'Cookie': cookie}
+        return (lambda worker, i: ('GET', path, headers, b'')), None
+    return scenario
+
+def crud_scenario(cookie):
+    """Each client creates a note, reads it, updates it and deletes it, in a loop."""
+    headers = {'Cookie': cookie, 'Content-Type': 'application/json'}
+    created = {}
+
+    def next_request(worker, i):
+        step = i % 4
+        note_id = created.get(worker)
+        if step == 0 or note_id is None:
+            body = json.dumps({'title': f'Load test {worker}-{i}', 'content': 'load test', 'is_todo': True})
+            return 'POST', '/api/notes', headers, body.encode('utf-8')
+        if step == 1:
+            return 'GET', f'/api/notes/{note_id}', headers, b''
+        if step == 2:
+            body = json.dumps({'title': f'Load test {worker}-{i} (edited)', 'completed': True})
+            return 'PUT', f'/api/notes/{note_id}', headers, body.encode('utf-8')
+        del created[worker]
+        return 'DELETE', f'/api/notes/{note_id}', headers, b''
+
+    def on_response(worker, status, body):
+        if status == 201:
+            created[worker] = json.loads(body)['id']
+
+    return next_request, on_response
+
+SCENARIOS = {
+    'dashboard': page_scenario('/dashboard'),
+    'todos': page_scenario('/todos'),
+    'api_list': page_scenario('/api/notes?limit=50'),
+    'api_list_slim': page_scenario('/api/notes?limit=50&fields=slim'),
+    'api_crud': crud_scenario,
+}
+
+def serve_in_thread():
+    """Serve the app on a free local port from a daemon thread; returns its URL."""
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.port}'
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='Base URL of a running server (default: serve in-process)')
+    parser.add_argument('--notes', type=int, default=10000)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[10, 50])
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--scenario', nargs='+', choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    args = parser.parse_args()
+
+    with app.app_context():
+        seed_user(db.get_db(), args.notes)
+
+    base_url = args.url or serve_in_thread()
+    cookie = login(base_url, f'bench_{args.notes}', BENCH_PASSWORD)
+
+    print(f"{'scenario':<14} {'clients':>7} {'requests':>9} {'errors':>7} {'req/s':>9} "
+          f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name in args.scenario:
+        for concurrency in args.concurrency:
+            next_request, on_response = SCENARIOS[name](cookie)
+            result = asyncio.run(run_load(base_url, next_request, concurrency, args.duration, on_response))
+            print(f"{name:<14} {concurrency:>7} {result['requests']:>9} {result['errors']:>7} "
+                  f"{result['throughput']:>9.1f} {result.get('p50', 0):>9.2f} "
+                  f"{result.get('p95', 0):>9.2f} {result.get('p99', 0):>9.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Compare dict rows + Flask's JSON provider with Records + FastJSONProvider.
+
+Usage: python -m benchmarks.json_rows [--rows 10000] [--runs 20]
+
+Needs no database: builds rows shaped like a full /api/notes listing from
+raw tuples, as the cursors do, and times turning them into rows and into a
+JSON response body.
+"""
+import argparse
+import random
+from datetime import datetime, timedelta
+from flask.json.provider import DefaultJSONProvider
+import db
+import json_provider
+from app import app
+from benchmarks.common import random_text, measure, summarize
+
+FIELDS = ('id', 'title', 'created_date', 'updated_date', 'is_todo', 'completed', 'importance',
+          'color', 'category_id', 'user_id', 'version', 'content', 'category_name')
+
+def raw_rows(count, seed=42):
+    """Tuples as pymysql returns them for a full note listing."""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    rows = []
+    for i in range(count):
+        stamp = start + timedelta(minutes=i)
+        rows.append((i + 1, random_text(rng, 2, 6), stamp, stamp, i % 3 == 0, 0,
+                     rng.choice(('low', 'normal', 'high')), 'blue', 1, 1, 1,
+                     random_text(rng, 20, 120), 'Work'))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    rows = raw_rows(args.rows)
+    description = [(name,) for name in FIELDS]
+    dicts = [dict(zip(FIELDS, row)) for row in rows]
+    records = db.as_records(description, rows)
+
+    app.config['DEBUG'] = False
+    default_provider = DefaultJSONProvider(app)
+    fast_provider = json_provider.FastJSONProvider(app)
+    app.config['JSON_DATE_FORMAT'] = 'iso'
+    iso_provider = json_provider.FastJSONProvider(app)
+
+    cases = [
+        ('rows: dict per row', lambda: [dict(zip(FIELDS, row)) for row in rows]),
+        ('rows: Record', lambda: db.as_records(description, rows)),
+        ('json: default provider, dicts', lambda: default_provider.response(dicts)),
+        ('json: fast provider, records', lambda: fast_provider.response(records)),
+        ('json: fast provider, iso dates', lambda: iso_provider.response(records)),
+        ('both: dicts + default provider',
+         lambda: default_provider.response([dict(zip(FIELDS, row)) for row in rows])),
+        ('both: records + fast provider',
+         lambda: fast_provider.response(db.as_records(description, rows))),
+    ]
+
+    print(f"{args.rows} rows, JSON encoder: {'orjson' if json_provider.orjson else 'json (stdlib)'}")
+    print(f"{'case':<34} {'p50 ms':>9} {'p95 ms':>9}")
+    with app.app_context():
+        for label, func in cases:
+            stats = summarize(measure(func, args.runs))
+            print(f"{label:<34} {stats['p50']:>9.2f} {stats['p95']:>9.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""A small asyncio HTTP/1.1 load generator with keep-alive connections.
+
+It uses only the standard library so that it can drive either server mode
+(WSGI or ASGI) with thousands of concurrent connections from one process.
+"""
+import asyncio
+import http.cookiejar
+import time
+import urllib.parse
+import urllib.request
+from benchmarks.common import summarize
+
+class Connection:
+    """One keep-alive HTTP/1.1 connection."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method, path, headers=None, body=b''):
+        """Send a request and read the full response; returns (status, body)."""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+        lines = [f'{method} {path} HTTP/1.1', f'Host: {self.host}:{self.port}',
+                 f'Content-Length: {len(body)}']
+        lines.extend(f'{name}: {value}' for name, value in (headers or {}).items())
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            await self.close()
+            raise ConnectionError('Server closed the connection')
+        status = int(status_line.split()[1])
+
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        if response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    await self.reader.readline()
+                    break
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readline()
+            response_body = b''.join(chunks)
+        elif 'content-length' in response_headers:
+            response_body = await self.reader.readexactly(int(response_headers['content-length']))
+        elif status in (204, 304) or method == 'HEAD':
+            response_body = b''
+        else:
+            response_body = await self.reader.read()
+            response_headers['connection'] = 'close'
+
+        if response_headers.get('connection', '').lower() == 'close':
+            await self.close()
+        return status, response_body
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except Exception:
+                pass
+        self.reader = self.writer = None
+
+async def _worker(host, port, next_request, on_response, deadline, latencies, errors, index):
+    conn = Connection(host, port)
+    count = 0
+    try:
+        while time.perf_counter() < deadline:
+            method, path, headers, body = next_request(index, count)
+            count += 1
+            started = time.perf_counter()
+            try:
+                status, response_body = await conn.request(method, path, headers, body)
+            except (OSError, ConnectionError, asyncio.IncompleteReadError):
+                errors.append('connection')
+                await conn.close()
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+            if status >= 400:
+                errors.append(status)
+            if on_response is not None:
+                on_response(index, status, response_body)
+    finally:
+        await conn.close()
+
+async def run_load(base_url, next_request, concurrency=50, duration=10.0, on_response=None):
+    """Drive the server with concurrent keep-alive clients for duration seconds.
+
+    next_request(worker_index, iteration) returns (method, path, headers, body);
+    on_response(worker_index, status, body), if given, sees every response so
+    that stateful scenarios can use ids the server handed out.
+    Returns a dict of request count, throughput, errors and latency percentiles.
+    """
+    parsed = urllib.parse.urlsplit(base_url)
+    latencies, errors = [], []
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(
+        _worker(parsed.hostname, parsed.port or 80, next_request, on_response,
+                deadline, latencies, errors, index)
+        for index in range(concurrency)
+    ))
+    elapsed = time.perf_counter() - started
+
+    result = {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'throughput': len(latencies) / elapsed if elapsed else 0.0,
+    }
+    if latencies:
+        result.update(summarize(latencies))
+    return result
+
+def login(base_url, username, password):
+    """Log in through the HTML form; returns a Cookie header value for the session."""
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+    data = urllib.parse.urlencode({'username': username, 'password': password}).encode('ascii')
+    opener.open(base_url.rstrip('/') + '/login', data)
+    cookies = '; '.join(f'{cookie.name}={cookie.value}' for cookie in jar)
+    if not cookies:
+        raise RuntimeError(f'Login as {username} failed')
+    return cookies
+
+def register(base_url, username, password):
+    """Register a user through the HTML form (ignoring 'already exists')."""
+    data = urllib.parse.urlencode({
+        'username': username,
+        'email': f'{username}@bench.invalid',
+        'password': password,
+    }).encode('ascii')
+    urllib.request.urlopen(base_url.rstrip('/') + '/register', data)
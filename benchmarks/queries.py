@@ -0,0 +1,93 @@
+"""Microbenchmark every db.py query function at several data scales.
+
+Usage: python -m benchmarks.queries [--notes 1000 10000 100000] [--runs 50]
+
+Runs against the configured MySQL database with the query cache disabled,
+so each call reaches MySQL. Read functions are timed as-is; write functions
+are timed on notes and categories the benchmark creates and deletes again.
+"""
+import argparse
+import time
+import db
+from app import app
+from benchmarks.common import seed_user, measure, summarize
+
+def read_targets(user_id, username, category_id, note_id, cursor):
+    """(label, function, args) for every read path in db.py."""
+    return [
+        ('get_user_by_id', db.get_user_by_id, (user_id,)),
+        ('get_user_by_username', db.get_user_by_username, (username,)),
+        ('get_user_version', db.get_user_version, (user_id,)),
+        ('get_categories_by_user', db.get_categories_by_user, (user_id,)),
+        ('get_category_by_id', db.get_category_by_id, (category_id, user_id)),
+        ('get_category_by_name', db.get_category_by_name, ('Category 0', user_id)),
+        ('get_note_by_id', db.get_note_by_id, (note_id, user_id)),
+        ('get_notes_by_user', db.get_notes_by_user, (user_id,)),
+        ('get_notes_by_user category', db.get_notes_by_user, (user_id, category_id)),
+        ('get_notes_by_user search', db.get_notes_by_user, (user_id, None, 'meeting budget')),
+        ('get_notes_page', db.get_notes_page, (user_id, 50)),
+        ('get_notes_page cursor', db.get_notes_page, (user_id, 50, cursor)),
+        ('get_notes_page category', db.get_notes_page, (user_id, 50, None, category_id)),
+        ('get_notes_page search', db.get_notes_page, (user_id, 50, None, None, 'meeting')),
+        ('get_todos_by_user', db.get_todos_by_user, (user_id,)),
+        ('get_todos_by_user pending', db.get_todos_by_user, (user_id, False)),
+        ('get_todos_page pending', db.get_todos_page, (user_id, 100, None, False)),
+    ]
+
+def write_cycle(user_id, category_id):
+    """Create, update, complete and delete one note; returns per-step latencies."""
+    samples = {}
+
+    def timed(label, func, *args):
+        started = time.perf_counter()
+        value = func(*args)
+        samples[label] = (time.perf_counter() - started) * 1000
+        return value
+
+    note_id = timed('create_note', db.create_note, 'Benchmark note', 'benchmark content',
+                    category_id, True, 'normal', 'blue', user_id)
+    timed('update_note', db.update_note, note_id, user_id, {'title': 'Benchmark note (edited)'})
+    timed('apply_note_batch', db.apply_note_batch, user_id,
+          [{'op': 'complete', 'id': note_id, 'completed': True}])
+    timed('delete_note', db.delete_note, note_id, user_id)
+    new_category = timed('create_category', db.create_category, 'Benchmark category', user_id)
+    timed('delete_category', db.delete_category, new_category, user_id)
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--notes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--runs', type=int, default=50)
+    args = parser.parse_args()
+
+    app.config['QUERY_CACHE_ENABLED'] = False
+    with app.app_context():
+        conn = db.get_db()
+        print(f"{'notes':>8} {'function':<30} {'rows':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for total in args.notes:
+            user_id = seed_user(conn, total)
+            category_id = db.get_categories_by_user(user_id)[0]['id']
+            first_page, cursor = db.get_notes_page(user_id, 50)
+            note_id = first_page[0]['id']
+
+            targets = read_targets(user_id, f'bench_{total}', category_id, note_id, cursor)
+            for label, func, func_args in targets:
+                result = func(*func_args)
+                if isinstance(result, tuple):
+                    result = result[0]
+                rows = len(result) if isinstance(result, list) else 1
+                stats = summarize(measure(lambda: func(*func_args), args.runs))
+                print(f"{total:>8} {label:<30} {rows:>6} {stats['p50']:>9.2f} "
+                      f"{stats['p95']:>9.2f} {stats['p99']:>9.2f}")
+
+            writes = {}
+            for _ in range(args.runs):
+                for label, latency in write_cycle(user_id, category_id).items():
+                    writes.setdefault(label, []).append(latency)
+            for label, samples in writes.items():
+                stats = summarize(samples)
+                print(f"{total:>8} {label:<30} {1:>6} {stats['p50']:>9.2f} "
+                      f"{stats['p95']:>9.2f} {stats['p99']:>9.2f}")
+
+if __name__ == '__main__':
+    main()
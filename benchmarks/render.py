@@ -0,0 +1,91 @@
+"""Time rendering note cards with and without the fragment and bytecode caches.
+
+Usage: python -m benchmarks.render [--notes 1000] [--runs 20]
+
+Needs no database: renders the dashboard and to-do cards for rows shaped
+like a note list page, and compiles the page templates from a fresh Jinja
+environment with and without a bytecode cache.
+"""
+import argparse
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from jinja2 import FileSystemBytecodeCache
+import db
+import fragments
+from app import app
+from benchmarks.common import random_text, measure, summarize
+
+FIELDS = ('id', 'title', 'created_date', 'updated_date', 'is_todo', 'completed', 'importance',
+          'color', 'category_id', 'user_id', 'version', 'preview', 'category_name')
+
+TEMPLATES = ('base.html', 'dashboard.html', 'todos.html', '_note_cards.html', '_note_card.html', '_todo_item.html')
+
+def note_rows(count, seed=42):
+    """Records as the note list queries return them."""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    rows = []
+    for i in range(count):
+        stamp = start + timedelta(minutes=i)
+        rows.append((i + 1, random_text(rng, 2, 6), stamp, stamp, 1, i % 2,
+                     rng.choice(('low', 'normal', 'high')), 'blue', 1, 1, 1,
+                     random_text(rng, 20, 60), rng.choice(('Work', None))))
+    return db.as_records([(name,) for name in FIELDS], rows)
+
+def compile_templates(bytecode_cache):
+    """Load the page templates into a fresh environment, as a cold worker does."""
+    env = app.jinja_env.overlay(cache_size=0, bytecode_cache=bytecode_cache)
+    started = time.perf_counter()
+    for name in TEMPLATES:
+        env.get_template(name)
+    return (time.perf_counter() - started) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--notes', type=int, default=1000)
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    notes = note_rows(args.notes)
+    env = app.jinja_env
+    # As in production: templates are not checked for changes on every use
+    env.auto_reload = False
+    # The card loops as they were before fragment caching: every card rendered inline
+    inline_cards = env.from_string("{% for note in notes %}{% include '_note_card.html' %}{% endfor %}")
+    inline_todos = env.from_string("{% for note in notes %}{% include '_todo_item.html' %}{% endfor %}")
+    cached_cards = env.get_template('_note_cards.html')
+    cached_todos = env.from_string("{{ note_fragments('_todo_item.html', notes) }}")
+
+    def cold(template):
+        def render():
+            fragments.get_fragment_cache().clear()
+            return template.render(notes=notes)
+        return render
+
+    cases = [
+        ('dashboard: inline', lambda: inline_cards.render(notes=notes)),
+        ('dashboard: fragments, cold', cold(cached_cards)),
+        ('dashboard: fragments, warm', lambda: cached_cards.render(notes=notes)),
+        ('todos: inline', lambda: inline_todos.render(notes=notes)),
+        ('todos: fragments, cold', cold(cached_todos)),
+        ('todos: fragments, warm', lambda: cached_todos.render(notes=notes)),
+    ]
+
+    print(f"{args.notes} notes")
+    print(f"{'case':<30} {'p50 ms':>9} {'p95 ms':>9}")
+    with app.test_request_context():
+        for label, func in cases:
+            stats = summarize(measure(func, args.runs))
+            print(f"{label:<30} {stats['p50']:>9.2f} {stats['p95']:>9.2f}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        bytecode_cache = FileSystemBytecodeCache(directory)
+        compile_templates(bytecode_cache)  # fill the cache
+        for label, bytecode in (('compile: no bytecode cache', None), ('compile: bytecode cache', bytecode_cache)):
+            stats = summarize([compile_templates(bytecode) for _ in range(args.runs)])
+            print(f"{label:<30} {stats['p50']:>9.2f} {stats['p95']:>9.2f}")
+
+if __name__ == '__main__':
+    main()
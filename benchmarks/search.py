@@ -0,0 +1,52 @@
+"""Compare FULLTEXT note search with the old leading-wildcard LIKE scan.
+
+Usage: python -m benchmarks.search [--notes 10000 100000] [--runs 20]
+
+Seeds one benchmark user per scale in the configured MySQL database (rows are
+kept between runs) and times db.get_notes_by_user against the LIKE query it
+replaced, for a handful of search terms.
+"""
+import argparse
+import db
+from app import app
+from benchmarks.common import get_or_create_user, seed_notes, measure, summarize
+
+TERMS = ('meeting', 'budget review', 'deplo', 'invoice customer')
+
+LIKE_QUERY = '''
+    SELECT n.*, c.name as category_name
+    FROM note n
+    LEFT JOIN category c ON n.category_id = c.id
+    WHERE n.user_id = %s AND (n.title LIKE %s OR n.content LIKE %s)
+    ORDER BY n.updated_date DESC
+'''
+
+def like_search(user_id, term):
+    with db.get_db().cursor() as cursor:
+        cursor.execute(LIKE_QUERY, (user_id, f'%{term}%', f'%{term}%'))
+        return cursor.fetchall()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--notes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    with app.app_context():
+        conn = db.get_db()
+        print(f"{'notes':>8} {'term':<18} {'method':<9} {'rows':>6} {'p50 ms':>9} {'p95 ms':>9}")
+        for total in args.notes:
+            user_id = get_or_create_user(conn, f'bench_search_{total}')
+            seed_notes(conn, user_id, total)
+            for term in TERMS:
+                methods = (
+                    ('like', lambda: like_search(user_id, term)),
+                    ('fulltext', lambda: db.get_notes_by_user(user_id, search=term)),
+                )
+                for name, func in methods:
+                    rows = len(func())
+                    stats = summarize(measure(func, args.runs))
+                    print(f"{total:>8} {term:<18} {name:<9} {rows:>6} {stats['p50']:>9.2f} {stats['p95']:>9.2f}")
+
+if __name__ == '__main__':
+    main()
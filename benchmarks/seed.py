@@ -0,0 +1,37 @@
+"""Seed benchmark users with synthetic categories and notes.
+
+Usage: python -m benchmarks.seed [--notes 1000 10000 100000 1000000] [--categories 10]
+
+Defaults to 1k, 10k and 100k notes; a million takes a few minutes to seed.
+
+Creates one user per scale, called bench_<notes> with password
+'bench-password', in the configured MySQL database. Rows are kept between
+runs and only topped up, so re-running is cheap; the other benchmarks seed
+the scales they need themselves.
+"""
+import argparse
+import time
+import db
+from app import app
+from benchmarks.common import seed_user, count_notes
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--notes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--categories', type=int, default=10)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.init_db()
+        conn = db.get_db()
+        print(f"{'user':<16} {'id':>6} {'notes':>9} {'seconds':>9} {'rows/s':>9}")
+        for total in args.notes:
+            started = time.perf_counter()
+            user_id = seed_user(conn, total, args.categories)
+            elapsed = time.perf_counter() - started
+            notes = count_notes(conn, user_id)
+            print(f"{'bench_' + str(total):<16} {user_id:>6} {notes:>9} {elapsed:>9.1f} "
+                  f"{notes / elapsed if elapsed else 0:>9.0f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# Sentinel for cache misses, since None can be a cached value
+MISSING = object()
+
+class TTLCache:
+    """A thread-safe LRU cache whose entries expire after ``ttl`` seconds.
+
+    Once ``maxsize`` entries are stored, the least recently used entry is
+    evicted to make room for a new one.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if absent or expired."""
+        with self._lock:
+            entry = self._data.get(key, MISSING)
+            if entry is MISSING:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Store value under key, evicting the least recently used entry if full."""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        """Remove key from the cache if present."""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Remove every entry."""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """Return hit/miss/eviction counters and the current size."""
+        with self._lock:
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+class DictBackend:
+    """In-memory stand-in for a shared cache server.
+    
+    Implements the subset of the redis-py client API that QueryCache uses
+    (get, set with ex=, delete), so a ``redis.Redis`` instance can be used
+    in its place. Values are stored as bytes, as a real server would.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ex=None):
+        expires_at = time.monotonic() + ex if ex else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+        return True
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(self._data.pop(key, None) is not None for key in keys)
+
+def dict_backend(config):
+    """QUERY_CACHE_BACKEND factory for the in-process DictBackend (tests, single process)."""
+    return DictBackend()
+
+def redis_backend(config):
+    """QUERY_CACHE_BACKEND factory connecting to QUERY_CACHE_REDIS_URL."""
+    try:
+        import redis
+    except ImportError:
+        raise RuntimeError("The redis package is required for the redis query cache backend")
+    return redis.Redis.from_url(config['QUERY_CACHE_REDIS_URL'])
+
+class QueryCache:
+    """Caches per-user query results, with namespace-wide invalidation.
+    
+    Entries live in a local TTLCache and, when a shared backend is given, in
+    that backend too so that all workers see them. Every (namespace, user)
+    pair has a generation token that is part of each entry's key;
+    invalidating the pair replaces the token, which makes every cached
+    variant of it (each search, page or filter) unreachable at once. With a
+    shared backend the token is kept there, so invalidation is seen by every
+    worker on its next lookup.
+    
+    Tokens expire ``generation_ttl`` seconds (by default ten entry
+    lifetimes) after they are made, and local ones when ``local.maxsize``
+    pairs have one. A missing token is replaced by a fresh one, which only
+    makes the pair's entries unreachable, as an invalidation would.
+    """
+
+    def __init__(self, local, shared=None, ttl=60.0, generation_ttl=None):
+        self.local = local
+        self.shared = shared
+        self.ttl = ttl
+        self.generation_ttl = generation_ttl or 10 * ttl
+        self._generations = TTLCache(maxsize=local.maxsize, ttl=self.generation_ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def lookup(self, namespace, user_id, params):
+        """Return (cached value or MISSING, key to store a fresh value under)."""
+        key = f'q:{namespace}:{user_id}:{self._generation(namespace, user_id)}:{params!r}'
+        value = self.local.get(key, MISSING)
+        if value is MISSING and self.shared is not None:
+            raw = self.shared.get(key)
+            if raw is not None:
+                value = pickle.loads(raw)
+                self.local.set(key, value)
+        
+        with self._lock:
+            if value is MISSING:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value, key
+
+    def store(self, key, value):
+        """Cache value under a key returned by lookup().
+        
+        Keys embed the generation seen at lookup time, so a result computed
+        before a concurrent invalidation is stored where nobody will read it.
+        """
+        self.local.set(key, value)
+        if self.shared is not None:
+            self.shared.set(key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), ex=max(1, int(self.ttl)))
+
+    def invalidate(self, user_id, *namespaces):
+        """Drop every cached result of the given namespaces for a user."""
+        for namespace in namespaces:
+            token = uuid.uuid4().hex
+            if self.shared is not None:
+                self.shared.set(f'gen:{namespace}:{user_id}', token.encode('ascii'), ex=self._generation_ex())
+            else:
+                self._generations.set((namespace, user_id), token)
+            with self._lock:
+                self.invalidations += 1
+
+    def stats(self):
+        """Return hit/miss/eviction/invalidation counters."""
+        local = self.local.stats()
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': local['evictions'],
+                'expirations': local['expirations'],
+                'invalidations': self.invalidations,
+                'size': local['size'],
+            }
+
+    def _generation(self, namespace, user_id):
+        if self.shared is None:
+            with self._lock:
+                token = self._generations.get((namespace, user_id))
+                if token is None:
+                    token = uuid.uuid4().hex
+                    self._generations.set((namespace, user_id), token)
+                return token
+        
+        gen_key = f'gen:{namespace}:{user_id}'
+        token = self.shared.get(gen_key)
+        if token is None:
+            # Never fall back to a fixed token: entries stored under it before
+            # an earlier invalidation would become visible again.
+            token = uuid.uuid4().hex.encode('ascii')
+            self.shared.set(gen_key, token, ex=self._generation_ex())
+        return token.decode('ascii') if isinstance(token, bytes) else token
+
+    def _generation_ex(self):
+        return max(1, int(self.generation_ttl))
\ No newline at end of file
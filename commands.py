@@ -0,0 +1,207 @@
+import re
+import sys
+import click
+from datetime import datetime
+from flask import g
+import assets
+import db
+import migrations
+
+# Statements EXPLAIN accepts; others (START TRANSACTION, SELECT LAST_INSERT_ID())
+# only touch session state and are run as they are
+_EXPLAINABLE = re.compile(r'\s*\(?\s*(?:SELECT\b.*\bFROM\b|INSERT\b|UPDATE\b|DELETE\b|REPLACE\b)',
+                          re.IGNORECASE | re.DOTALL)
+
+class _ExplainCursor:
+    """Cursor stand-in that EXPLAINs each statement instead of running it."""
+
+    def __init__(self, cursor, label, plans):
+        self._cursor = cursor
+        self._label = label
+        self._plans = plans
+        self._rows = []
+        self.rowcount = 0
+        self.lastrowid = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+    def execute(self, query, args=None):
+        if not _EXPLAINABLE.match(query):
+            self._cursor.execute(query, args)
+            self._rows = list(self._cursor.fetchall() or ())
+            return
+        self._rows = []
+        self._cursor.execute('EXPLAIN ' + query, args)
+        self._plans.append((self._label, ' '.join(query.split()), self._cursor.fetchall()))
+
+    def executemany(self, query, args):
+        if args:
+            self.execute(query, args[0])
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def fetchmany(self, size=None):
+        return []
+
+class _ExplainConnection:
+    """Connection stand-in handed to db.py functions by `flask db explain`."""
+
+    def __init__(self, conn, plans):
+        self._conn = conn
+        self._plans = plans
+        self.label = None
+
+    def cursor(self, *args):
+        return _ExplainCursor(self._conn.cursor(*args), self.label, self._plans)
+
+    def commit(self):
+        # Nothing was written; just end the transaction (e.g. get_changes' snapshot)
+        self._conn.rollback()
+
+    def rollback(self):
+        self._conn.rollback()
+
+def _explain_targets(user_id, note_id, category_id):
+    """Every query path in db.py, as (label, function, args)."""
+    future = db.encode_cursor([datetime(2100, 1, 1), 2**31 - 1])
+    return [
+        ('get_user_by_id', db.get_user_by_id, (user_id,)),
+        ('get_user_by_username', db.get_user_by_username, ('nobody',)),
+        ('get_user_by_email', db.get_user_by_email, ('nobody@example.com',)),
+        ('get_user_version', db.get_user_version, (user_id,)),
+        ('update_user_password_hash', db.update_user_password_hash, (user_id, '!')),
+        ('revoke_token', db.revoke_token, ('0' * 32, user_id, datetime(2100, 1, 1))),
+        ('get_revoked_token_ids', db.get_revoked_token_ids, ()),
+        ('get_categories_by_user', db.get_categories_by_user, (user_id,)),
+        ('get_category_by_id', db.get_category_by_id, (category_id, user_id)),
+        ('get_category_by_name', db.get_category_by_name, ('Work', user_id)),
+        ('delete_category', db.delete_category, (category_id, user_id)),
+        ('get_notes_by_user', db.get_notes_by_user, (user_id,)),
+        ('get_notes_by_user category', db.get_notes_by_user, (user_id, category_id)),
+        ('get_notes_by_user search', db.get_notes_by_user, (user_id, None, 'meeting')),
+        ('get_notes_page', db.get_notes_page, (user_id, 50)),
+        ('get_notes_page cursor', db.get_notes_page, (user_id, 50, future)),
+        ('get_notes_page category cursor', db.get_notes_page, (user_id, 50, future, category_id)),
+        ('get_todos_by_user', db.get_todos_by_user, (user_id,)),
+        ('get_todos_by_user pending', db.get_todos_by_user, (user_id, False)),
+        ('get_todos_page', db.get_todos_page, (user_id, 100, None, False)),
+        ('get_note_by_id', db.get_note_by_id, (note_id, user_id)),
+        ('update_note', db.update_note, (note_id, user_id, {'title': 'explain'})),
+        ('delete_note', db.delete_note, (note_id, user_id)),
+        ('apply_note_batch', db.apply_note_batch,
+         (user_id, [{'op': 'complete', 'id': note_id, 'completed': True}])),
+        ('iter_export_notes', lambda user_id: list(db.iter_export_notes(user_id)), (user_id,)),
+        ('create_note', db.create_note, ('explain', '', None, False, 'normal', 'blue', user_id)),
+        ('upsert_category', db.upsert_category, ('Work', user_id)),
+        ('import_notes', db.import_notes, (user_id, [{
+            'title': 'explain', 'content': '', 'category': None, 'is_todo': False, 'completed': False,
+            'importance': 'normal', 'color': 'blue', 'created_date': '2024-01-01 00:00:00',
+            'updated_date': '2024-01-01 00:00:00',
+        }], {})),
+        ('get_changes', db.get_changes, (user_id, 0, 500)),
+        # get_changes stops at the version query here, which finds no user row
+        ('get_changes since', lambda user_id: db._read_changes(db.get_db().cursor(), user_id, 1, [1, 4, 0], 2, 500),
+         (user_id,)),
+        ('get_changes cursor', lambda user_id: db._read_changes(db.get_db().cursor(), user_id, 1, [2, 1, 10], 3, 500),
+         (user_id,)),
+    ]
+
+def explain_queries(user_id, note_id, category_id):
+    """EXPLAIN every db.py query; returns a list of (label, sql, plan rows)."""
+    real = db.get_db()
+    plans = []
+    explain_conn = _ExplainConnection(real, plans)
+    g.db = explain_conn
+    # Keep reads on the explained connection even with DB_REPLICAS set
+    g.db_primary_only = True
+    try:
+        for label, func, args in _explain_targets(user_id, note_id, category_id):
+            explain_conn.label = label
+            func(*args)
+    finally:
+        g.db = real
+    return plans
+
+def full_scans(plans):
+    """Return the (label, plan row) pairs of non-INSERT queries that scan a whole table."""
+    return [(label, row) for label, sql, rows in plans if not sql.startswith('INSERT')
+            for row in rows
+            if row.get('type') == 'ALL' and not str(row.get('table', '')).startswith('<')]
+
+def register_commands(app):
+    """Register the `flask db ...` and `flask assets ...` maintenance commands."""
+
+    @app.cli.group('db')
+    def db_group():
+        """Database schema management."""
+
+    @db_group.command('upgrade')
+    @click.option('--target', type=int, default=None, help='Stop after this migration version.')
+    def upgrade(target):
+        """Create the database if needed and apply pending migrations."""
+        if target is None:
+            applied = db.init_db()
+        else:
+            applied = migrations.upgrade(db.get_db(), target)
+        click.echo(f"Applied migrations: {', '.join(map(str, applied)) or 'none'}")
+
+    @db_group.command('status')
+    def status():
+        """List migrations and whether they have been applied."""
+        applied = migrations.applied_versions(db.get_db())
+        for version, description, _ in migrations.MIGRATIONS:
+            mark = 'x' if version in applied else ' '
+            click.echo(f"[{mark}] {version:>3}  {description}")
+
+    @db_group.command('explain')
+    @click.option('--user-id', type=int, default=1)
+    @click.option('--note-id', type=int, default=1)
+    @click.option('--category-id', type=int, default=1)
+    def explain(user_id, note_id, category_id):
+        """Check that every query in db.py is served by an index.
+
+        Run this against a database holding realistic data (for example one
+        seeded by the benchmarks); on near-empty tables MySQL may prefer a
+        table scan regardless of the available indexes. Exits non-zero if
+        any query scans a whole table.
+        """
+        plans = explain_queries(user_id, note_id, category_id)
+        for label, sql, rows in plans:
+            if sql.startswith('INSERT'):
+                continue
+            for row in rows:
+                click.echo(f"{label:<34} {str(row.get('table')):<10} {str(row.get('type')):<10} "
+                           f"{str(row.get('key')):<32} {row.get('Extra') or ''}")
+
+        scans = full_scans(plans)
+        if scans:
+            for label, row in scans:
+                click.echo(f"FULL SCAN: {label} on table {row.get('table')}", err=True)
+            sys.exit(1)
+        click.echo('All queries use an index.')
+
+    @app.cli.group('assets')
+    def assets_group():
+        """Static asset bundles."""
+
+    @assets_group.command('build')
+    def build_assets():
+        """Minify, fingerprint and pre-compress the bundles into static/dist.
+
+        Run on each deploy; pages link the built files from then on.
+        """
+        manifest = assets.build(app.static_folder, assets.dist_folder(app))
+        if assets.brotli is None:
+            click.echo('brotli is not installed; built gzip copies only.', err=True)
+        for name, entry in manifest.items():
+            sizes = ', '.join(f"{encoding} {size}" for encoding, size in entry['encodings'].items())
+            click.echo(f"{name:<14} {entry['file']:<28} {entry['source_size']:>7} -> {entry['size']:>7}"
+                       f"{'  (' + sizes + ')' if sizes else ''}")
@@ -0,0 +1,257 @@
+"""WSGI middleware compressing text responses with gzip or brotli.
+
+Responses are compressed when the client accepts it, their type is listed in
+COMPRESSION_MIMETYPES and they are at least COMPRESSION_MIN_SIZE bytes long.
+Responses with a Content-Length are compressed in one go; streamed ones
+(exports) chunk by chunk, each chunk flushed so the client receives it
+straight away. Event streams, responses already carrying a Content-Encoding
+(pre-compressed assets) and partial or empty responses pass through as they
+are.
+"""
+import re
+import zlib
+from werkzeug.datastructures import Headers
+from werkzeug.http import parse_accept_header, parse_options_header
+import logging
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# Encodings in order of preference
+ENCODINGS = ('br', 'gzip')
+
+# Sent a chunk at a time and must reach the client as each event happens
+NEVER_COMPRESSED = frozenset(['text/event-stream'])
+
+# ETags of compressed responses end in -<encoding>, since a strong ETag must
+# differ between encodings; clients send them back in If-None-Match/If-Match
+_ETAG_SUFFIX_RE = re.compile(r'-(%s)"' % '|'.join(ENCODINGS))
+
+class _Gzip:
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+class _Brotli:
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+class CompressionMiddleware:
+    """Compress an app's text responses for clients that accept gzip or brotli."""
+
+    def __init__(self, app, mimetypes, min_size=500, gzip_level=6, brotli_quality=6, encodings=ENCODINGS):
+        self.app = app
+        self.mimetypes = frozenset(mimetypes) - NEVER_COMPRESSED
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        # Kept in ENCODINGS' order of preference
+        self.encodings = [encoding for encoding in ENCODINGS
+                          if encoding in encodings and (encoding != 'br' or brotli is not None)]
+
+    def __call__(self, environ, start_response):
+        encoding = self.negotiate(environ.get('HTTP_ACCEPT_ENCODING'))
+        if encoding is None or environ.get('REQUEST_METHOD') == 'HEAD':
+            return self.app(environ, self._vary_start_response(start_response))
+
+        # Let the app compare the ETags it made with those clients send back
+        revalidated = False
+        for key in ('HTTP_IF_NONE_MATCH', 'HTTP_IF_MATCH'):
+            if key in environ:
+                environ[key], count = _ETAG_SUFFIX_RE.subn('"', environ[key])
+                revalidated = revalidated or (key == 'HTTP_IF_NONE_MATCH' and count > 0)
+
+        response = []
+        written = []
+
+        def capture(status, headers, exc_info=None):
+            response[:] = [status, headers, exc_info]
+            return written.append
+
+        app_iter = self.app(environ, capture)
+        if not response:
+            # start_response may wait until the app's first chunk of body
+            app_iter = _Body(app_iter)
+            app_iter.peek()
+        status, headers, exc_info = response
+        headers = Headers(headers)
+        code = int(status.split(None, 1)[0])
+
+        if code == 304 and revalidated and 'ETag' in headers:
+            headers['ETag'] = _with_suffix(headers['ETag'], encoding)
+        if _mimetype(headers) in self.mimetypes:
+            # Even when this response is too small to compress, a shared cache
+            # must not serve it in place of a compressed version, or vice versa
+            _add_vary(headers)
+        if not self._compressible(code, headers):
+            start_response(status, headers.to_wsgi_list(), exc_info)
+            return _Body(app_iter, written) if written else app_iter
+
+        if 'Content-Length' in headers:
+            return self._compress_whole(_Body(app_iter, written), status, headers, exc_info, encoding,
+                                        start_response)
+        return self._compress_stream(_Body(app_iter, written), status, headers, exc_info, encoding,
+                                     start_response)
+
+    def negotiate(self, accept_encoding):
+        """The preferred encoding the client accepts, or None."""
+        if not accept_encoding or not self.encodings:
+            return None
+        accepted = parse_accept_header(accept_encoding)
+        encodings = [(accepted[encoding], -i, encoding) for i, encoding in enumerate(self.encodings)]
+        quality, _, encoding = max(encodings)
+        return encoding if quality > 0 else None
+
+    def compressor(self, encoding):
+        if encoding == 'br':
+            return _Brotli(self.brotli_quality)
+        return _Gzip(self.gzip_level)
+
+    def _compressible(self, code, headers):
+        if code < 200 or code in (204, 206, 304):
+            return False
+        if 'Content-Encoding' in headers or 'Content-Range' in headers:
+            return False
+        if 'no-transform' in headers.get('Cache-Control', ''):
+            return False
+        if _mimetype(headers) not in self.mimetypes:
+            return False
+        length = headers.get('Content-Length', type=int)
+        return length is None or length >= self.min_size
+
+    def _vary_start_response(self, start_response):
+        """Wrap start_response to add Vary: Accept-Encoding to compressible types."""
+        def vary_start_response(status, headers, exc_info=None):
+            headers = Headers(headers)
+            if _mimetype(headers) in self.mimetypes:
+                _add_vary(headers)
+            return start_response(status, headers.to_wsgi_list(), exc_info)
+        return vary_start_response
+
+    def _compress_whole(self, body, status, headers, exc_info, encoding, start_response):
+        try:
+            data = b''.join(body)
+        finally:
+            body.close()
+        compressor = self.compressor(encoding)
+        compressed = compressor.compress(data) + compressor.finish()
+        if len(compressed) >= len(data):
+            # Not worth it (incompressible data); the Vary still applies
+            headers['Content-Length'] = str(len(data))
+            start_response(status, headers.to_wsgi_list(), exc_info)
+            return [data]
+        _set_encoding(headers, encoding)
+        headers['Content-Length'] = str(len(compressed))
+        start_response(status, headers.to_wsgi_list(), exc_info)
+        return [compressed]
+
+    def _compress_stream(self, body, status, headers, exc_info, encoding, start_response):
+        # Hold back the start of the body until it is known to reach min_size
+        head = []
+        size = 0
+        chunks = iter(body)
+        try:
+            for chunk in chunks:
+                head.append(chunk)
+                size += len(chunk)
+                if size >= self.min_size:
+                    break
+            else:
+                body.close()
+                headers['Content-Length'] = str(size)
+                start_response(status, headers.to_wsgi_list(), exc_info)
+                return [b''.join(head)]
+        except BaseException:
+            body.close()
+            raise
+
+        _set_encoding(headers, encoding)
+        start_response(status, headers.to_wsgi_list(), exc_info)
+        return self._stream(b''.join(head), chunks, body, self.compressor(encoding))
+
+    def _stream(self, head, chunks, body, compressor):
+        try:
+            yield compressor.compress(head)
+            for chunk in chunks:
+                if chunk:
+                    yield compressor.compress(chunk)
+            yield compressor.finish()
+        finally:
+            body.close()
+
+class _Body:
+    """An app's body iterable, after any chunks it passed to write() or already yielded."""
+
+    def __init__(self, app_iter, before=()):
+        self._app_iter = app_iter
+        self._before = list(before)
+        self._chunks = None
+
+    def peek(self):
+        """Start the app's iterable, up to its first non-empty chunk."""
+        self._chunks = iter(self._app_iter)
+        for chunk in self._chunks:
+            if chunk:
+                self._before.append(chunk)
+                break
+
+    def __iter__(self):
+        yield from self._before
+        yield from self._chunks if self._chunks is not None else self._app_iter
+
+    def close(self):
+        if hasattr(self._app_iter, 'close'):
+            self._app_iter.close()
+
+def _mimetype(headers):
+    return parse_options_header(headers.get('Content-Type', ''))[0].lower()
+
+def _add_vary(headers):
+    vary = [value.strip() for value in headers.get('Vary', '').split(',') if value.strip()]
+    if 'accept-encoding' not in (value.lower() for value in vary):
+        headers['Vary'] = ', '.join(vary + ['Accept-Encoding'])
+
+def _with_suffix(etag, encoding):
+    if etag.endswith('"') and not etag.endswith(f'-{encoding}"'):
+        return f'{etag[:-1]}-{encoding}"'
+    return etag
+
+def _set_encoding(headers, encoding):
+    headers['Content-Encoding'] = encoding
+    headers.pop('Content-Length', None)
+    # Byte ranges would refer to the uncompressed body
+    headers.pop('Accept-Ranges', None)
+    if 'ETag' in headers:
+        headers['ETag'] = _with_suffix(headers['ETag'], encoding)
+
+def init_app(app):
+    """Wrap the app's WSGI callable in CompressionMiddleware if COMPRESSION_ENABLED."""
+    if not app.config['COMPRESSION_ENABLED']:
+        return
+    if 'br' in app.config['COMPRESSION_ENCODINGS'] and brotli is None:
+        logger.warning("brotli is not installed; compressing responses with gzip only")
+    middleware = CompressionMiddleware(
+        app.wsgi_app,
+        app.config['COMPRESSION_MIMETYPES'],
+        min_size=app.config['COMPRESSION_MIN_SIZE'],
+        gzip_level=app.config['COMPRESSION_GZIP_LEVEL'],
+        brotli_quality=app.config['COMPRESSION_BROTLI_QUALITY'],
+        encodings=app.config['COMPRESSION_ENCODINGS'],
+    )
+    app.wsgi_app = middleware
@@ -16,6 +16,155 @@ class Config:
     DB_NAME = os.environ.get('DB_NAME', 'notesmart')
     DB_PORT = int(os.environ.get('DB_PORT', 3306))
     
+    # Connection pool settings
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+    DB_POOL_MAX_OVERFLOW = int(os.environ.get('DB_POOL_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+    DB_POOL_MAX_IDLE = float(os.environ.get('DB_POOL_MAX_IDLE', 300))
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'True').lower() in ('true', 't', '1')
+    
+    # Read replicas as a comma-separated list of host[:port], using the DB_*
+    # credentials and pool settings above. Reads go to a replica unless it
+    # lags more than DB_REPLICA_MAX_LAG seconds (checked at most every
+    # DB_REPLICA_CHECK_INTERVAL seconds); a user's reads stay on the primary
+    # for DB_READ_YOUR_WRITES seconds after they write.
+    DB_REPLICAS = [replica.strip() for replica in os.environ.get('DB_REPLICAS', '').split(',') if replica.strip()]
+    DB_REPLICA_MAX_LAG = float(os.environ.get('DB_REPLICA_MAX_LAG', 5))
+    DB_REPLICA_CHECK_INTERVAL = float(os.environ.get('DB_REPLICA_CHECK_INTERVAL', 5))
+    DB_READ_YOUR_WRITES = float(os.environ.get('DB_READ_YOUR_WRITES', 5))
+    
+    # aiomysql pool used by the ASGI entry point (asgi.py)
+    ASYNC_DB_POOL_MIN = int(os.environ.get('ASYNC_DB_POOL_MIN', 1))
+    ASYNC_DB_POOL_MAX = int(os.environ.get('ASYNC_DB_POOL_MAX', 50))
+    
+    # Process-wide cache of User objects (per-request caching is always on)
+    USER_CACHE_ENABLED = os.environ.get('USER_CACHE_ENABLED', 'False').lower() in ('true', 't', '1')
+    USER_CACHE_TTL = float(os.environ.get('USER_CACHE_TTL', 60))
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 1024))
+    
+    # Per-user query result cache (note lists and categories)
+    QUERY_CACHE_ENABLED = os.environ.get('QUERY_CACHE_ENABLED', 'False').lower() in ('true', 't', '1')
+    QUERY_CACHE_TTL = float(os.environ.get('QUERY_CACHE_TTL', 30))
+    QUERY_CACHE_SIZE = int(os.environ.get('QUERY_CACHE_SIZE', 2048))
+    # Optional shared backend shared by all workers, as an import path to a
+    # factory taking the app config (e.g. 'cache.redis_backend')
+    QUERY_CACHE_BACKEND = os.environ.get('QUERY_CACHE_BACKEND', '')
+    QUERY_CACHE_REDIS_URL = os.environ.get('QUERY_CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    
+    # Per-user category name -> id cache, so saving a note with a known
+    # category needs a primary key lookup rather than an upsert
+    CATEGORY_CACHE_ENABLED = os.environ.get('CATEGORY_CACHE_ENABLED', 'True').lower() in ('true', 't', '1')
+    CATEGORY_CACHE_TTL = float(os.environ.get('CATEGORY_CACHE_TTL', 300))
+    CATEGORY_CACHE_SIZE = int(os.environ.get('CATEGORY_CACHE_SIZE', 4096))
+    
+    # Password hashing: any werkzeug method string, e.g. 'scrypt:32768:8:1'.
+    # Stored hashes made with other parameters are upgraded at next login.
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+    # Hashes computed at once, hashes allowed to queue, and seconds to wait for a queue slot
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', 16))
+    PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 5))
+    
+    # Login/registration throttling: attempts per minute and burst size (rate 0 disables)
+    LOGIN_RATE_PER_IP = float(os.environ.get('LOGIN_RATE_PER_IP', 20))
+    LOGIN_BURST_PER_IP = int(os.environ.get('LOGIN_BURST_PER_IP', 10))
+    LOGIN_RATE_PER_USERNAME = float(os.environ.get('LOGIN_RATE_PER_USERNAME', 5))
+    LOGIN_BURST_PER_USERNAME = int(os.environ.get('LOGIN_BURST_PER_USERNAME', 5))
+    
+    # API bearer tokens: lifetimes in seconds, and how often each process reloads
+    # the revoked token list (0 skips revocation checks on access tokens)
+    API_ACCESS_TOKEN_TTL = int(os.environ.get('API_ACCESS_TOKEN_TTL', 900))
+    API_REFRESH_TOKEN_TTL = int(os.environ.get('API_REFRESH_TOKEN_TTL', 30 * 24 * 3600))
+    API_REVOCATION_REFRESH = float(os.environ.get('API_REVOCATION_REFRESH', 30))
+    
+    # Change feed (/api/notes/stream), off by default: every open dashboard or
+    # to-dos tab then holds a stream, which ties up a worker thread for up to
+    # EVENTS_STREAM_TIMEOUT under WSGI. Enable it when serving through asgi.py
+    # or with enough threads per open tab.
+    EVENTS_ENABLED = os.environ.get('EVENTS_ENABLED', 'False').lower() in ('true', 't', '1')
+    # EVENTS_BACKEND is an import path to a factory taking the app config, e.g.
+    # 'events.redis_backend' for several workers (empty: in-process only).
+    # Events kept per user for resuming, events queued per slow client, and
+    # keep-alive / reconnect intervals in seconds.
+    EVENTS_BACKEND = os.environ.get('EVENTS_BACKEND', '')
+    EVENTS_REDIS_URL = os.environ.get('EVENTS_REDIS_URL', 'redis://localhost:6379/0')
+    EVENTS_BUFFER_SIZE = int(os.environ.get('EVENTS_BUFFER_SIZE', 100))
+    EVENTS_QUEUE_SIZE = int(os.environ.get('EVENTS_QUEUE_SIZE', 100))
+    EVENTS_HEARTBEAT = float(os.environ.get('EVENTS_HEARTBEAT', 15))
+    EVENTS_STREAM_TIMEOUT = float(os.environ.get('EVENTS_STREAM_TIMEOUT', 300))
+    # Users whose events are kept, and seconds a user's events are kept after their last write
+    EVENTS_BUFFER_USERS = int(os.environ.get('EVENTS_BUFFER_USERS', 10000))
+    EVENTS_BUFFER_TTL = float(os.environ.get('EVENTS_BUFFER_TTL', 600))
+    
+    # Pagination
+    NOTES_PAGE_SIZE = int(os.environ.get('NOTES_PAGE_SIZE', 50))
+    TODOS_PAGE_SIZE = int(os.environ.get('TODOS_PAGE_SIZE', 100))
+    API_PAGE_MAX = int(os.environ.get('API_PAGE_MAX', 500))
+    # Changes per /api/sync response unless ?limit= asks for fewer or more (up to API_PAGE_MAX)
+    SYNC_PAGE_SIZE = int(os.environ.get('SYNC_PAGE_SIZE', 500))
+    
+    # Largest accepted POST /api/notes/batch request
+    BATCH_MAX_OPERATIONS = int(os.environ.get('BATCH_MAX_OPERATIONS', 500))
+    
+    # Export/import (/api/export, /api/import): rows read from the database per
+    # streamed chunk, notes inserted per import transaction, and invalid
+    # records listed in an import's report
+    EXPORT_FETCH_SIZE = int(os.environ.get('EXPORT_FETCH_SIZE', 500))
+    IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 500))
+    IMPORT_MAX_ERRORS = int(os.environ.get('IMPORT_MAX_ERRORS', 100))
+    
+    # Characters of note content sent to list views (full content loads per note)
+    NOTE_PREVIEW_LENGTH = int(os.environ.get('NOTE_PREVIEW_LENGTH', 200))
+    
+    # Templates: compiled templates are cached on disk across restarts (in the
+    # system temp directory unless TEMPLATE_BYTECODE_CACHE_DIR is set), and
+    # rendered note cards are reused while their note is unchanged
+    TEMPLATE_BYTECODE_CACHE = os.environ.get('TEMPLATE_BYTECODE_CACHE', 'True').lower() in ('true', 't', '1')
+    TEMPLATE_BYTECODE_CACHE_DIR = os.environ.get('TEMPLATE_BYTECODE_CACHE_DIR', '')
+    FRAGMENT_CACHE_ENABLED = os.environ.get('FRAGMENT_CACHE_ENABLED', 'True').lower() in ('true', 't', '1')
+    FRAGMENT_CACHE_TTL = float(os.environ.get('FRAGMENT_CACHE_TTL', 3600))
+    FRAGMENT_CACHE_SIZE = int(os.environ.get('FRAGMENT_CACHE_SIZE', 10000))
+    
+    # JSON responses: import path of the Flask JSON provider class, a subclass of
+    # json_provider.RecordJSONProvider (empty: Flask's default encoding, with db.py
+    # Records as objects), and dates as 'http' (RFC 822, as Flask writes them) or
+    # 'iso' (ISO 8601)
+    JSON_PROVIDER = os.environ.get('JSON_PROVIDER', 'json_provider.FastJSONProvider')
+    JSON_DATE_FORMAT = os.environ.get('JSON_DATE_FORMAT', 'http')
+    
+    # Response compression (opt-in): gzip or brotli (with the brotli package) for
+    # responses of the listed types and at least COMPRESSION_MIN_SIZE bytes.
+    # Streamed exports are compressed chunk by chunk; event streams never are.
+    COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', 'False').lower() in ('true', 't', '1')
+    COMPRESSION_ENCODINGS = [encoding.strip() for encoding in os.environ.get('COMPRESSION_ENCODINGS', 'br,gzip').split(',')
+                             if encoding.strip()]
+    COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 500))
+    COMPRESSION_GZIP_LEVEL = int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6))
+    COMPRESSION_BROTLI_QUALITY = int(os.environ.get('COMPRESSION_BROTLI_QUALITY', 6))
+    COMPRESSION_MIMETYPES = [mimetype.strip() for mimetype in os.environ.get(
+        'COMPRESSION_MIMETYPES',
+        'text/html,application/json,text/plain,text/csv,application/x-ndjson,text/css,text/javascript',
+    ).split(',') if mimetype.strip()]
+    
+    # Logging: level name, 'json' or 'text' output, and records buffered for the
+    # background writer (further records are dropped rather than block a request)
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')
+    LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+    
+    # Statements slower than this are logged with a warning (0 disables)
+    SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 200))
+    
+    # Send per-request database and app timings in Server-Timing headers. Off by
+    # default: they reveal to any client how long its queries take.
+    SERVER_TIMING = os.environ.get('SERVER_TIMING', 'False').lower() in ('true', 't', '1')
+    
+    # Comma-separated usernames allowed to see /admin/metrics
+    ADMIN_USERNAMES = [name.strip() for name in os.environ.get('ADMIN_USERNAMES', '').split(',') if name.strip()]
+    
+    # Bearer token that lets a Prometheus scraper read /admin/metrics (empty: admins only)
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+    
     # Debug mode (should be False in production)
     DEBUG = os.environ.get('DEBUG', 'True').lower() in ('true', 't', '1')
     
@@ -1,37 +1,343 @@
 import pymysql
+import base64
+import json
+import re
+import time
 from datetime import datetime
-from flask import g, current_app
+from flask import g, current_app, session, has_request_context
+from pool import ConnectionPool
+from metrics import InstrumentedCursor, InstrumentedSSCursor
+from cache import TTLCache, QueryCache, MISSING
+from werkzeug.utils import import_string
+import migrations
+import events
+import replicas
+import threading
+from functools import lru_cache
 import logging
 
 # Setup logging
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-def get_db():
-    """Get a database connection."""
+_pool_lock = threading.Lock()
+
+# Words shorter than InnoDB's default innodb_ft_min_token_size are not indexed
+FULLTEXT_MIN_TOKEN_SIZE = 3
+FULLTEXT_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+# Notes store importance as a rank, so that to-dos sort by priority; queries
+# turn it back into the label that the API and templates use
+IMPORTANCE_LABELS = ('low', 'normal', 'high')
+IMPORTANCE_RANKS = {label: rank for rank, label in enumerate(IMPORTANCE_LABELS)}
+IMPORTANCE_LABEL_SQL = f"ELT(n.importance_rank + 1, {', '.join(repr(label) for label in IMPORTANCE_LABELS)})"
+
+# Note columns returned by list queries; content is replaced by a preview
+NOTE_LIST_COLUMNS = ('n.id, n.title, n.created_date, n.updated_date, n.is_todo, n.completed, '
+                     f'{IMPORTANCE_LABEL_SQL} AS importance, n.color, n.category_id, n.user_id, n.version')
+
+class Record(tuple):
+    """A read-only row: a tuple whose values can also be read by column name.
+    
+    List queries return these instead of one dict per row. The column names
+    are stored once per result shape, on a subclass made by record_type().
+    row['title'], row.title, row.get('title'), 'title' in row, keys(),
+    items() and _asdict() work as for a dict; iterating yields the values,
+    as for a tuple.
+    """
+    __slots__ = ()
+    _fields = ()
+    _index = {}
+    
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            try:
+                key = self._index[key]
+            except KeyError:
+                raise KeyError(key) from None
+        return tuple.__getitem__(self, key)
+    
+    def __getattr__(self, name):
+        try:
+            return tuple.__getitem__(self, self._index[name])
+        except KeyError:
+            raise AttributeError(name) from None
+    
+    def __contains__(self, key):
+        return key in self._index
+    
+    def get(self, key, default=None):
+        index = self._index.get(key)
+        return default if index is None else tuple.__getitem__(self, index)
+    
+    def keys(self):
+        return self._fields
+    
+    def items(self):
+        return zip(self._fields, self)
+    
+    def _asdict(self):
+        return dict(zip(self._fields, self))
+    
+    def __reduce__(self):
+        return _make_record, (self._fields, tuple(self))
+    
+    def __repr__(self):
+        return f'Record({self._asdict()!r})'
+
+@lru_cache(maxsize=256)
+def record_type(fields):
+    """Get the Record subclass for rows with these column names."""
+    return type('Record', (Record,), {
+        '__slots__': (),
+        '_fields': fields,
+        '_index': {name: index for index, name in enumerate(fields)},
+    })
+
+def _make_record(fields, values):
+    return record_type(fields)(values)
+
+def as_records(description, rows):
+    """Wrap tuple rows from a DB-API cursor in Records named after its columns."""
+    record = record_type(tuple(column[0] for column in description))
+    return list(map(record, rows))
+
+class RecordCursor(InstrumentedCursor):
+    """InstrumentedCursor returning Records instead of dicts."""
+    
+    def _do_get_result(self):
+        # Skip DictCursorMixin: rows stay tuples until wrapped below
+        pymysql.cursors.Cursor._do_get_result(self)
+        if self.description and self._rows:
+            self._rows = as_records(self.description, self._rows)
+
+def _connect_kwargs(config):
+    return {
+        'host': config['DB_HOST'],
+        'port': config['DB_PORT'],
+        'user': config['DB_USER'],
+        'password': config['DB_PASSWORD'],
+        'database': config['DB_NAME'],
+        'charset': 'utf8mb4',
+        'cursorclass': InstrumentedCursor
+    }
+
+def _pool_kwargs(config):
+    return {
+        'size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_POOL_MAX_OVERFLOW'],
+        'timeout': config['DB_POOL_TIMEOUT'],
+        'max_idle': config['DB_POOL_MAX_IDLE'],
+        'pre_ping': config['DB_POOL_PRE_PING']
+    }
+
+def get_pool():
+    """Get the application's connection pool, creating it on first use."""
+    pool = current_app.extensions.get('db_pool')
+    if pool is None:
+        with _pool_lock:
+            pool = current_app.extensions.get('db_pool')
+            if pool is None:
+                config = current_app.config
+                pool = ConnectionPool(_connect_kwargs(config), **_pool_kwargs(config))
+                current_app.extensions['db_pool'] = pool
+    return pool
+
+def get_replicas():
+    """Get the app's ReplicaSet of read replicas, or None when DB_REPLICAS is empty."""
+    if not current_app.config['DB_REPLICAS']:
+        return None
+    replica_set = current_app.extensions.get('db_replicas')
+    if replica_set is None:
+        with _pool_lock:
+            replica_set = current_app.extensions.get('db_replicas')
+            if replica_set is None:
+                config = current_app.config
+                replica_set = replicas.replica_set(
+                    _connect_kwargs(config),
+                    config['DB_REPLICAS'],
+                    max_lag=config['DB_REPLICA_MAX_LAG'],
+                    check_interval=config['DB_REPLICA_CHECK_INTERVAL'],
+                    **_pool_kwargs(config)
+                )
+                current_app.extensions['db_replicas'] = replica_set
+    return replica_set
+
+def get_write_pins():
+    """Get the ids of users who wrote within DB_READ_YOUR_WRITES seconds in this process."""
+    pins = current_app.extensions.get('db_write_pins')
+    if pins is None:
+        pins = current_app.extensions.setdefault('db_write_pins', TTLCache(
+            maxsize=10000,
+            ttl=current_app.config['DB_READ_YOUR_WRITES']
+        ))
+    return pins
+
+def get_query_cache():
+    """Get the app's query result cache, or None when caching is disabled."""
+    if not current_app.config['QUERY_CACHE_ENABLED']:
+        return None
+    cache = current_app.extensions.get('query_cache')
+    if cache is None:
+        with _pool_lock:
+            cache = current_app.extensions.get('query_cache')
+            if cache is None:
+                config = current_app.config
+                shared = None
+                if config['QUERY_CACHE_BACKEND']:
+                    shared = import_string(config['QUERY_CACHE_BACKEND'])(config)
+                cache = QueryCache(
+                    TTLCache(maxsize=config['QUERY_CACHE_SIZE'], ttl=config['QUERY_CACHE_TTL']),
+                    shared=shared,
+                    ttl=config['QUERY_CACHE_TTL']
+                )
+                current_app.extensions['query_cache'] = cache
+    return cache
+
+def get_category_id_cache():
+    """Get the per-user category name -> id cache, or None when it is disabled."""
+    if not current_app.config['CATEGORY_CACHE_ENABLED']:
+        return None
+    cache = current_app.extensions.get('category_ids')
+    if cache is None:
+        cache = current_app.extensions.setdefault('category_ids', TTLCache(
+            maxsize=current_app.config['CATEGORY_CACHE_SIZE'],
+            ttl=current_app.config['CATEGORY_CACHE_TTL']
+        ))
+    return cache
+
+def _cached_category_ids(user_id):
+    """Category name -> id pairs known for a user, without querying."""
+    cache = get_category_id_cache()
+    if cache is None:
+        return {}
+    return cache.get(user_id) or {}
+
+def _remember_categories(user_id, ids):
+    """Add committed category name -> id pairs to the category id cache."""
+    cache = get_category_id_cache()
+    if cache is not None and ids:
+        cache.set(user_id, {**_cached_category_ids(user_id), **ids})
+
+def _forget_categories(user_id):
+    """Drop a user's cached category ids, e.g. after a delete or a failed write.
+    
+    Another process may delete (and recreate) a category while its id is
+    cached here, so writes check cached ids with _existing_category_ids()
+    before using them and forget the user's ids when one is gone.
+    """
+    cache = get_category_id_cache()
+    if cache is not None:
+        cache.delete(user_id)
+
+def _cached(namespace, user_id, params, load):
+    """Return load()'s result through the query cache, if it is enabled.
+    
+    Results read from a replica are not stored: the replica may not have
+    the write that started the current cache generation yet, and the
+    cache would go on serving its stale result after the replica catches up.
+    """
+    cache = get_query_cache()
+    if cache is None:
+        return load()
+    value, key = cache.lookup(namespace, user_id, params)
+    if value is MISSING:
+        from_replica = not _read_from_primary(user_id) and _replica_connection() is not None
+        value = load()
+        if not from_replica:
+            cache.store(key, value)
+    return value
+
+def _invalidate(user_id, *namespaces):
+    """Drop cached query results after a committed write."""
+    cache = get_query_cache()
+    if cache is not None:
+        cache.invalidate(user_id, *namespaces)
+
+def _publish(user_id, version, changes):
+    """Send a committed write to the user's change feed; the event id is the new data_version."""
+    if not current_app.config['EVENTS_ENABLED']:
+        return
+    events.get_broker().publish(user_id, version, {'version': version, 'changes': changes})
+
+def _note_change(action, note_id, version=None):
+    change = {'entity': 'note', 'action': action, 'id': note_id}
+    if version is not None:
+        change['version'] = version
+    return change
+
+def _category_change(action, category_id):
+    return {'entity': 'category', 'action': action, 'id': category_id}
+
+def get_db(read=False, user_id=None):
+    """Get a database connection for the current request from the pool.
+    
+    With read=True the connection may be a read replica's, unless the
+    reads must see recent writes (see _read_from_primary). Queries that
+    write, or read rows they are about to change, use the primary.
+    """
+    if read and not _read_from_primary(user_id):
+        conn = _replica_connection()
+        if conn is not None:
+            return conn
     if 'db' not in g:
-        g.db = pymysql.connect(
-            host=current_app.config['DB_HOST'],
-            user=current_app.config['DB_USER'],
-            password=current_app.config['DB_PASSWORD'],
-            database=current_app.config['DB_NAME'],
-            charset='utf8mb4',
-            cursorclass=pymysql.cursors.DictCursor
-        )
+        g.db = get_pool().acquire()
     return g.db
 
+def _read_from_primary(user_id):
+    """Whether reads of user_id's data have to go to the primary.
+    
+    That is the case without healthy replicas, once the request has
+    written, and for DB_READ_YOUR_WRITES seconds after the user wrote: in
+    this process for any client, and in every process for the browser
+    session that wrote, which carries the deadline in its cookie.
+    """
+    if get_replicas() is None or g.get('db_primary_only'):
+        return True
+    if user_id is not None and get_write_pins().get(user_id):
+        return True
+    return has_request_context() and session.get('_primary_until', 0) > time.time()
+
+def _replica_connection():
+    """Check out the request's replica connection; None if no replica is usable."""
+    if 'db_replica' not in g:
+        replica_set = get_replicas()
+        replica = replica_set.choose()
+        if replica is not None:
+            try:
+                g.db_read = replica.pool.acquire()
+            except Exception as e:
+                replica_set.eject(replica, e)
+                replica = None
+        replica_set.count_read(replica)
+        g.db_replica = replica
+    return g.get('db_read')
+
+def _pin_to_primary(user_id):
+    """Send reads to the primary after a write by user_id; see _read_from_primary."""
+    if get_replicas() is None:
+        return
+    g.db_primary_only = True
+    get_write_pins().set(user_id, True)
+    if has_request_context() and session.get('user_id') == user_id:
+        session['_primary_until'] = time.time() + current_app.config['DB_READ_YOUR_WRITES']
+
 def close_db(e=None):
-    """Close the database connection."""
+    """Return the request's database connections to their pools."""
     db = g.pop('db', None)
     if db is not None:
-        db.close()
+        get_pool().release(db)
+    replica = g.pop('db_replica', None)
+    db_read = g.pop('db_read', None)
+    if db_read is not None:
+        replica.pool.release(db_read)
 
 def init_db():
-    """Initialize the database with the required tables."""
+    """Create the database if needed and apply pending schema migrations."""
     try:
         # First connect without database to check if it exists
         conn = pymysql.connect(
             host=current_app.config['DB_HOST'],
+            port=current_app.config['DB_PORT'],
             user=current_app.config['DB_USER'],
             password=current_app.config['DB_PASSWORD'],
             charset='utf8mb4'
@@ -41,95 +347,39 @@ def init_db():
             cursor.execute(f"CREATE DATABASE IF NOT EXISTS {current_app.config['DB_NAME']} CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci")
         conn.close()
         
-        # Now connect with the database and initialize tables
-        db = get_db()
-        with db.cursor() as cursor:
-            # Create User table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS user (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    username VARCHAR(64) UNIQUE NOT NULL,
-                    email VARCHAR(120) UNIQUE NOT NULL,
-                    password_hash VARCHAR(255) NOT NULL
-                )
-            """)
-            
-            # Create Category table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS category (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    name VARCHAR(64) NOT NULL,
-                    user_id INT NOT NULL,
-                    FOREIGN KEY (user_id) REFERENCES user(id) ON DELETE CASCADE,
-                    UNIQUE (user_id, name)
-                )
-            """)
-            
-            # Create Note table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS note (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    title VARCHAR(100) NOT NULL,
-                    content TEXT,
-                    created_date DATETIME NOT NULL,
-                    updated_date DATETIME NOT NULL,
-                    is_todo TINYINT(1) NOT NULL DEFAULT 0,
-                    completed TINYINT(1) NOT NULL DEFAULT 0,
-                    importance VARCHAR(20) DEFAULT 'normal',
-                    color VARCHAR(20) DEFAULT 'blue',
-                    category_id INT,
-                    user_id INT NOT NULL,
-                    FOREIGN KEY (category_id) REFERENCES category(id) ON DELETE SET NULL,
-                    FOREIGN KEY (user_id) REFERENCES user(id) ON DELETE CASCADE
-                )
-            """)
-            
-            # Create indexes for performance (safely)
-            try:
-                cursor.execute("CREATE INDEX idx_note_user_id ON note(user_id)")
-            except Exception as e:
-                if "Duplicate key name" not in str(e):
-                    logger.warning(f"Could not create index idx_note_user_id: {str(e)}")
-                    
-            try:
-                cursor.execute("CREATE INDEX idx_note_category_id ON note(category_id)")
-            except Exception as e:
-                if "Duplicate key name" not in str(e):
-                    logger.warning(f"Could not create index idx_note_category_id: {str(e)}")
-                    
-            try:
-                cursor.execute("CREATE INDEX idx_note_is_todo ON note(is_todo)")
-            except Exception as e:
-                if "Duplicate key name" not in str(e):
-                    logger.warning(f"Could not create index idx_note_is_todo: {str(e)}")
-            
-        db.commit()
-        logger.debug("Database initialized successfully")
+        # Now connect with the database and bring the schema up to date
+        applied = migrations.upgrade(get_db())
+        logger.debug("Database initialized successfully (%s migrations applied)", len(applied))
+        return applied
     except Exception as e:
-        logger.error(f"Error initializing database: {str(e)}")
+        logger.error("Error initializing database: %s", e)
         raise
 
+def _read_one(query, params, user_id=None):
+    """Fetch one row, from a replica when allowed for user_id.
+    
+    A row the replica does not have is looked for again on the primary,
+    since it may have been written moments ago, e.g. by another process.
+    """
+    db = get_db(read=True, user_id=user_id)
+    with db.cursor() as cursor:
+        cursor.execute(query, params)
+        row = cursor.fetchone()
+    if row is None and db is g.get('db_read'):
+        with get_db().cursor() as cursor:
+            cursor.execute(query, params)
+            row = cursor.fetchone()
+    return row
+
 # User-related functions
 def get_user_by_id(user_id):
-    db = get_db()
-    with db.cursor() as cursor:
-        cursor.execute('SELECT * FROM user WHERE id = %s', (user_id,))
-        user = cursor.fetchone()
-    return user
+    return _read_one('SELECT * FROM user WHERE id = %s', (user_id,), user_id)
 
 def get_user_by_username(username):
-    db = get_db()
-    with db.cursor() as cursor:
-        cursor.execute('SELECT * FROM user WHERE username = %s', (username,))
-        user = cursor.fetchone()
-    return user
+    return _read_one('SELECT * FROM user WHERE username = %s', (username,))
 
 def get_user_by_email(email):
-    db = get_db()
-    with db.cursor() as cursor:
-        cursor.execute('SELECT * FROM user WHERE email = %s', (email,))
-        user = cursor.fetchone()
-    return user
+    return _read_one('SELECT * FROM user WHERE email = %s', (email,))
 
 def create_user(username, email, password_hash):
     db = get_db()
@@ -141,200 +391,941 @@ def create_user(username, email, password_hash):
             )
             user_id = cursor.lastrowid
         db.commit()
+        _pin_to_primary(user_id)
         return user_id
     except Exception as e:
         db.rollback()
-        logger.error(f"Error creating user: {str(e)}")
+        logger.error("Error creating user: %s", e)
         raise
 
-# Category-related functions
-def get_categories_by_user(user_id):
+def update_user_password_hash(user_id, password_hash):
     db = get_db()
-    with db.cursor() as cursor:
-        cursor.execute('SELECT * FROM category WHERE user_id = %s ORDER BY name', (user_id,))
-        categories = cursor.fetchall()
-    return categories
+    try:
+        with db.cursor() as cursor:
+            cursor.execute('UPDATE user SET password_hash = %s WHERE id = %s', (password_hash, user_id))
+        db.commit()
+        _pin_to_primary(user_id)
+    except Exception as e:
+        db.rollback()
+        logger.error("Error updating password hash: %s", e)
+        raise
 
-def get_category_by_id(category_id, user_id):
+def revoke_token(jti, user_id, expires_at):
+    """Record an API token id as revoked until expires_at (UTC), pruning expired entries.
+    
+    Returns 1 if this call revoked the token, 0 if it was already revoked.
+    """
     db = get_db()
-    with db.cursor() as cursor:
-        cursor.execute(
-            'SELECT * FROM category WHERE id = %s AND user_id = %s', 
-            (category_id, user_id)
-        )
-        category = cursor.fetchone()
-    return category
+    now = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+    try:
+        with db.cursor() as cursor:
+            cursor.execute('DELETE FROM revoked_token WHERE expires_at <= %s', (now,))
+            cursor.execute(
+                'INSERT IGNORE INTO revoked_token (jti, user_id, expires_at) VALUES (%s, %s, %s)',
+                (jti, user_id, expires_at.strftime('%Y-%m-%d %H:%M:%S'))
+            )
+            revoked = cursor.rowcount
+        db.commit()
+        _pin_to_primary(user_id)
+        return revoked
+    except Exception as e:
+        db.rollback()
+        logger.error("Error revoking token: %s", e)
+        raise
 
-def get_category_by_name(name, user_id):
+def get_revoked_token_ids():
+    """Get the ids of revoked API tokens that have not expired yet."""
+    # From the primary: a lagging replica would accept a just-revoked token again
     db = get_db()
     with db.cursor() as cursor:
-        cursor.execute(
-            'SELECT * FROM category WHERE name = %s AND user_id = %s', 
-            (name, user_id)
-        )
-        category = cursor.fetchone()
-    return category
+        cursor.execute('SELECT jti FROM revoked_token WHERE expires_at > %s',
+                       (datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'),))
+        return {row['jti'] for row in cursor.fetchall()}
 
-def create_category(name, user_id):
-    # Check if category already exists
-    existing = get_category_by_name(name, user_id)
-    if existing:
-        return existing['id']
+def get_user_version(user_id):
+    """Get (data_version, data_modified) for a user's notes and categories.
+    
+    data_version increases with every note or category write, so together
+    with the user id it identifies a snapshot of the user's data.
+    """
+    db = get_db(read=True, user_id=user_id)
+    with db.cursor() as cursor:
+        cursor.execute('SELECT data_version, data_modified FROM user WHERE id = %s', (user_id,))
+        row = cursor.fetchone()
+    if not row:
+        return 0, None
+    return row['data_version'], row['data_modified']
+
+def _bump_user_version(cursor, user_id):
+    """Advance a user's data_version inside the caller's transaction; returns the new version.
+    
+    Writes call this first and stamp the rows they change with the new
+    version as change_seq. The user row stays locked until commit, so a
+    user's writes commit in version order, which /api/sync relies on.
+    Writes that turn out to change nothing roll back to undo the bump.
+    """
+    _pin_to_primary(user_id)
+    # data_modified is UTC because it is only used for HTTP Last-Modified
+    cursor.execute(
+        '''UPDATE user 
+           SET data_version = LAST_INSERT_ID(data_version + 1), data_modified = %s 
+           WHERE id = %s''',
+        (datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'), user_id)
+    )
+    cursor.execute('SELECT LAST_INSERT_ID() AS version')
+    return cursor.fetchone()['version']
+
+def _add_tombstones(cursor, user_id, entity, ids, change_seq):
+    """Record deleted notes or categories for /api/sync in the caller's transaction."""
+    # An id can come back on MySQL before 8.0, which may reuse the highest
+    # AUTO_INCREMENT value after a restart
+    cursor.executemany(
+        '''INSERT INTO tombstone (entity, entity_id, user_id, change_seq) VALUES (%s, %s, %s, %s) 
+           ON DUPLICATE KEY UPDATE user_id = VALUES(user_id), change_seq = VALUES(change_seq)''',
+        [(entity, entity_id, user_id, change_seq) for entity_id in ids]
+    )
+
+# Category-related functions
+def get_categories_by_user(user_id):
+    def load():
+        db = get_db(read=True, user_id=user_id)
+        with db.cursor() as cursor:
+            cursor.execute('SELECT * FROM category WHERE user_id = %s ORDER BY name', (user_id,))
+            return cursor.fetchall()
+    return _cached('categories', user_id, (), load)
+
+def get_category_by_id(category_id, user_id):
+    return _read_one(
+        'SELECT * FROM category WHERE id = %s AND user_id = %s', 
+        (category_id, user_id), user_id
+    )
+
+def get_category_by_name(name, user_id):
+    return _read_one(
+        'SELECT * FROM category WHERE name = %s AND user_id = %s', 
+        (name, user_id), user_id
+    )
+
+def _upsert_category(cursor, name, user_id, change_seq):
+    """Get or create a category with one statement in the caller's transaction.
     
+    Returns (id, created). For an existing name, LAST_INSERT_ID(id) hands
+    back that row's id, so there is no separate lookup to race with a
+    concurrent insert of the same name.
+    """
+    cursor.execute(
+        '''INSERT INTO category (name, user_id, change_seq) VALUES (%s, %s, %s) 
+           ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id)''',
+        (name, user_id, change_seq)
+    )
+    # One row is affected by an insert, none when the existing row is kept
+    return cursor.lastrowid, cursor.rowcount == 1
+
+def upsert_category(name, user_id):
+    """Get or create a category by name; returns (id, created)."""
     db = get_db()
     try:
         with db.cursor() as cursor:
-            cursor.execute(
-                'INSERT INTO category (name, user_id) VALUES (%s, %s)',
-                (name, user_id)
-            )
-            category_id = cursor.lastrowid
-        db.commit()
-        return category_id
+            version = _bump_user_version(cursor, user_id)
+            category_id, created = _upsert_category(cursor, name, user_id, version)
+        if created:
+            db.commit()
+        else:
+            db.rollback()
+        _remember_categories(user_id, {name: category_id})
+        if created:
+            _invalidate(user_id, 'categories')
+            _publish(user_id, version, [_category_change('created', category_id)])
+        return category_id, created
     except Exception as e:
         db.rollback()
-        logger.error(f"Error creating category: {str(e)}")
+        logger.error("Error creating category: %s", e)
         raise
 
+def create_category(name, user_id):
+    """Get or create a category by name; returns its id."""
+    return upsert_category(name, user_id)[0]
+
 def delete_category(category_id, user_id):
     db = get_db()
     try:
         with db.cursor() as cursor:
+            version = _bump_user_version(cursor, user_id)
+            # Detach notes explicitly (rather than via ON DELETE SET NULL) so
+            # their versions change along with their category
+            cursor.execute(
+                'SELECT id, version FROM note WHERE user_id = %s AND category_id = %s FOR UPDATE',
+                (user_id, category_id)
+            )
+            detached = cursor.fetchall()
+            cursor.execute(
+                '''UPDATE note SET category_id = NULL, version = version + 1, change_seq = %s 
+                   WHERE category_id = %s AND user_id = %s''',
+                (version, category_id, user_id)
+            )
             cursor.execute('DELETE FROM category WHERE id = %s AND user_id = %s', (category_id, user_id))
             affected_rows = cursor.rowcount
-        db.commit()
+            if affected_rows:
+                _add_tombstones(cursor, user_id, 'category', [category_id], version)
+        if affected_rows:
+            db.commit()
+        else:
+            db.rollback()
+        if affected_rows:
+            _forget_categories(user_id)
+            _invalidate(user_id, 'categories', 'notes')
+            _publish(user_id, version, [_category_change('deleted', category_id)] + [
+                _note_change('updated', note['id'], note['version'] + 1) for note in detached
+            ])
         return affected_rows
     except Exception as e:
         db.rollback()
-        logger.error(f"Error deleting category: {str(e)}")
+        logger.error("Error deleting category: %s", e)
         raise
 
 # Note-related functions
-def get_notes_by_user(user_id, category_id=None, search=None):
-    db = get_db()
-    query = '''
-        SELECT n.*, c.name as category_name 
-        FROM note n 
-        LEFT JOIN category c ON n.category_id = c.id 
-        WHERE n.user_id = %s
-    '''
-    params = [user_id]
+def fulltext_query(search):
+    """Turn free-form search text into a MySQL boolean-mode FULLTEXT query.
+    
+    Every word is required and prefix-matched, so "meet note" finds
+    "meeting notes". Returns None when no word is long enough to be in the
+    FULLTEXT index (innodb_ft_min_token_size); callers then fall back to LIKE.
+    """
+    words = [word for word in FULLTEXT_WORD_RE.findall(search.lower())
+             if len(word) >= FULLTEXT_MIN_TOKEN_SIZE]
+    if not words:
+        return None
+    return ' '.join(f'+{word}*' for word in words)
+
+def encode_cursor(values):
+    """Encode the sort key of the last row on a page as an opaque cursor."""
+    values = [value.strftime('%Y-%m-%d %H:%M:%S') if isinstance(value, datetime) else value
+              for value in values]
+    payload = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, size):
+    """Decode a cursor made by encode_cursor, raising ValueError if it is malformed."""
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(payload)
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError('Invalid cursor')
+    return values
+
+def _list_columns(full):
+    """Columns selected by list queries: a bounded preview unless full content is wanted."""
+    if full:
+        return f'{NOTE_LIST_COLUMNS}, n.content'
+    return f'{NOTE_LIST_COLUMNS}, LEFT(n.content, {int(current_app.config["NOTE_PREVIEW_LENGTH"])}) as preview'
+
+def _notes_query(user_id, category_id, search, cursor=None, limit=None, full=False):
+    """Build the note list query; returns (query, params, sort key columns)."""
+    match_query = fulltext_query(search) if search else None
+    columns = _list_columns(full)
+    
+    if match_query:
+        query = f'''
+            SELECT {columns}, c.name as category_name,
+                   MATCH(n.title, n.content) AGAINST (%s IN BOOLEAN MODE) as relevance
+            FROM note n 
+            LEFT JOIN category c ON n.category_id = c.id 
+            WHERE n.user_id = %s
+        '''
+        params = [match_query, user_id]
+        sort_key = ('relevance', 'updated_date', 'id')
+    else:
+        query = f'''
+            SELECT {columns}, c.name as category_name 
+            FROM note n 
+            LEFT JOIN category c ON n.category_id = c.id 
+            WHERE n.user_id = %s
+        '''
+        params = [user_id]
+        sort_key = ('updated_date', 'id')
     
     if category_id:
         query += ' AND n.category_id = %s'
         params.append(category_id)
     
-    if search:
+    if match_query:
+        query += ' AND MATCH(n.title, n.content) AGAINST (%s IN BOOLEAN MODE)'
+        params.append(match_query)
+    elif search:
+        # Too short for the FULLTEXT index; scan with LIKE instead
         query += ' AND (n.title LIKE %s OR n.content LIKE %s)'
         search_param = f'%{search}%'
         params.append(search_param)
         params.append(search_param)
     
-    query += ' ORDER BY n.updated_date DESC'
+    if cursor:
+        values = decode_cursor(cursor, len(sort_key))
+        if match_query:
+            query += ' AND (MATCH(n.title, n.content) AGAINST (%s IN BOOLEAN MODE), n.updated_date, n.id) < (%s, %s, %s)'
+            params.append(match_query)
+            params.extend(values)
+        else:
+            query += ' AND (n.updated_date < %s OR (n.updated_date = %s AND n.id < %s))'
+            params.extend([values[0], values[0], values[1]])
     
-    with db.cursor() as cursor:
-        cursor.execute(query, params)
-        notes = cursor.fetchall()
+    if match_query:
+        query += ' ORDER BY relevance DESC, n.updated_date DESC, n.id DESC'
+    else:
+        query += ' ORDER BY n.updated_date DESC, n.id DESC'
     
-    return notes
+    if limit:
+        query += ' LIMIT %s'
+        params.append(limit)
+    
+    return query, params, sort_key
 
-def get_todos_by_user(user_id, completed=None):
-    db = get_db()
-    query = '''
-        SELECT n.*, c.name as category_name 
+def _todos_query(user_id, completed, cursor=None, limit=None):
+    """Build the to-do list query; returns (query, params, sort key columns)."""
+    query = f'''
+        SELECT {_list_columns(False)}, n.importance_rank, c.name as category_name 
         FROM note n 
         LEFT JOIN category c ON n.category_id = c.id 
         WHERE n.user_id = %s AND n.is_todo = 1
     '''
     params = [user_id]
+    sort_key = ('importance_rank', 'updated_date', 'id')
     
     if completed is not None:
         query += ' AND n.completed = %s'
         params.append(1 if completed else 0)
     
-    query += ' ORDER BY n.importance DESC, n.updated_date DESC'
+    if cursor:
+        query += ' AND (n.importance_rank, n.updated_date, n.id) < (%s, %s, %s)'
+        params.extend(decode_cursor(cursor, len(sort_key)))
     
-    with db.cursor() as cursor:
+    # Served in index order by idx_note_user_todo_rank when completed is given
+    query += ' ORDER BY n.importance_rank DESC, n.updated_date DESC, n.id DESC'
+    
+    if limit:
+        query += ' LIMIT %s'
+        params.append(limit)
+    
+    return query, params, sort_key
+
+def _fetch_page(query, params, sort_key, limit, user_id):
+    """Run a query built with limit + 1 and split off the next-page cursor."""
+    db = get_db(read=True, user_id=user_id)
+    with db.cursor(RecordCursor) as cursor:
         cursor.execute(query, params)
-        todos = cursor.fetchall()
+        rows = cursor.fetchall()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1][key] for key in sort_key])
+    return rows, next_cursor
+
+def get_notes_by_user(user_id, category_id=None, search=None, full=False):
+    """Get a user's notes with a content preview, or full content if full is set."""
+    def load():
+        db = get_db(read=True, user_id=user_id)
+        query, params, _ = _notes_query(user_id, category_id, search, full=full)
+        with db.cursor(RecordCursor) as cursor:
+            cursor.execute(query, params)
+            return cursor.fetchall()
+    return _cached('notes', user_id, ('list', category_id, search, full), load)
+
+def get_notes_page(user_id, limit, cursor=None, category_id=None, search=None, full=False):
+    """Get one page of a user's notes; returns (notes, next_cursor or None).
     
-    return todos
+    Raises ValueError if the cursor is malformed.
+    """
+    query, params, sort_key = _notes_query(user_id, category_id, search, cursor, limit + 1, full)
+    return _cached('notes', user_id, ('page', limit, cursor, category_id, search, full),
+                   lambda: _fetch_page(query, params, sort_key, limit, user_id))
+
+def get_todos_by_user(user_id, completed=None):
+    def load():
+        db = get_db(read=True, user_id=user_id)
+        query, params, _ = _todos_query(user_id, completed)
+        with db.cursor(RecordCursor) as cursor:
+            cursor.execute(query, params)
+            return cursor.fetchall()
+    return _cached('notes', user_id, ('todos', completed), load)
+
+def get_todos_page(user_id, limit, cursor=None, completed=None):
+    """Get one page of a user's to-dos; returns (todos, next_cursor or None).
+    
+    Raises ValueError if the cursor is malformed.
+    """
+    query, params, sort_key = _todos_query(user_id, completed, cursor, limit + 1)
+    return _cached('notes', user_id, ('todos-page', limit, cursor, completed),
+                   lambda: _fetch_page(query, params, sort_key, limit, user_id))
 
 def get_note_by_id(note_id, user_id):
-    db = get_db()
-    with db.cursor() as cursor:
-        cursor.execute(
-            '''SELECT n.*, c.name as category_name 
-               FROM note n 
-               LEFT JOIN category c ON n.category_id = c.id 
-               WHERE n.id = %s AND n.user_id = %s''', 
-            (note_id, user_id)
-        )
-        note = cursor.fetchone()
-    return note
+    return _read_one(
+        f'''SELECT n.*, {IMPORTANCE_LABEL_SQL} AS importance, c.name as category_name 
+           FROM note n 
+           LEFT JOIN category c ON n.category_id = c.id 
+           WHERE n.id = %s AND n.user_id = %s''', 
+        (note_id, user_id), user_id
+    )
 
-def create_note(title, content, category_id, is_todo, importance, color, user_id):
+def create_note(title, content, category_id, is_todo, importance, color, user_id, category_name=None):
+    """Insert a note; returns its id. importance is one of IMPORTANCE_LABELS.
+    
+    With category_name, the category is looked up or created in the same
+    transaction and category_id is ignored.
+    """
     now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     
     db = get_db()
     try:
         with db.cursor() as cursor:
+            version = _bump_user_version(cursor, user_id)
+            created_categories = []
+            if category_name:
+                category_id = _resolve_category_id(cursor, category_name, user_id, version, created_categories)
             cursor.execute(
                 '''INSERT INTO note 
-                   (title, content, created_date, updated_date, is_todo, completed, importance, color, category_id, user_id) 
-                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)''',
-                (title, content, now, now, 1 if is_todo else 0, 0, importance, color, category_id, user_id)
+                   (title, content, created_date, updated_date, is_todo, completed, importance_rank, color, 
+                    category_id, user_id, change_seq) 
+                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)''',
+                (title, content, now, now, 1 if is_todo else 0, 0, IMPORTANCE_RANKS[importance], color,
+                 category_id, user_id, version)
             )
             note_id = cursor.lastrowid
         db.commit()
+        if category_name:
+            _remember_categories(user_id, {category_name: category_id})
+        _invalidate(user_id, 'notes')
+        if created_categories:
+            _invalidate(user_id, 'categories')
+        _publish(user_id, version, [_category_change('created', category_id) for category_id in created_categories]
+                 + [_note_change('created', note_id, 1)])
         return note_id
     except Exception as e:
         db.rollback()
-        logger.error(f"Error creating note: {str(e)}")
+        if category_name:
+            _forget_categories(user_id)
+        logger.error("Error creating note: %s", e)
         raise
 
-def update_note(note_id, user_id, updates):
-    if not updates:
-        return 0
-    
-    # Add updated_date
-    updates['updated_date'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    
-    # Build the SET clause and parameters
-    set_clauses = []
-    params = []
-    
-    for key, value in updates.items():
-        set_clauses.append(f"{key} = %s")
-        params.append(value)
+def update_note(note_id, user_id, updates, expected_version=None, category_name=None):
+    """Update a note's columns; returns the number of rows changed.
     
-    # Add WHERE clause parameters
-    params.extend([note_id, user_id])
+    With expected_version, the update only applies if the note is still at
+    that version, so 0 also means a concurrent change got there first.
+    With category_name, the note moves to that category, which is looked up
+    or created in the same transaction. An 'importance' update is a label.
+    """
+    if not updates and not category_name:
+        return 0
+    if 'importance' in updates:
+        updates['importance_rank'] = IMPORTANCE_RANKS[updates.pop('importance')]
     
     db = get_db()
     try:
         with db.cursor() as cursor:
+            version = _bump_user_version(cursor, user_id)
+            created_categories = []
+            if category_name:
+                updates['category_id'] = _resolve_category_id(cursor, category_name, user_id, version,
+                                                               created_categories)
+            
+            # Add updated_date and the change sequence
+            updates['updated_date'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            updates['change_seq'] = version
+            
+            # Build the SET clause and parameters
+            set_clauses = []
+            params = []
+            
+            for key, value in updates.items():
+                set_clauses.append(f"{key} = %s")
+                params.append(value)
+            
+            set_clauses.append("version = version + 1")
+            
+            # Add WHERE clause parameters
+            params.extend([note_id, user_id])
+            where = 'id = %s AND user_id = %s'
+            if expected_version is not None:
+                where += ' AND version = %s'
+                params.append(expected_version)
+            
             query = f'''UPDATE note 
                       SET {", ".join(set_clauses)} 
-                      WHERE id = %s AND user_id = %s'''
+                      WHERE {where}'''
             cursor.execute(query, params)
             affected_rows = cursor.rowcount
-        db.commit()
+            if affected_rows:
+                if expected_version is not None:
+                    note_version = expected_version + 1
+                else:
+                    cursor.execute('SELECT version FROM note WHERE id = %s', (note_id,))
+                    note_version = cursor.fetchone()['version']
+        if affected_rows or created_categories:
+            db.commit()
+        else:
+            db.rollback()
+        if category_name:
+            _remember_categories(user_id, {category_name: updates['category_id']})
+        if created_categories:
+            _invalidate(user_id, 'categories')
+        if affected_rows:
+            _invalidate(user_id, 'notes')
+        if affected_rows or created_categories:
+            changes = [_category_change('created', category_id) for category_id in created_categories]
+            if affected_rows:
+                changes.append(_note_change('updated', note_id, note_version))
+            _publish(user_id, version, changes)
         return affected_rows
     except Exception as e:
         db.rollback()
-        logger.error(f"Error updating note: {str(e)}")
+        if category_name:
+            _forget_categories(user_id)
+        logger.error("Error updating note: %s", e)
         raise
 
 def delete_note(note_id, user_id):
     db = get_db()
     try:
         with db.cursor() as cursor:
+            version = _bump_user_version(cursor, user_id)
             cursor.execute('DELETE FROM note WHERE id = %s AND user_id = %s', (note_id, user_id))
             affected_rows = cursor.rowcount
-        db.commit()
+            if affected_rows:
+                _add_tombstones(cursor, user_id, 'note', [note_id], version)
+        if affected_rows:
+            db.commit()
+        else:
+            db.rollback()
+        if affected_rows:
+            _invalidate(user_id, 'notes')
+            _publish(user_id, version, [_note_change('deleted', note_id)])
         return affected_rows
     except Exception as e:
         db.rollback()
-        logger.error(f"Error deleting note: {str(e)}")
-        raise
\ No newline at end of file
+        logger.error("Error deleting note: %s", e)
+        raise
+
+# Batched note operations
+def _existing_category_ids(cursor, user_id, ids):
+    """Return those of the user's category ids that still exist, in the caller's transaction.
+    
+    The rows are share-locked, so they cannot be deleted before the
+    transaction's notes referring to them commit.
+    """
+    placeholders = ', '.join(['%s'] * len(ids))
+    cursor.execute(
+        f'SELECT id FROM category WHERE user_id = %s AND id IN ({placeholders}) LOCK IN SHARE MODE',
+        [user_id, *ids]
+    )
+    return {row['id'] for row in cursor.fetchall()}
+
+def _resolve_category_id(cursor, name, user_id, change_seq, created=None):
+    """Get or create a category by name using the caller's transaction.
+    
+    Names in the category id cache need one primary key lookup, others one
+    upsert. The ids of categories it creates are appended to the created
+    list, if given. Callers pass what they resolved to _remember_categories()
+    once their transaction has committed.
+    """
+    category_id = _cached_category_ids(user_id).get(name)
+    if category_id is not None:
+        if _existing_category_ids(cursor, user_id, [category_id]):
+            return category_id
+        # Deleted by another process, perhaps recreated under a new id
+        _forget_categories(user_id)
+    category_id, is_new = _upsert_category(cursor, name, user_id, change_seq)
+    if is_new and created is not None:
+        created.append(category_id)
+    return category_id
+
+def apply_note_batch(user_id, operations):
+    """Apply a list of validated note operations in a single transaction.
+    
+    Each operation is a dict with an 'op' of:
+      create   -- title, content, category, is_todo, importance, color
+      update   -- id, updates (column -> value) and optionally category
+      complete -- id, completed
+      delete   -- id
+    
+    Operations run grouped by kind (creates, updates, completes, deletes)
+    rather than in list order. Operations on notes the user does not own
+    report 'not_found' without failing the batch; any database error rolls
+    back the whole batch. Returns one result dict per operation, in order.
+    """
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    results = [None] * len(operations)
+    target_ids = {op['id'] for op in operations if op['op'] != 'create'}
+    
+    categories = {}
+    db = get_db()
+    try:
+        with db.cursor() as cursor:
+            version = _bump_user_version(cursor, user_id)
+            existing = set()
+            if target_ids:
+                placeholders = ', '.join(['%s'] * len(target_ids))
+                cursor.execute(
+                    f'SELECT id FROM note WHERE user_id = %s AND id IN ({placeholders}) FOR UPDATE',
+                    [user_id, *target_ids]
+                )
+                existing = {row['id'] for row in cursor.fetchall()}
+            
+            created_categories = []
+            def category_id_for(name):
+                if not name:
+                    return None
+                if name not in categories:
+                    categories[name] = _resolve_category_id(cursor, name, user_id, version, created_categories)
+                return categories[name]
+            
+            # Inserted one row at a time: ids of a multi-row INSERT are not
+            # guaranteed to be consecutive, and each result needs its note id.
+            for index, op in enumerate(operations):
+                if op['op'] != 'create':
+                    continue
+                cursor.execute(
+                    '''INSERT INTO note 
+                       (title, content, created_date, updated_date, is_todo, completed, importance_rank, color, 
+                        category_id, user_id, change_seq) 
+                       VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)''',
+                    (op['title'], op['content'], now, now, 1 if op['is_todo'] else 0, 0,
+                     IMPORTANCE_RANKS[op['importance']], op['color'], category_id_for(op['category']), user_id,
+                     version)
+                )
+                results[index] = {'op': 'create', 'id': cursor.lastrowid, 'status': 'created'}
+            
+            # Updates touching the same columns share one executemany call
+            update_groups = {}
+            completes = {True: [], False: []}
+            deletes = []
+            for index, op in enumerate(operations):
+                if op['op'] == 'create':
+                    continue
+                if op['id'] not in existing:
+                    results[index] = {'op': op['op'], 'id': op['id'], 'status': 'not_found'}
+                    continue
+                
+                if op['op'] == 'update':
+                    updates = dict(op['updates'])
+                    if 'importance' in updates:
+                        updates['importance_rank'] = IMPORTANCE_RANKS[updates.pop('importance')]
+                    if 'category' in op:
+                        updates['category_id'] = category_id_for(op['category'])
+                    updates['updated_date'] = now
+                    updates['change_seq'] = version
+                    columns = tuple(sorted(updates))
+                    update_groups.setdefault(columns, []).append(
+                        [updates[column] for column in columns] + [op['id'], user_id]
+                    )
+                    status = 'updated'
+                elif op['op'] == 'complete':
+                    completes[bool(op['completed'])].append(op['id'])
+                    status = 'updated'
+                else:
+                    deletes.append(op['id'])
+                    status = 'deleted'
+                results[index] = {'op': op['op'], 'id': op['id'], 'status': status}
+            
+            for columns, rows in update_groups.items():
+                set_clause = ', '.join(f'{column} = %s' for column in columns)
+                cursor.executemany(
+                    f'UPDATE note SET {set_clause}, version = version + 1 WHERE id = %s AND user_id = %s',
+                    rows
+                )
+            
+            for completed, note_ids in completes.items():
+                if note_ids:
+                    placeholders = ', '.join(['%s'] * len(note_ids))
+                    cursor.execute(
+                        f'''UPDATE note SET completed = %s, updated_date = %s, version = version + 1, change_seq = %s 
+                            WHERE user_id = %s AND id IN ({placeholders})''',
+                        [1 if completed else 0, now, version, user_id, *note_ids]
+                    )
+            
+            if deletes:
+                placeholders = ', '.join(['%s'] * len(deletes))
+                cursor.execute(
+                    f'DELETE FROM note WHERE user_id = %s AND id IN ({placeholders})',
+                    [user_id, *deletes]
+                )
+                _add_tombstones(cursor, user_id, 'note', deletes, version)
+            
+            changes = [_category_change('created', category_id) for category_id in created_categories]
+            changes.extend(_note_change('created', result['id'], 1)
+                           for result in results if result['status'] == 'created')
+            updated_ids = {result['id'] for result in results if result['status'] == 'updated'}
+            if updated_ids:
+                placeholders = ', '.join(['%s'] * len(updated_ids))
+                cursor.execute(f'SELECT id, version FROM note WHERE id IN ({placeholders})', list(updated_ids))
+                changes.extend(_note_change('updated', row['id'], row['version']) for row in cursor.fetchall())
+            changes.extend(_note_change('deleted', note_id) for note_id in deletes)
+            
+            changed = bool(created_categories) or any(result['status'] != 'not_found' for result in results)
+        if changed:
+            db.commit()
+        else:
+            db.rollback()
+        _remember_categories(user_id, categories)
+        if created_categories:
+            _invalidate(user_id, 'categories')
+        if changed:
+            _invalidate(user_id, 'notes')
+            _publish(user_id, version, changes)
+        return results
+    except Exception as e:
+        db.rollback()
+        if categories:
+            _forget_categories(user_id)
+        logger.error("Error applying note batch: %s", e)
+        raise
+
+# Export and import
+def iter_export_notes(user_id, fetch_size=500):
+    """Yield a user's notes, with category_name, in lists of up to fetch_size rows.
+    
+    Rows are streamed from the server through an unbuffered cursor, so memory
+    use does not grow with the number of notes. The connection can run no
+    other query until the generator is exhausted or closed.
+    """
+    db = get_db(read=True, user_id=user_id)
+    with db.cursor(InstrumentedSSCursor) as cursor:
+        # Ordered along idx_note_user_updated so rows stream without a filesort
+        cursor.execute(
+            f'''SELECT n.id, n.title, n.content, n.created_date, n.updated_date, n.is_todo, 
+                      n.completed, {IMPORTANCE_LABEL_SQL} AS importance, n.color, c.name AS category_name 
+               FROM note n 
+               LEFT JOIN category c ON n.category_id = c.id 
+               WHERE n.user_id = %s 
+               ORDER BY n.updated_date, n.id''',
+            (user_id,)
+        )
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            yield rows
+
+def _category_ids(cursor, user_id, names):
+    """Look up the ids of a user's categories by name; returns {name: id} for those found."""
+    placeholders = ', '.join(['%s'] * len(names))
+    cursor.execute(
+        f'SELECT id, name FROM category WHERE user_id = %s AND name IN ({placeholders})',
+        [user_id, *names]
+    )
+    rows = cursor.fetchall()
+    # Names match case-insensitively under the column's collation
+    exact = {row['name']: row['id'] for row in rows}
+    folded = {row['name'].casefold(): row['id'] for row in rows}
+    found = {}
+    for name in names:
+        category_id = exact.get(name, folded.get(name.casefold()))
+        if category_id is not None:
+            found[name] = category_id
+    return found
+
+def import_notes(user_id, notes, categories):
+    """Insert a batch of imported notes (see transfer.read_notes) in one transaction.
+    
+    categories maps category names to ids and is shared by the batches of
+    an import: names not in it or the category id cache are looked up and
+    the missing ones created, with one query each rather than one per note.
+    Returns the number of categories created.
+    """
+    names = {note['category'] for note in notes if note['category']}
+    cached = _cached_category_ids(user_id)
+    known = {name: categories.get(name, cached.get(name)) for name in names
+             if name in categories or name in cached}
+    names -= known.keys()
+    
+    db = get_db()
+    try:
+        with db.cursor() as cursor:
+            version = _bump_user_version(cursor, user_id)
+            if known:
+                # Known ids may have been deleted by another process since
+                existing = _existing_category_ids(cursor, user_id, set(known.values()))
+                stale = {name for name, category_id in known.items() if category_id not in existing}
+                if stale:
+                    _forget_categories(user_id)
+                    for name in stale:
+                        categories.pop(name, None)
+                        del known[name]
+                    names |= stale
+            resolved = {}
+            created_ids = []
+            if names:
+                resolved = _category_ids(cursor, user_id, names)
+                missing = names - resolved.keys()
+                if missing:
+                    cursor.executemany(
+                        'INSERT IGNORE INTO category (name, user_id, change_seq) VALUES (%s, %s, %s)',
+                        [(name, user_id, version) for name in missing]
+                    )
+                    known = set(resolved.values())
+                    resolved.update(_category_ids(cursor, user_id, missing))
+                    created_ids = sorted(set(resolved.values()) - known)
+                    for name in missing - resolved.keys():
+                        # Equal to an existing name under the collation in a way casefold() misses
+                        cursor.execute('SELECT id FROM category WHERE name = %s AND user_id = %s', (name, user_id))
+                        resolved[name] = cursor.fetchone()['id']
+            
+            # pymysql sends executemany() INSERTs as multi-row statements
+            cursor.executemany(
+                '''INSERT INTO note 
+                   (title, content, created_date, updated_date, is_todo, completed, importance_rank, color, 
+                    category_id, user_id, change_seq) 
+                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)''',
+                [(note['title'], note['content'], note['created_date'], note['updated_date'],
+                  1 if note['is_todo'] else 0, 1 if note['completed'] else 0, IMPORTANCE_RANKS[note['importance']],
+                  note['color'], known.get(note['category'], resolved.get(note['category'])), user_id, version)
+                 for note in notes]
+            )
+        db.commit()
+        categories.update(known)
+        categories.update(resolved)
+        _remember_categories(user_id, resolved)
+        _invalidate(user_id, 'notes', 'categories')
+        # Imported ids are not reported one by one; clients reload on this change
+        _publish(user_id, version, [_category_change('created', category_id) for category_id in created_ids]
+                 + [{'entity': 'note', 'action': 'imported', 'count': len(notes)}])
+        return len(created_ids)
+    except Exception as e:
+        db.rollback()
+        # A cached category id may be stale (see _forget_categories)
+        _forget_categories(user_id)
+        logger.error("Error importing notes: %s", e)
+        raise
+
+# Delta sync
+# Kinds of change, in the order they are returned within one change_seq:
+# categories before the notes that may refer to them, then deletions.
+# Each is (table, id column, extra condition); changes are ordered by
+# (change_seq, kind, id), the position sync cursors encode.
+_CHANGE_KINDS = (
+    ('category', 'id', ''),
+    ('note', 'id', ''),
+    ('tombstone', 'entity_id', " AND entity = 'category'"),
+    ('tombstone', 'entity_id', " AND entity = 'note'"),
+)
+_MAX_ID = 2**63 - 1
+
+def get_changes(user_id, since, limit, cursor=None):
+    """Get the notes, categories and deletions of a user with change_seq above since.
+    
+    Returns a dict with the sequence number the result is complete up to
+    ('seq'; pass it as since next time), whether later changes remain
+    ('more'), a cursor to fetch them with when there are ('cursor'), the
+    changed notes and categories, and the ids of deleted ones. At most
+    limit changes are returned at a time; the cursor continues in the
+    middle of a write that changed more rows than that. since=0 returns
+    everything. Raises ValueError if since (or the cursor) is ahead of the
+    user's data_version, or the cursor is invalid.
+    """
+    if cursor is not None:
+        position = decode_change_cursor(cursor)
+        since = max(position[0], 0)
+    else:
+        # Rows written outside db.py and never numbered keep change_seq 0
+        position = [since if since else -1, len(_CHANGE_KINDS), 0]
+    
+    db = get_db(read=True, user_id=user_id)
+    with db.cursor(RecordCursor) as db_cursor:
+        # One snapshot for the version and all three tables
+        db_cursor.execute('START TRANSACTION WITH CONSISTENT SNAPSHOT, READ ONLY')
+        try:
+            db_cursor.execute('SELECT data_version FROM user WHERE id = %s', (user_id,))
+            row = db_cursor.fetchone()
+            current = row['data_version'] if row else 0
+            if since > current:
+                raise ValueError('since is ahead of the latest change')
+            if since == current:
+                return {'since': since, 'seq': current, 'more': False, 'cursor': None, 'notes': [],
+                        'categories': [], 'deleted': {'notes': [], 'categories': []}}
+            return _read_changes(db_cursor, user_id, since, position, current, limit)
+        finally:
+            db.commit()
+
+def decode_change_cursor(cursor):
+    """Decode a get_changes() cursor, raising ValueError if it is malformed."""
+    position = decode_cursor(cursor, 3)
+    if (not all(type(value) is int for value in position)
+            or not 0 <= position[1] < len(_CHANGE_KINDS)):
+        raise ValueError('Invalid cursor')
+    return position
+
+def _change_range(kind, position, end):
+    """SQL condition and params selecting one kind of change after position, up to end."""
+    seq, after_kind, after_id = position
+    end_seq, end_kind, end_id = end
+    # Within the seq of position or end, ids of earlier kinds are all before
+    # it and ids of later kinds all after it
+    low_id = after_id if kind == after_kind else (-1 if kind > after_kind else _MAX_ID)
+    high_id = end_id if kind == end_kind else (_MAX_ID if kind < end_kind else -1)
+    table, id_column, condition = _CHANGE_KINDS[kind]
+    return (f'user_id = %s{condition} AND change_seq >= %s AND (change_seq > %s OR {id_column} > %s) '
+            f'AND change_seq <= %s AND (change_seq < %s OR {id_column} <= %s)',
+            (seq, seq, low_id, end_seq, end_seq, high_id))
+
+def _read_changes(cursor, user_id, since, position, current, limit):
+    """The queries of get_changes(), in the caller's snapshot.
+    
+    position is the [change_seq, kind, id] the client has seen changes up
+    to; since is its change_seq as the client knows it.
+    """
+    # Deletions matter only to clients that have something to delete
+    kinds = range(len(_CHANGE_KINDS)) if position[0] > 0 else range(2)
+    
+    # The positions of the next limit + 1 changes, read along the
+    # (user_id, change_seq) indexes, which end in the row id
+    end = (current, len(_CHANGE_KINDS), _MAX_ID)
+    subqueries = []
+    params = []
+    for kind in kinds:
+        table, id_column, _ = _CHANGE_KINDS[kind]
+        condition, condition_params = _change_range(kind, position, end)
+        subqueries.append(f'(SELECT change_seq, {kind} AS kind, {id_column} AS id FROM {table} '
+                          f'WHERE {condition} ORDER BY change_seq, {id_column} LIMIT %s)')
+        params.extend((user_id,) + condition_params + (limit + 1,))
+    cursor.execute(' UNION ALL '.join(subqueries) + ' ORDER BY change_seq, kind, id LIMIT %s',
+                   params + [limit + 1])
+    keys = [(key['change_seq'], key['kind'], key['id']) for key in cursor.fetchall()]
+    
+    more = len(keys) > limit
+    seq = current
+    if more:
+        end = keys[limit - 1]
+        # Complete up to the end's seq unless the next change shares it
+        seq = max(since, end[0] if keys[limit][0] > end[0] else end[0] - 1)
+    
+    condition, condition_params = _change_range(1, position, end)
+    cursor.execute(
+        f'''SELECT n.id, n.title, n.content, n.created_date, n.updated_date, n.is_todo, n.completed, 
+                  {IMPORTANCE_LABEL_SQL} AS importance, n.color, n.category_id, n.version, n.change_seq 
+           FROM note n 
+           WHERE {condition} 
+           ORDER BY n.change_seq, n.id''',
+        (user_id,) + condition_params
+    )
+    notes = cursor.fetchall()
+    condition, condition_params = _change_range(0, position, end)
+    cursor.execute(
+        f'SELECT id, name, change_seq FROM category WHERE {condition} ORDER BY change_seq, id',
+        (user_id,) + condition_params
+    )
+    categories = cursor.fetchall()
+    
+    deleted = {'category': [], 'note': []}
+    for kind in kinds[2:]:
+        condition, condition_params = _change_range(kind, position, end)
+        cursor.execute(
+            f'SELECT entity, entity_id FROM tombstone WHERE {condition} ORDER BY change_seq, entity_id',
+            (user_id,) + condition_params
+        )
+        for tombstone in cursor.fetchall():
+            deleted[tombstone['entity']].append(tombstone['entity_id'])
+    
+    return {'since': since, 'seq': seq, 'more': more, 'cursor': encode_cursor(end) if more else None,
+            'notes': notes, 'categories': categories,
+            'deleted': {'notes': deleted['note'], 'categories': deleted['category']}}
@@ -0,0 +1,185 @@
+import json
+import queue
+import threading
+from collections import deque
+from flask import current_app
+from werkzeug.utils import import_string
+from cache import TTLCache
+import logging
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+class LocalBackend:
+    """Delivers published messages straight back to this process's broker.
+
+    A backend connects the brokers of all worker processes: publish() sends
+    a message to every broker that called start(), including the sender's.
+    Implement the same two methods over a shared message bus (see
+    RedisBackend) to fan events out across workers.
+    """
+
+    def __init__(self):
+        self._deliver = None
+
+    def start(self, deliver):
+        """Begin passing received (user_id, event_id, data) messages to deliver."""
+        self._deliver = deliver
+
+    def publish(self, user_id, event_id, data):
+        self._deliver(user_id, event_id, data)
+
+class RedisBackend:
+    """Fans events out to every worker through a Redis pub/sub channel."""
+
+    def __init__(self, client, channel='notesmart:events'):
+        self.client = client
+        self.channel = channel
+
+    def start(self, deliver):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+
+        def handle(message):
+            user_id, event_id, data = json.loads(message['data'])
+            deliver(user_id, event_id, data)
+
+        pubsub.subscribe(**{self.channel: handle})
+        pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+
+    def publish(self, user_id, event_id, data):
+        self.client.publish(self.channel, json.dumps([user_id, event_id, data]))
+
+def local_backend(config):
+    """EVENTS_BACKEND factory for single-process deployments (the default)."""
+    return LocalBackend()
+
+def redis_backend(config):
+    """EVENTS_BACKEND factory publishing through EVENTS_REDIS_URL."""
+    try:
+        import redis
+    except ImportError:
+        raise RuntimeError("The redis package is required for the redis events backend")
+    return RedisBackend(redis.Redis.from_url(config['EVENTS_REDIS_URL']))
+
+class Subscription:
+    """One client's queue of (event_id, data) events."""
+
+    def __init__(self, broker, user_id, maxsize):
+        self.broker = broker
+        self.user_id = user_id
+        self.overflowed = False
+        self._queue = queue.Queue(maxsize)
+
+    def put(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            # The client fell too far behind; it has to resynchronize
+            self.overflowed = True
+
+    def get(self, timeout):
+        """Return the next event, or None if none arrives within timeout seconds."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+class EventBroker:
+    """Per-user publish/subscribe of note change events.
+
+    Event ids are the user's data_version after the change, so they increase
+    per user. The last ``buffer_size`` events of each user are kept, letting
+    a reconnecting client resume after the last id it saw. A user's events
+    are dropped ``buffer_ttl`` seconds after their last one, and those of
+    the least recently active users once ``buffer_users`` users have some.
+    """
+
+    def __init__(self, backend, buffer_size=100, queue_size=100, buffer_users=10000, buffer_ttl=600.0):
+        self.backend = backend
+        self.buffer_size = buffer_size
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscribers = {}  # user_id -> set of Subscription
+        self._buffers = TTLCache(buffer_users, buffer_ttl)  # user_id -> deque of (event_id, data)
+        backend.start(self._deliver)
+
+    def publish(self, user_id, event_id, data):
+        """Publish an event to the user's subscribers in every worker."""
+        try:
+            self.backend.publish(user_id, event_id, data)
+        except Exception as e:
+            # Subscribers catch up on reconnect; the write itself succeeded
+            logger.error("Error publishing event %s for user %s: %s", event_id, user_id, e)
+
+    def _deliver(self, user_id, event_id, data):
+        event = (event_id, data)
+        with self._lock:
+            buffer = self._buffers.get(user_id)
+            if buffer is None:
+                buffer = deque(maxlen=self.buffer_size)
+            buffer.append(event)
+            # Stored again to restart the user's expiry
+            self._buffers.set(user_id, buffer)
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for subscription in subscribers:
+            subscription.put(event)
+
+    def subscribe(self, user_id):
+        subscription = Subscription(self, user_id, self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def events_since(self, user_id, last_id):
+        """Buffered events after last_id, or None if the buffer no longer reaches back that far."""
+        with self._lock:
+            buffered = list(self._buffers.get(user_id, ()))
+        # Sorted, as other workers' events may arrive slightly out of order
+        missed = sorted((event for event in buffered if event[0] > last_id), key=lambda event: event[0])
+        if not missed:
+            # Up to date only if last_id itself is known; after a restart the
+            # buffer may simply not have seen the events
+            return [] if any(event[0] == last_id for event in buffered) else None
+        # Event ids are consecutive data_versions, so a gap means lost events
+        expected = last_id + 1
+        for event_id, _ in missed:
+            if event_id != expected:
+                return None
+            expected += 1
+        return missed
+
+_lock = threading.Lock()
+
+def get_broker():
+    """Get the app's EventBroker, creating it on first use."""
+    broker = current_app.extensions.get('event_broker')
+    if broker is None:
+        with _lock:
+            broker = current_app.extensions.get('event_broker')
+            if broker is None:
+                config = current_app.config
+                backend = import_string(config['EVENTS_BACKEND'] or 'events.local_backend')(config)
+                broker = EventBroker(backend, config['EVENTS_BUFFER_SIZE'], config['EVENTS_QUEUE_SIZE'],
+                                     config['EVENTS_BUFFER_USERS'], config['EVENTS_BUFFER_TTL'])
+                current_app.extensions['event_broker'] = broker
+    return broker
+
+def format_event(event_id, event, data):
+    """Encode one Server-Sent Events message."""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data, separators=(",", ":"))}')
+    return '\n'.join(lines) + '\n\n'
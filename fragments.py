@@ -0,0 +1,59 @@
+import os
+from flask import current_app, request
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
+from cache import TTLCache
+import logging
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+def get_fragment_cache():
+    """Get the rendered note fragment cache, or None when it is disabled."""
+    if not current_app.config['FRAGMENT_CACHE_ENABLED']:
+        return None
+    cache = current_app.extensions.get('fragment_cache')
+    if cache is None:
+        cache = current_app.extensions.setdefault('fragment_cache', TTLCache(
+            maxsize=current_app.config['FRAGMENT_CACHE_SIZE'],
+            ttl=current_app.config['FRAGMENT_CACHE_TTL']
+        ))
+    return cache
+
+def note_fragments(template_name, notes):
+    """Render a per-note template for each note, reusing the HTML of unchanged notes.
+    
+    Entries are keyed by note id, version and updated_date: every note
+    write bumps the version, including detaching it from a deleted
+    category. The template object is part of the key too, so that edited
+    templates are picked up when Jinja reloads them.
+    """
+    template = current_app.jinja_env.get_template(template_name)
+    cache = get_fragment_cache()
+    if cache is None:
+        return Markup('\n'.join(template.render(note=note) for note in notes))
+    
+    script_root = request.script_root
+    parts = []
+    for note in notes:
+        key = (template, note['id'], note['version'], note['updated_date'], script_root)
+        html = cache.get(key)
+        if html is None:
+            html = template.render(note=note)
+            cache.set(key, html)
+        parts.append(html)
+    return Markup('\n'.join(parts))
+
+def init_app(app):
+    """Cache compiled templates on disk and make note_fragments() available to templates."""
+    if app.config['TEMPLATE_BYTECODE_CACHE']:
+        # Without a directory, Jinja uses a private one in the system temp directory
+        directory = app.config['TEMPLATE_BYTECODE_CACHE_DIR'] or None
+        try:
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+        except (OSError, RuntimeError) as e:
+            # Templates still work; they are just compiled on every cold start
+            logger.warning("Template bytecode cache disabled: %s", e)
+    app.add_template_global(note_fragments)
@@ -0,0 +1,84 @@
+from datetime import date, datetime
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+from db import Record
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_DAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+_MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+def _http_date(value):
+    """werkzeug's http_date(), with a quicker path for the naive datetimes MySQL returns."""
+    if type(value) is not datetime or value.tzinfo is not None:
+        return http_date(value)
+    return (f'{_DAYS[value.weekday()]}, {value.day:02d} {_MONTHS[value.month - 1]} {value.year:04d} '
+            f'{value.hour:02d}:{value.minute:02d}:{value.second:02d} GMT')
+
+def _plain(obj):
+    """Copy obj with Records turned into dicts, for encoders that take tuples as lists."""
+    if isinstance(obj, Record):
+        return obj._asdict()
+    if isinstance(obj, dict):
+        return {key: _plain(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_plain(value) for value in obj]
+    return obj
+
+class RecordJSONProvider(DefaultJSONProvider):
+    """Flask's default JSON provider, writing Records from db.py as objects.
+
+    Records are tuples, which the json module writes as arrays without
+    calling default(), so they are turned into dicts first. Providers
+    named by JSON_PROVIDER should subclass this one.
+    """
+
+    def dumps(self, obj, **kwargs):
+        return super().dumps(_plain(obj), **kwargs)
+
+class FastJSONProvider(RecordJSONProvider):
+    """JSON provider that encodes responses with orjson when it is installed.
+
+    Output matches Flask's default provider: sorted keys and dates in HTTP
+    format (RFC 822), unless JSON_DATE_FORMAT is 'iso', which lets orjson
+    write datetimes itself as ISO 8601 without a Python call per value.
+    Records from db.py are written as objects. Without orjson, encoding
+    falls back to the standard library.
+    """
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.iso_dates = app.config['JSON_DATE_FORMAT'] == 'iso'
+
+    def _default(self, o):
+        if isinstance(o, Record):
+            return o._asdict()
+        if isinstance(o, date):
+            return o.isoformat() if self.iso_dates else _http_date(o)
+        return DefaultJSONProvider.default(o)
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            kwargs.setdefault('default', self._default)
+            return super().dumps(obj, **kwargs)
+        return self._encode(obj).decode('utf-8')
+
+    def _encode(self, obj, indent=False):
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if not self.iso_dates:
+            option |= orjson.OPT_PASSTHROUGH_DATETIME
+        return orjson.dumps(obj, default=self._default, option=option)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        return self._app.response_class(self._encode(obj, indent) + b'\n', mimetype=self.mimetype)
@@ -0,0 +1,111 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import re
+import sys
+import uuid
+from datetime import datetime, timezone
+from flask import g, request, has_request_context
+
+# Attributes every LogRecord has; anything else was passed through extra=
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id'}
+
+# Incoming X-Request-ID values are reused only if they look like an id
+_REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+_listener = None
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line, including extra= fields."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s')
+
+    def format(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = '-'
+        return super().format(record)
+
+class RequestQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the background writer without formatting them.
+
+    The request id is attached here, on the request's thread, while
+    message interpolation and JSON encoding happen on the writer's thread.
+    When the queue is full the record is dropped instead of blocking.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        if has_request_context():
+            record.request_id = g.get('request_id')
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+def configure_logging(level='INFO', fmt='json', queue_size=10000, stream=None):
+    """Route all logging through a queue to a writer thread; safe to call again."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+
+    writer = logging.StreamHandler(stream or sys.stderr)
+    writer.setFormatter(JsonFormatter() if fmt == 'json' else TextFormatter())
+
+    log_queue = queue.Queue(maxsize=queue_size)
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, RequestQueueHandler):
+            root.removeHandler(handler)
+    root.addHandler(RequestQueueHandler(log_queue))
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, writer, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+def _stop_listener():
+    if _listener is not None:
+        _listener.stop()
+
+atexit.register(_stop_listener)
+
+def init_app(app):
+    """Configure logging from the app config and tag each request with an id."""
+    configure_logging(app.config['LOG_LEVEL'], app.config['LOG_FORMAT'], app.config['LOG_QUEUE_SIZE'])
+
+    @app.before_request
+    def assign_request_id():
+        incoming = request.headers.get('X-Request-ID', '')
+        g.request_id = incoming if _REQUEST_ID_RE.match(incoming) else uuid.uuid4().hex
+
+    @app.after_request
+    def send_request_id(response):
+        if 'request_id' in g:
+            response.headers['X-Request-ID'] = g.request_id
+        return response
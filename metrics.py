@@ -0,0 +1,298 @@
+import hmac
+import re
+import threading
+import time
+from functools import lru_cache
+import pymysql
+from flask import g, request, current_app, has_app_context, has_request_context
+import logging
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the request duration histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_VALUE_LIST_RE = re.compile(r'\?(?:\s*,\s*\?)+')
+
+@lru_cache(maxsize=1024)
+def normalize_sql(query):
+    """Reduce a query to its shape, so that calls differing only in values group together.
+
+    Literals and placeholders become ?, and lists of them (IN clauses, row
+    constructors) collapse to "?, ...".
+    """
+    query = _WHITESPACE_RE.sub(' ', query).strip()
+    query = _STRING_RE.sub('?', query.replace('%s', '?'))
+    query = _NUMBER_RE.sub('?', query)
+    return _VALUE_LIST_RE.sub('?, ...', query)
+
+class RequestQueries:
+    """Queries run while handling one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self.rows = 0
+        self.slow = 0
+        self.statements = {}  # normalized SQL -> [count, seconds, rows]
+
+    def add(self, sql, duration, rows):
+        self.count += 1
+        self.time += duration
+        self.rows += rows
+        entry = self.statements.setdefault(sql, [0, 0.0, 0])
+        entry[0] += 1
+        entry[1] += duration
+        entry[2] += rows
+
+def record_query(query, duration, rows):
+    """Account one executed statement to the current request and log it if slow."""
+    if not has_app_context():
+        return
+    sql = normalize_sql(query)
+    stats = g.get('_queries')
+    if stats is None:
+        stats = g._queries = RequestQueries()
+    stats.add(sql, duration, rows)
+
+    threshold = current_app.config['SLOW_QUERY_MS']
+    if threshold and duration * 1000 >= threshold:
+        stats.slow += 1
+        endpoint = request.endpoint if has_request_context() else None
+        logger.warning(
+            "Slow query (%.1f ms, %s rows) in %s: %s", duration * 1000, rows, endpoint, sql,
+            extra={'slow_query': {
+                'duration_ms': round(duration * 1000, 3),
+                'rows': rows,
+                'endpoint': endpoint,
+                'sql': sql,
+            }}
+        )
+
+class InstrumentedCursor(pymysql.cursors.DictCursor):
+    """DictCursor that reports each statement's duration and row count to record_query."""
+
+    _timing = False
+
+    def execute(self, query, args=None):
+        # executemany() runs through execute(); time only the outer call
+        if self._timing:
+            return super().execute(query, args)
+        return self._timed(super().execute, query, args)
+
+    def executemany(self, query, args):
+        return self._timed(super().executemany, query, args)
+
+    def _timed(self, run, query, args):
+        self._timing = True
+        started = time.perf_counter()
+        try:
+            return run(query, args)
+        finally:
+            self._timing = False
+            record_query(query, time.perf_counter() - started, self._rows_reported())
+
+    def _rows_reported(self):
+        return max(self.rowcount or 0, 0)
+
+class InstrumentedSSCursor(InstrumentedCursor, pymysql.cursors.SSDictCursor):
+    """Unbuffered variant of InstrumentedCursor for streaming large results.
+
+    Rows are read from the server as they are fetched, so the reported
+    duration is the time to the first row and no row count is known.
+    """
+
+    def _rows_reported(self):
+        return 0
+
+class MetricsRegistry:
+    """Process-wide per-endpoint request and query statistics."""
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.requests = {}    # (endpoint, method, status) -> count
+        self.durations = {}   # endpoint -> [bucket counts..., +Inf count, sum]
+        self.queries = {}     # endpoint -> [queries, seconds, rows, slow]
+        self.statements = {}  # normalized SQL -> [count, seconds, rows]
+
+    def observe(self, endpoint, method, status, duration, queries=None):
+        with self._lock:
+            key = (endpoint, method, str(status))
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+            histogram = self.durations.get(endpoint)
+            if histogram is None:
+                histogram = self.durations[endpoint] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if duration <= bound:
+                    histogram[i] += 1
+            histogram[-2] += 1
+            histogram[-1] += duration
+
+            if queries is not None:
+                totals = self.queries.setdefault(endpoint, [0, 0.0, 0, 0])
+                totals[0] += queries.count
+                totals[1] += queries.time
+                totals[2] += queries.rows
+                totals[3] += queries.slow
+                for sql, (count, seconds, rows) in queries.statements.items():
+                    entry = self.statements.setdefault(sql, [0, 0.0, 0])
+                    entry[0] += count
+                    entry[1] += seconds
+                    entry[2] += rows
+
+    def render(self, extra=()):
+        """Return all metrics in the Prometheus text exposition format.
+
+        extra holds further (name, type, help, value) samples, such as those
+        from pool_samples() and cache_samples().
+        """
+        with self._lock:
+            requests = dict(self.requests)
+            durations = {endpoint: list(values) for endpoint, values in self.durations.items()}
+            queries = {endpoint: list(values) for endpoint, values in self.queries.items()}
+            statements = {sql: list(values) for sql, values in self.statements.items()}
+
+        lines = []
+        _family(lines, 'notesmart_http_requests_total', 'counter', 'HTTP requests handled.', [
+            ({'endpoint': endpoint, 'method': method, 'status': status}, count)
+            for (endpoint, method, status), count in sorted(requests.items())
+        ])
+
+        name = 'notesmart_http_request_duration_seconds'
+        _family(lines, name, 'histogram', 'Time spent handling requests.', [])
+        for endpoint, values in sorted(durations.items()):
+            # observe() counts each request in every bucket it fits, so counts are cumulative
+            for bound, count in zip(self.buckets, values):
+                lines.append(_sample(f'{name}_bucket', {'endpoint': endpoint, 'le': repr(bound)}, count))
+            lines.append(_sample(f'{name}_bucket', {'endpoint': endpoint, 'le': '+Inf'}, values[-2]))
+            lines.append(_sample(f'{name}_sum', {'endpoint': endpoint}, values[-1]))
+            lines.append(_sample(f'{name}_count', {'endpoint': endpoint}, values[-2]))
+
+        per_endpoint = (
+            ('notesmart_db_queries_total', 'Database statements executed.', 0),
+            ('notesmart_db_query_seconds_total', 'Time spent executing database statements.', 1),
+            ('notesmart_db_rows_total', 'Rows returned or affected by database statements.', 2),
+            ('notesmart_db_slow_queries_total', 'Statements slower than SLOW_QUERY_MS.', 3),
+        )
+        for name, help_text, index in per_endpoint:
+            _family(lines, name, 'counter', help_text, [
+                ({'endpoint': endpoint}, values[index]) for endpoint, values in sorted(queries.items())
+            ])
+
+        per_statement = (
+            ('notesmart_db_statement_calls_total', 'Executions per normalized statement.', 0),
+            ('notesmart_db_statement_seconds_total', 'Execution time per normalized statement.', 1),
+            ('notesmart_db_statement_rows_total', 'Rows per normalized statement.', 2),
+        )
+        for name, help_text, index in per_statement:
+            _family(lines, name, 'counter', help_text, [
+                ({'sql': sql}, values[index]) for sql, values in sorted(statements.items())
+            ])
+
+        for name, kind, help_text, value in extra:
+            _family(lines, name, kind, help_text, [({}, value)])
+        return '\n'.join(lines) + '\n'
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _sample(name, labels, value):
+    if labels:
+        label_text = ','.join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+        name = f'{name}{{{label_text}}}'
+    return f'{name} {value}'
+
+def _family(lines, name, kind, help_text, samples):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} {kind}')
+    lines.extend(_sample(name, labels, value) for labels, value in samples)
+
+# ConnectionPool.metrics() keys that only ever grow, with their metric suffixes
+_POOL_COUNTERS = {
+    'checkouts': 'checkouts_total',
+    'connects': 'connects_total',
+    'discards': 'discards_total',
+    'waits': 'waits_total',
+    'wait_time': 'wait_seconds_total',
+    'timeouts': 'timeouts_total',
+}
+
+def pool_samples(pool_metrics):
+    """Turn ConnectionPool.metrics() into samples for MetricsRegistry.render()."""
+    samples = []
+    for key, value in pool_metrics.items():
+        if key in _POOL_COUNTERS:
+            samples.append((f'notesmart_db_pool_{_POOL_COUNTERS[key]}', 'counter',
+                            f'Connection pool {key.replace("_", " ")}.', value))
+        else:
+            samples.append((f'notesmart_db_pool_{key}', 'gauge',
+                            f'Connection pool {key.replace("_", " ")}.', value))
+    return samples
+
+# ReplicaSet.stats() keys with their metric names, types and help texts
+_REPLICA_SAMPLES = {
+    'replicas': ('notesmart_db_replicas', 'gauge', 'Configured read replicas.'),
+    'healthy': ('notesmart_db_replicas_healthy', 'gauge', 'Read replicas in rotation.'),
+    'max_lag': ('notesmart_db_replica_lag_seconds', 'gauge', 'Largest replication lag of the replicas in rotation.'),
+    'ejections': ('notesmart_db_replica_ejections_total', 'counter', 'Times a replica was taken out of rotation.'),
+    'replica_reads': ('notesmart_db_replica_reads_total', 'counter', 'Requests whose reads a replica served.'),
+    'fallback_reads': ('notesmart_db_replica_fallbacks_total', 'counter',
+                       'Requests reading from the primary because no replica was healthy.'),
+}
+
+def replica_samples(replica_stats):
+    """Turn ReplicaSet.stats() into samples for MetricsRegistry.render()."""
+    return [_REPLICA_SAMPLES[key] + (value,) for key, value in replica_stats.items()]
+
+def cache_samples(cache_name, stats):
+    """Turn a TTLCache or QueryCache stats() dict into samples for MetricsRegistry.render()."""
+    samples = []
+    for key, value in stats.items():
+        if key in ('size', 'maxsize'):
+            samples.append((f'notesmart_{cache_name}_{key}', 'gauge', f'{cache_name} entries ({key}).', value))
+        else:
+            samples.append((f'notesmart_{cache_name}_{key}_total', 'counter', f'{cache_name} {key}.', value))
+    return samples
+
+def get_registry():
+    return current_app.extensions['metrics']
+
+def valid_scrape_token(req):
+    """True if the request carries METRICS_TOKEN as a bearer token."""
+    token = current_app.config['METRICS_TOKEN']
+    header = req.headers.get('Authorization', '')
+    return bool(token) and hmac.compare_digest(header, f'Bearer {token}')
+
+def init_app(app):
+    """Time every request and add Server-Timing headers and per-endpoint metrics."""
+    app.extensions['metrics'] = MetricsRegistry()
+
+    @app.before_request
+    def start_request_timer():
+        g._request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop('_request_started', None)
+        if started is None:
+            return response
+        duration = time.perf_counter() - started
+        queries = g.pop('_queries', None)
+
+        if current_app.config['SERVER_TIMING']:
+            timings = []
+            if queries is not None:
+                timings.append(f'db;desc="{queries.count} queries, {queries.rows} rows";'
+                               f'dur={queries.time * 1000:.2f}')
+            timings.append(f'app;dur={duration * 1000:.2f}')
+            response.headers.add('Server-Timing', ', '.join(timings))
+
+        get_registry().observe(request.endpoint or '<unmatched>', request.method,
+                               response.status_code, duration, queries)
+        return response
@@ -0,0 +1,237 @@
+from datetime import datetime
+import logging
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# MySQL error codes that make index DDL safe to re-run
+ER_DUP_KEYNAME = 1061
+ER_CANT_DROP_FIELD_OR_KEY = 1091
+
+def create_index(cursor, name, table, columns, kind='INDEX'):
+    """Create an index, doing nothing if an index with that name already exists."""
+    try:
+        cursor.execute(f"CREATE {kind} {name} ON {table}({columns})")
+    except Exception as e:
+        if e.args and e.args[0] == ER_DUP_KEYNAME:
+            logger.debug("Index %s already exists", name)
+        else:
+            raise
+
+def drop_index(cursor, name, table):
+    """Drop an index, doing nothing if it does not exist."""
+    try:
+        cursor.execute(f"DROP INDEX {name} ON {table}")
+    except Exception as e:
+        if e.args and e.args[0] == ER_CANT_DROP_FIELD_OR_KEY:
+            logger.debug("Index %s does not exist", name)
+        else:
+            raise
+
+# Migrations are applied in version order and never edited once released;
+# change the schema by appending a new one (and update schema.sql to match).
+def _create_tables(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            username VARCHAR(64) UNIQUE NOT NULL,
+            email VARCHAR(120) UNIQUE NOT NULL,
+            password_hash VARCHAR(255) NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS category (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(64) NOT NULL,
+            user_id INT NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES user(id) ON DELETE CASCADE,
+            UNIQUE (user_id, name)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS note (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            title VARCHAR(100) NOT NULL,
+            content TEXT,
+            created_date DATETIME NOT NULL,
+            updated_date DATETIME NOT NULL,
+            is_todo TINYINT(1) NOT NULL DEFAULT 0,
+            completed TINYINT(1) NOT NULL DEFAULT 0,
+            importance VARCHAR(20) DEFAULT 'normal',
+            color VARCHAR(20) DEFAULT 'blue',
+            category_id INT,
+            user_id INT NOT NULL,
+            FOREIGN KEY (category_id) REFERENCES category(id) ON DELETE SET NULL,
+            FOREIGN KEY (user_id) REFERENCES user(id) ON DELETE CASCADE
+        )
+    """)
+    create_index(cursor, 'idx_note_user_id', 'note', 'user_id')
+    create_index(cursor, 'idx_note_category_id', 'note', 'category_id')
+    create_index(cursor, 'idx_note_is_todo', 'note', 'is_todo')
+
+def _add_fulltext_index(cursor):
+    create_index(cursor, 'idx_note_fulltext', 'note', 'title, content', kind='FULLTEXT INDEX')
+
+def _add_composite_indexes(cursor):
+    # Note list: WHERE user_id [AND category_id] ORDER BY updated_date, id
+    create_index(cursor, 'idx_note_user_updated', 'note', 'user_id, updated_date, id')
+    create_index(cursor, 'idx_note_user_category_updated', 'note',
+                 'user_id, category_id, updated_date, id')
+    # To-do list: WHERE user_id AND is_todo [AND completed] ORDER BY importance, updated_date
+    create_index(cursor, 'idx_note_user_todo', 'note',
+                 'user_id, is_todo, completed, importance, updated_date, id')
+    # Superseded by the composites above (idx_note_user_updated also backs the
+    # user_id foreign key). idx_note_completed and idx_note_importance only
+    # exist on databases created from an old schema.sql.
+    drop_index(cursor, 'idx_note_user_id', 'note')
+    drop_index(cursor, 'idx_note_is_todo', 'note')
+    drop_index(cursor, 'idx_note_completed', 'note')
+    drop_index(cursor, 'idx_note_importance', 'note')
+
+def _add_versions(cursor):
+    # Per-user change counter behind ETags, plus a per-note version for If-Match
+    cursor.execute("""
+        ALTER TABLE user
+            ADD COLUMN data_version BIGINT NOT NULL DEFAULT 0,
+            ADD COLUMN data_modified DATETIME NULL
+    """)
+    cursor.execute('ALTER TABLE note ADD COLUMN version INT NOT NULL DEFAULT 1')
+
+def _add_revoked_tokens(cursor):
+    # Ids of API tokens revoked before they expire; rows can go once expired
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS revoked_token (
+            jti CHAR(32) PRIMARY KEY,
+            user_id INT NOT NULL,
+            expires_at DATETIME NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES user(id) ON DELETE CASCADE
+        )
+    """)
+    create_index(cursor, 'idx_revoked_token_expires', 'revoked_token', 'expires_at')
+
+def _add_importance_rank(cursor):
+    # Store importance as a rank (0 low, 1 normal, 2 high) so that to-dos sort
+    # by priority rather than alphabetically; unknown labels become normal
+    cursor.execute('ALTER TABLE note ADD COLUMN importance_rank TINYINT NOT NULL DEFAULT 1')
+    cursor.execute("""
+        UPDATE note
+        SET importance_rank = CASE importance WHEN 'low' THEN 0 WHEN 'high' THEN 2 ELSE 1 END
+    """)
+    # To-do list: WHERE user_id AND is_todo [AND completed] ORDER BY importance_rank, updated_date
+    create_index(cursor, 'idx_note_user_todo_rank', 'note',
+                 'user_id, is_todo, completed, importance_rank, updated_date, id')
+    drop_index(cursor, 'idx_note_user_todo', 'note')
+    cursor.execute('ALTER TABLE note DROP COLUMN importance')
+
+def sequence_changes(cursor, user_id=None, unsequenced_only=False):
+    """Give each note and category a change_seq of its own, after its user's data_version.
+    
+    Rows are numbered in id order, categories first, and data_version moves
+    on to the last number, as if each row had been written by a separate
+    change. With unsequenced_only, only rows with change_seq 0 (written
+    outside db.py, e.g. benchmark seeds) are numbered.
+    """
+    user_condition = 'user_id = %s' if user_id is not None else '1 = 1'
+    user_params = (user_id,) if user_id is not None else ()
+    row_condition = user_condition + (' AND change_seq = 0' if unsequenced_only else '')
+    for table in ('category', 'note'):
+        # Numbered with user variables rather than ROW_NUMBER(), which needs
+        # MySQL 8.0: going through the rows in (user_id, id) order, the first
+        # row of each user starts after its data_version and sets @user_id
+        cursor.execute('SET @user_id = NULL, @seq = 0')
+        cursor.execute(f'''
+            UPDATE {table}
+            SET change_seq = IF(@user_id <=> user_id, @seq := @seq + 1,
+                                @seq := (SELECT data_version FROM user WHERE user.id = {table}.user_id) + 1
+                                        + 0 * (@user_id := user_id))
+            WHERE {row_condition}
+            ORDER BY user_id, id
+        ''', user_params)
+        cursor.execute(f'''
+            UPDATE user u
+            JOIN (SELECT user_id, MAX(change_seq) AS change_seq FROM {table}
+                  WHERE {user_condition} GROUP BY user_id) last ON last.user_id = u.id
+            SET u.data_version = last.change_seq, u.data_modified = UTC_TIMESTAMP()
+            WHERE last.change_seq > u.data_version
+        ''', user_params)
+
+def _add_change_seq(cursor):
+    # Delta sync: rows carry the data_version of their last change as
+    # change_seq, and deletes leave a tombstone. Existing rows get a fresh
+    # version, so that every row of a user is newer than since=0.
+    cursor.execute('UPDATE user SET data_version = data_version + 1, data_modified = UTC_TIMESTAMP()')
+    cursor.execute('ALTER TABLE note ADD COLUMN change_seq BIGINT NOT NULL DEFAULT 0')
+    cursor.execute('ALTER TABLE category ADD COLUMN change_seq BIGINT NOT NULL DEFAULT 0')
+    cursor.execute('UPDATE note n JOIN user u ON n.user_id = u.id SET n.change_seq = u.data_version')
+    cursor.execute('UPDATE category c JOIN user u ON c.user_id = u.id SET c.change_seq = u.data_version')
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS tombstone (
+            entity ENUM('note', 'category') NOT NULL,
+            entity_id INT NOT NULL,
+            user_id INT NOT NULL,
+            change_seq BIGINT NOT NULL,
+            PRIMARY KEY (entity, entity_id),
+            FOREIGN KEY (user_id) REFERENCES user(id) ON DELETE CASCADE
+        )
+    """)
+    # Sync: WHERE user_id AND change_seq > since ORDER BY change_seq
+    create_index(cursor, 'idx_note_user_change', 'note', 'user_id, change_seq')
+    create_index(cursor, 'idx_category_user_change', 'category', 'user_id, change_seq')
+    create_index(cursor, 'idx_tombstone_user_change', 'tombstone', 'user_id, change_seq')
+
+def _sequence_existing_changes(cursor):
+    # Migration 7 gave all of a user's rows one change_seq; number them apart
+    # so sync pages of existing data end between rows of different seqs
+    sequence_changes(cursor)
+
+MIGRATIONS = [
+    (1, 'Create user, category and note tables', _create_tables),
+    (2, 'Add FULLTEXT index on note title and content', _add_fulltext_index),
+    (3, 'Replace single-column note indexes with composite ones', _add_composite_indexes),
+    (4, 'Add user data_version and note version', _add_versions),
+    (5, 'Add revoked_token table', _add_revoked_tokens),
+    (6, 'Replace note importance label with importance_rank', _add_importance_rank),
+    (7, 'Add change_seq and tombstone table for delta sync', _add_change_seq),
+    (8, 'Give existing notes and categories a change_seq each', _sequence_existing_changes),
+]
+
+def applied_versions(conn):
+    """Return the set of migration versions already applied to the database."""
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INT PRIMARY KEY,
+                description VARCHAR(255) NOT NULL,
+                applied_at DATETIME NOT NULL
+            )
+        """)
+        cursor.execute('SELECT version FROM schema_migrations')
+        rows = cursor.fetchall()
+    return {row['version'] for row in rows}
+
+def pending_migrations(conn):
+    """Return the migrations that have not been applied yet, in order."""
+    applied = applied_versions(conn)
+    return [migration for migration in MIGRATIONS if migration[0] not in applied]
+
+def upgrade(conn, target=None):
+    """Apply pending migrations up to target (default: all); returns the versions applied."""
+    applied = []
+    for version, description, migrate in pending_migrations(conn):
+        if target is not None and version > target:
+            break
+        logger.info("Applying migration %s: %s", version, description)
+        try:
+            with conn.cursor() as cursor:
+                migrate(cursor)
+                cursor.execute(
+                    'INSERT INTO schema_migrations (version, description, applied_at) VALUES (%s, %s, %s)',
+                    (version, description, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+                )
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.error("Migration %s failed: %s", version, e)
+            raise
+        applied.append(version)
+    return applied
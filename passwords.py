@@ -0,0 +1,58 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+import logging
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+class HasherBusy(Exception):
+    """Raised when too many password hashes are already queued."""
+
+class PasswordHasher:
+    """Runs password hashing and checks on a small, bounded pool of threads.
+
+    At most ``workers`` key derivations run at once (hashlib releases the GIL
+    while deriving, so other requests keep being served), and at most
+    ``max_pending`` more may wait for a worker. Callers beyond that wait up to
+    ``timeout`` seconds for room in the queue and then get HasherBusy, so a
+    burst of logins is turned away instead of piling up on the CPU.
+    """
+
+    def __init__(self, method='pbkdf2:sha256:600000', workers=2, max_pending=16, timeout=5.0):
+        self.method = method
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hasher')
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+        self._method_prefix = None
+        self.rejected = 0
+
+    def _run(self, func, *args):
+        if not self._slots.acquire(timeout=self.timeout):
+            self.rejected += 1
+            raise HasherBusy('Too many password checks in progress')
+        try:
+            future = self._executor.submit(func, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result()
+
+    def hash(self, password):
+        """Hash a password with the configured method."""
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        """Check a password against a stored hash."""
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """True if a stored hash was made with other parameters than the configured method."""
+        if self._method_prefix is None:
+            # Let werkzeug expand defaults (e.g. 'scrypt' -> 'scrypt:32768:8:1')
+            self._method_prefix = self.hash('').split('$', 1)[0]
+        return password_hash.split('$', 1)[0] != self._method_prefix
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,175 @@
+import threading
+import time
+from collections import deque
+import pymysql
+import logging
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within the checkout timeout."""
+
+class ConnectionPool:
+    """A bounded, thread-safe pool of pymysql connections.
+
+    Up to ``size`` connections are kept open between requests. When all of
+    them are busy, up to ``max_overflow`` extra connections may be opened;
+    those are closed again as soon as they are returned. Callers beyond that
+    limit wait up to ``timeout`` seconds for a connection to be released.
+    """
+
+    def __init__(self, connect_kwargs, size=5, max_overflow=10, timeout=30.0,
+                 max_idle=300.0, pre_ping=True):
+        self.connect_kwargs = dict(connect_kwargs)
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.pre_ping = pre_ping
+
+        self._cond = threading.Condition()
+        self._idle = deque()  # (connection, returned_at), newest on the right
+        self._open = 0
+        self._in_use = 0
+
+        # Counters exposed through metrics()
+        self._checkouts = 0
+        self._connects = 0
+        self._discards = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._timeouts = 0
+
+    def acquire(self):
+        """Check a connection out of the pool, opening one if allowed."""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            conn, stale = self._checkout(deadline)
+            for old in stale:
+                self._close_quietly(old)
+
+            if conn is None:
+                try:
+                    conn = pymysql.connect(**self.connect_kwargs)
+                except Exception:
+                    self._forget()
+                    raise
+                with self._cond:
+                    self._connects += 1
+                return conn
+
+            if self.pre_ping:
+                try:
+                    conn.ping(reconnect=False)
+                except Exception as e:
+                    logger.debug("Discarding dead pooled connection: %s", e)
+                    self._close_quietly(conn)
+                    self._forget()
+                    continue
+            return conn
+
+    def release(self, conn, discard=False):
+        """Return a connection to the pool, rolling back any open transaction."""
+        if not discard:
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+
+        with self._cond:
+            self._in_use -= 1
+            if discard or self._open > self.size:
+                self._open -= 1
+                self._discards += 1
+                close = True
+            else:
+                self._idle.append((conn, time.monotonic()))
+                close = False
+            self._cond.notify()
+
+        if close:
+            self._close_quietly(conn)
+
+    def metrics(self):
+        """Return a snapshot of the pool's gauges and counters."""
+        with self._cond:
+            return {
+                'size': self.size,
+                'max_overflow': self.max_overflow,
+                'open': self._open,
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'checkouts': self._checkouts,
+                'connects': self._connects,
+                'discards': self._discards,
+                'waits': self._waits,
+                'wait_time': self._wait_time,
+                'timeouts': self._timeouts,
+            }
+
+    def close_all(self):
+        """Close every idle connection. Checked-out connections are closed on release."""
+        with self._cond:
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._open -= len(idle)
+            self.size = 0
+        for conn in idle:
+            self._close_quietly(conn)
+
+    def _checkout(self, deadline):
+        """Reserve a slot; returns (idle connection or None, stale connections to close)."""
+        stale = []
+        with self._cond:
+            waited = False
+            wait_start = time.monotonic()
+            while True:
+                now = time.monotonic()
+                # Connections idle for too long are likely to have been dropped
+                # by the server (wait_timeout) or a middlebox, so retire them.
+                while self._idle and now - self._idle[0][1] > self.max_idle:
+                    stale.append(self._idle.popleft()[0])
+                    self._open -= 1
+                    self._discards += 1
+
+                if self._idle or self._open < self.size + self.max_overflow:
+                    break
+
+                remaining = deadline - now
+                if remaining <= 0:
+                    self._timeouts += 1
+                    self._wait_time += now - wait_start
+                    raise PoolTimeout(
+                        f"No database connection available after {self.timeout}s "
+                        f"({self._in_use} in use)"
+                    )
+                if not waited:
+                    waited = True
+                    self._waits += 1
+                self._cond.wait(remaining)
+
+            if waited:
+                self._wait_time += time.monotonic() - wait_start
+
+            self._checkouts += 1
+            self._in_use += 1
+            if self._idle:
+                return self._idle.pop()[0], stale
+            self._open += 1
+            return None, stale
+
+    def _forget(self):
+        """Give back the slot of a connection that failed to open or was discarded."""
+        with self._cond:
+            self._in_use -= 1
+            self._open -= 1
+            self._discards += 1
+            self._cond.notify()
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
@@ -0,0 +1,42 @@
+import threading
+import time
+from collections import OrderedDict
+
+class TokenBucketLimiter:
+    """In-memory token buckets, one per key (e.g. client IP or username).
+
+    Each bucket holds up to ``burst`` tokens and refills at ``rate`` tokens
+    per second; every allowed attempt takes one token. Only the
+    ``maxsize`` most recently used keys are tracked, so memory stays
+    bounded when many distinct keys are seen; a forgotten key starts again
+    with a full bucket.
+    """
+
+    def __init__(self, rate, burst, maxsize=10000):
+        self.rate = rate
+        self.burst = burst
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    def allow(self, key):
+        """Take a token for key; returns 0 if allowed, else seconds until a token is free."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+            if tokens >= 1:
+                retry_after = 0
+                tokens -= 1
+            else:
+                retry_after = (1 - tokens) / self.rate
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return retry_after
+
+    def reset(self, key):
+        """Forget key's bucket, e.g. after a successful login."""
+        with self._lock:
+            self._buckets.pop(key, None)
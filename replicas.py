@@ -0,0 +1,171 @@
+import itertools
+import threading
+import time
+import pymysql
+from pool import ConnectionPool
+import logging
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# MySQL error for a statement needing a privilege the user lacks
+ER_SPECIFIC_ACCESS_DENIED = 1227
+
+def parse_replica(address, default_port=3306):
+    """Split a DB_REPLICAS entry of the form host[:port] into (host, port)."""
+    host, _, port = address.rpartition(':')
+    if not host or not port.isdigit():
+        return address, default_port
+    return host, int(port)
+
+def replication_lag(conn):
+    """Seconds a server's replication lags behind its source.
+
+    Returns None if replication is stopped, and 0 for a server that is not
+    a replica at all, such as a second local instance standing in for one.
+    """
+    with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+        try:
+            cursor.execute('SHOW REPLICA STATUS')
+        except pymysql.err.ProgrammingError:
+            # MySQL before 8.0.22
+            cursor.execute('SHOW SLAVE STATUS')
+        rows = cursor.fetchall()
+    if not rows:
+        return 0
+    # One row per replication channel; the slowest one counts
+    lags = [row.get('Seconds_Behind_Source', row.get('Seconds_Behind_Master')) for row in rows]
+    if any(lag is None for lag in lags):
+        return None
+    return max(lags)
+
+class Replica:
+    """A read replica's connection pool and the result of its last health check."""
+
+    def __init__(self, name, pool):
+        self.name = name
+        self.pool = pool
+        self.healthy = True
+        self.lag = None
+        self.error = None
+        self.checked_at = None
+        self.ejections = 0
+        self._check_lock = threading.Lock()
+
+class ReplicaSet:
+    """Read replicas of the primary database, ejected while they lag.
+
+    A replica is health-checked at most every ``check_interval`` seconds,
+    by the first request to pick it after that; other requests go on using
+    the last result meanwhile. A replica that lags more than ``max_lag``
+    seconds, has replication stopped or cannot be reached is left out of
+    rotation until a later check finds it healthy again.
+    """
+
+    def __init__(self, replicas, max_lag=5.0, check_interval=5.0):
+        self.replicas = list(replicas)
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+
+        # Counters exposed through stats()
+        self._replica_reads = 0
+        self._fallback_reads = 0
+
+    def choose(self):
+        """Pick a healthy replica in round-robin order; None if every replica is ejected."""
+        start = next(self._next)
+        for offset in range(len(self.replicas)):
+            replica = self.replicas[(start + offset) % len(self.replicas)]
+            self._maybe_check(replica)
+            if replica.healthy:
+                return replica
+        return None
+
+    def check(self, replica):
+        """Measure a replica's lag now, ejecting or readmitting it."""
+        conn = None
+        try:
+            conn = replica.pool.acquire()
+            lag = replication_lag(conn)
+        except Exception as e:
+            if conn is not None:
+                replica.pool.release(conn, discard=True)
+            error = str(e)
+            if isinstance(e, pymysql.err.OperationalError) and e.args and e.args[0] == ER_SPECIFIC_ACCESS_DENIED:
+                # Without a lag measurement the replica cannot be trusted with reads
+                error = 'cannot measure lag: grant the database user REPLICATION CLIENT'
+            self._record(replica, False, None, error)
+            return
+        replica.pool.release(conn)
+
+        if lag is None:
+            self._record(replica, False, None, 'replication is stopped')
+        elif lag > self.max_lag:
+            self._record(replica, False, lag, f'{lag}s behind the primary')
+        else:
+            self._record(replica, True, lag, None)
+
+    def eject(self, replica, error):
+        """Take a replica out of rotation until its next check, e.g. after a failed connect."""
+        self._record(replica, False, replica.lag, str(error))
+
+    def count_read(self, replica):
+        """Count a request's reads as served by replica, or by the primary if none was healthy."""
+        with self._lock:
+            if replica is None:
+                self._fallback_reads += 1
+            else:
+                self._replica_reads += 1
+
+    def stats(self):
+        """Return health and routing counters across all replicas."""
+        lags = [replica.lag for replica in self.replicas if replica.healthy and replica.lag is not None]
+        with self._lock:
+            return {
+                'replicas': len(self.replicas),
+                'healthy': sum(1 for replica in self.replicas if replica.healthy),
+                'max_lag': max(lags, default=0),
+                'ejections': sum(replica.ejections for replica in self.replicas),
+                'replica_reads': self._replica_reads,
+                'fallback_reads': self._fallback_reads,
+            }
+
+    def close_all(self):
+        for replica in self.replicas:
+            replica.pool.close_all()
+
+    def _maybe_check(self, replica):
+        checked_at = replica.checked_at
+        if checked_at is not None and time.monotonic() - checked_at < self.check_interval:
+            return
+        # Only one request checks a replica; the others use its last state
+        if replica._check_lock.acquire(blocking=False):
+            try:
+                self.check(replica)
+            finally:
+                replica._check_lock.release()
+
+    def _record(self, replica, healthy, lag, error):
+        if replica.healthy and not healthy:
+            replica.ejections += 1
+            logger.warning("Ejecting read replica %s: %s", replica.name, error)
+        elif healthy and not replica.healthy:
+            logger.info("Read replica %s is back in rotation (lag %ss)", replica.name, lag)
+        replica.healthy = healthy
+        replica.lag = lag
+        replica.error = error
+        replica.checked_at = time.monotonic()
+
+def replica_set(connect_kwargs, addresses, max_lag=5.0, check_interval=5.0, **pool_kwargs):
+    """Build a ReplicaSet with one ConnectionPool per host[:port] address.
+
+    connect_kwargs are the primary's; each replica overrides host and port.
+    """
+    replicas = []
+    for address in addresses:
+        host, port = parse_replica(address, connect_kwargs.get('port', 3306))
+        pool = ConnectionPool({**connect_kwargs, 'host': host, 'port': port}, **pool_kwargs)
+        replicas.append(Replica(f'{host}:{port}', pool))
+    return ReplicaSet(replicas, max_lag, check_interval)
@@ -1,12 +1,159 @@
-from flask import render_template, redirect, url_for, request, flash, jsonify, session
+from flask import render_template, redirect, url_for, request, flash, jsonify, session, make_response, current_app, g, stream_with_context
 from datetime import datetime
+import hashlib
+import math
+import time
 import db
 import auth
+import tokens
+import events
+import transfer
+import metrics
+import fragments
 import logging
 
 # Setup logging
 logger = logging.getLogger(__name__)
 
+# Fields /api/notes clients may pick with ?fields=a,b,c
+API_NOTE_FIELDS = {'id', 'title', 'content', 'preview', 'created_date', 'updated_date',
+                   'is_todo', 'completed', 'importance', 'color', 'category_id',
+                   'category_name', 'user_id', 'version', 'relevance'}
+
+def parse_note_fields(value):
+    """Parse a ?fields= value into (needs full content, field names to keep or None).
+    
+    'full' (the default) returns complete notes, 'slim' returns a content
+    preview instead, and a comma-separated list returns just those fields.
+    Raises ValueError for unknown field names.
+    """
+    if not value or value == 'full':
+        return True, None
+    if value == 'slim':
+        return False, None
+    
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    unknown = set(fields) - API_NOTE_FIELDS
+    if not fields or unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return 'content' in fields, fields
+
+def select_fields(notes, fields):
+    """Trim each note to the requested fields (all fields if fields is None)."""
+    if not fields:
+        return notes
+    return [{field: note[field] for field in fields if field in note} for note in notes]
+
+def parse_importance(value):
+    """Check an importance label; raises ValueError unless it is one of db.IMPORTANCE_LABELS."""
+    if not isinstance(value, str) or value not in db.IMPORTANCE_RANKS:
+        raise ValueError(f"importance must be one of {', '.join(db.IMPORTANCE_LABELS)}")
+    return value
+
+def note_updates_from(data):
+    """Map the note fields present in an API payload to column updates.
+    
+    Raises ValueError for an unknown importance label.
+    """
+    updates = {}
+    
+    if 'title' in data:
+        updates['title'] = data['title']
+    if 'content' in data:
+        updates['content'] = data['content']
+    if 'is_todo' in data:
+        updates['is_todo'] = 1 if data['is_todo'] else 0
+    if 'completed' in data:
+        updates['completed'] = 1 if data['completed'] else 0
+    if 'importance' in data:
+        updates['importance'] = parse_importance(data['importance'])
+    if 'color' in data:
+        updates['color'] = data['color']
+    
+    return updates
+
+def parse_batch_operation(item):
+    """Validate one /api/notes/batch operation and normalize it for db.apply_note_batch.
+    
+    Raises ValueError describing the first problem found.
+    """
+    if not isinstance(item, dict):
+        raise ValueError('Operation must be an object')
+    
+    op = item.get('op')
+    if op == 'create':
+        if not item.get('title'):
+            raise ValueError('Title is required')
+        return {
+            'op': 'create',
+            'title': item['title'],
+            'content': item.get('content', ''),
+            'category': item.get('category'),
+            'is_todo': bool(item.get('is_todo', False)),
+            'importance': parse_importance(item.get('importance', 'normal')),
+            'color': item.get('color', 'blue')
+        }
+    
+    if op not in ('update', 'complete', 'delete'):
+        raise ValueError('op must be one of create, update, complete, delete')
+    
+    note_id = item.get('id')
+    if not isinstance(note_id, int) or isinstance(note_id, bool) or note_id <= 0:
+        raise ValueError('id must be a positive integer')
+    
+    if op == 'delete':
+        return {'op': 'delete', 'id': note_id}
+    if op == 'complete':
+        return {'op': 'complete', 'id': note_id, 'completed': bool(item.get('completed', True))}
+    
+    operation = {'op': 'update', 'id': note_id, 'updates': note_updates_from(item)}
+    if 'category' in item:
+        operation['category'] = item['category']
+    if not operation['updates'] and 'category' not in item:
+        raise ValueError('Nothing to update')
+    if 'title' in operation['updates'] and not operation['updates']['title']:
+        raise ValueError('Title cannot be empty')
+    return operation
+
+def note_etag(note):
+    """ETag of a single note; changes whenever the note's version does."""
+    return f"note-{note['id']}-{note['version']}"
+
+def listing_etag(prefix, user_id, version, query_string=None):
+    """ETag of a view of a user's data at data_version, for the current query string."""
+    if query_string is None:
+        query_string = request.query_string
+    digest = hashlib.sha1(query_string).hexdigest()[:12]
+    return f'{prefix}-{user_id}-{version}-{digest}'
+
+def with_validators(response, etag, last_modified=None):
+    """Attach ETag/Last-Modified and require clients to revalidate."""
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def not_modified(etag, last_modified=None):
+    """Return a 304 response if the request's validators still match, else None."""
+    if request.if_none_match:
+        matched = request.if_none_match.contains(etag)
+    elif request.if_modified_since and last_modified:
+        matched = last_modified <= request.if_modified_since.replace(tzinfo=None)
+    else:
+        matched = False
+    
+    if not matched:
+        return None
+    return with_validators(make_response('', 304), etag, last_modified)
+
+def too_many_attempts(template, retry_after):
+    """429 response re-rendering a form after a throttled login or registration."""
+    flash('Too many attempts, please wait a moment and try again', 'danger')
+    response = make_response(render_template(template), 429)
+    response.headers['Retry-After'] = str(math.ceil(retry_after))
+    return response
+
 def register_routes(app):
     """Register all application routes."""
     
@@ -30,6 +177,10 @@ def register_routes(app):
                 flash('Please fill all required fields', 'danger')
                 return render_template('register.html')
             
+            retry_after = auth.throttle_attempt()
+            if retry_after:
+                return too_many_attempts('register.html', retry_after)
+            
             success, result = auth.register_user(username, email, password)
             
             if not success:
@@ -54,6 +205,10 @@ def register_routes(app):
                 flash('Please provide both username and password', 'danger')
                 return render_template('login.html')
             
+            retry_after = auth.throttle_attempt(username)
+            if retry_after:
+                return too_many_attempts('login.html', retry_after)
+            
             success, result = auth.login_user(username, password)
             
             if not success:
@@ -78,7 +233,6 @@ def register_routes(app):
             return redirect(url_for('login'))
             
         user_id = session['user_id']
-        categories = db.get_categories_by_user(user_id)
         search_query = request.args.get('search', '')
         category_id = request.args.get('category')
         
@@ -86,14 +240,32 @@ def register_routes(app):
             category_id = int(category_id)
         else:
             category_id = None
-            
-        notes = db.get_notes_by_user(user_id, category_id, search_query)
+        
+        try:
+            notes, next_cursor = db.get_notes_page(user_id,
+                                                   current_app.config['NOTES_PAGE_SIZE'],
+                                                   request.args.get('cursor'),
+                                                   category_id,
+                                                   search_query)
+        except ValueError:
+            flash('Invalid page link', 'danger')
+            return redirect(url_for('dashboard'))
+        
+        # "Load more" requests only need the next batch of note cards
+        if request.args.get('fragment'):
+            response = make_response(render_template('_note_cards.html', notes=notes))
+            if next_cursor:
+                response.headers['X-Next-Cursor'] = next_cursor
+            return response
+        
+        categories = db.get_categories_by_user(user_id)
         
         return render_template('dashboard.html', 
                                notes=notes, 
                                categories=categories,
                                search_query=search_query,
-                               current_category=category_id)
+                               current_category=category_id,
+                               next_cursor=next_cursor)
 
     @app.route('/todos')
     @auth.login_required
@@ -103,19 +275,34 @@ def register_routes(app):
             return redirect(url_for('login'))
             
         user_id = session['user_id']
-        categories = db.get_categories_by_user(user_id)
-        
         filter_completed = request.args.get('completed')
         completed = None
         if filter_completed is not None:
             completed = filter_completed.lower() == 'true'
             
-        todos = db.get_todos_by_user(user_id, completed)
+        try:
+            todos, next_cursor = db.get_todos_page(user_id,
+                                                   current_app.config['TODOS_PAGE_SIZE'],
+                                                   request.args.get('cursor'),
+                                                   completed)
+        except ValueError:
+            flash('Invalid page link', 'danger')
+            return redirect(url_for('todos'))
+        
+        # "More to-dos" requests only need the next batch of items
+        if request.args.get('fragment'):
+            response = make_response(render_template('_todo_items.html', todos=todos))
+            if next_cursor:
+                response.headers['X-Next-Cursor'] = next_cursor
+            return response
+        
+        categories = db.get_categories_by_user(user_id)
         
         return render_template('todos.html', 
                                todos=todos, 
                                categories=categories,
-                               filter_completed=filter_completed)
+                               filter_completed=filter_completed,
+                               next_cursor=next_cursor)
 
     @app.route('/note/<int:note_id>')
     @auth.login_required
@@ -124,6 +311,16 @@ def register_routes(app):
             return redirect(url_for('login'))
             
         user_id = session['user_id']
+        
+        # Pages carrying flashed messages must always be rendered fresh
+        etag = last_modified = None
+        if '_flashes' not in session:
+            version, last_modified = db.get_user_version(user_id)
+            etag = listing_etag(f'page-note-{note_id}', user_id, version)
+            response = not_modified(etag, last_modified)
+            if response:
+                return response
+        
         note = db.get_note_by_id(note_id, user_id)
         
         if not note:
@@ -132,9 +329,12 @@ def register_routes(app):
             
         categories = db.get_categories_by_user(user_id)
         
-        return render_template('note.html', 
-                               note=note, 
-                               categories=categories)
+        response = make_response(render_template('note.html', 
+                                                 note=note, 
+                                                 categories=categories))
+        if etag:
+            with_validators(response, etag, last_modified)
+        return response
 
     @app.route('/note/new', methods=['GET', 'POST'])
     @auth.login_required
@@ -153,22 +353,15 @@ def register_routes(app):
             importance = request.form.get('importance', 'normal')
             color = request.form.get('color', 'blue')
             
-            if not title:
-                flash('Title is required', 'danger')
+            if not title or importance not in db.IMPORTANCE_RANKS:
+                flash('Title is required' if not title else 'Invalid priority', 'danger')
                 return render_template('edit_note.html', 
                                       categories=categories,
                                       note=None)
             
-            # Get or create category
-            category_id = None
-            if category_name:
-                category = db.get_category_by_name(category_name, user_id)
-                if category:
-                    category_id = category['id']
-                else:
-                    category_id = db.create_category(category_name, user_id)
-            
-            note_id = db.create_note(title, content, category_id, is_todo, importance, color, user_id)
+            # The category is looked up or created along with the note
+            note_id = db.create_note(title, content, None, is_todo, importance, color, user_id,
+                                     category_name=category_name)
             flash('Note created successfully', 'success')
             
             if is_todo:
@@ -203,31 +396,24 @@ def register_routes(app):
             importance = request.form.get('importance', 'normal')
             color = request.form.get('color', 'blue')
             
-            if not title:
-                flash('Title is required', 'danger')
+            if not title or importance not in db.IMPORTANCE_RANKS:
+                flash('Title is required' if not title else 'Invalid priority', 'danger')
                 return render_template('edit_note.html', 
                                       categories=categories,
                                       note=note)
             
-            # Get or create category
-            category_id = None
-            if category_name:
-                category = db.get_category_by_name(category_name, user_id)
-                if category:
-                    category_id = category['id']
-                else:
-                    category_id = db.create_category(category_name, user_id)
-            
             updates = {
                 'title': title,
                 'content': content,
-                'category_id': category_id,
                 'is_todo': 1 if is_todo else 0,
                 'importance': importance,
                 'color': color
             }
+            if not category_name:
+                updates['category_id'] = None
             
-            db.update_note(note_id, user_id, updates)
+            # The category is looked up or created along with the update
+            db.update_note(note_id, user_id, updates, category_name=category_name)
             flash('Note updated successfully', 'success')
             
             return redirect(url_for('view_note', note_id=note_id))
@@ -291,12 +477,9 @@ def register_routes(app):
 
     # API Routes
     @app.route('/api/notes', methods=['GET'])
-    @auth.login_required
+    @auth.api_auth_required
     def api_get_notes():
-        if 'user_id' not in session:
-            return jsonify({'error': 'Authentication required'}), 401
-            
-        user_id = session['user_id']
+        user_id = g.user_id
         category_id = request.args.get('category')
         search = request.args.get('search')
         
@@ -304,17 +487,46 @@ def register_routes(app):
             category_id = int(category_id)
         else:
             category_id = None
-            
-        notes = db.get_notes_by_user(user_id, category_id, search)
-        return jsonify(notes)
+        
+        limit = request.args.get('limit')
+        cursor = request.args.get('cursor')
+        
+        try:
+            full, fields = parse_note_fields(request.args.get('fields'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Answer unchanged polls without running the list query
+        version, last_modified = db.get_user_version(user_id)
+        etag = listing_etag('notes', user_id, version)
+        response = not_modified(etag, last_modified)
+        if response:
+            return response
+        
+        # Without limit or cursor, keep returning the full list for older clients
+        if limit is None and cursor is None:
+            notes = db.get_notes_by_user(user_id, category_id, search, full)
+            return with_validators(jsonify(select_fields(notes, fields)), etag, last_modified)
+        
+        if limit is None:
+            limit = current_app.config['NOTES_PAGE_SIZE']
+        elif limit.isdigit() and int(limit) > 0:
+            limit = min(int(limit), current_app.config['API_PAGE_MAX'])
+        else:
+            return jsonify({'error': 'limit must be a positive integer'}), 400
+        
+        try:
+            notes, next_cursor = db.get_notes_page(user_id, limit, cursor, category_id, search, full)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        
+        response = jsonify({'notes': select_fields(notes, fields), 'next_cursor': next_cursor})
+        return with_validators(response, etag, last_modified)
 
     @app.route('/api/notes', methods=['POST'])
-    @auth.login_required
+    @auth.api_auth_required
     def api_create_note():
-        if 'user_id' not in session:
-            return jsonify({'error': 'Authentication required'}), 401
-            
-        user_id = session['user_id']
+        user_id = g.user_id
         data = request.json
         
         if not data or not data.get('title'):
@@ -324,88 +536,238 @@ def register_routes(app):
         content = data.get('content', '')
         category_name = data.get('category')
         is_todo = data.get('is_todo', False)
-        importance = data.get('importance', 'normal')
         color = data.get('color', 'blue')
         
-        # Get or create category
-        category_id = None
-        if category_name:
-            category = db.get_category_by_name(category_name, user_id)
-            if category:
-                category_id = category['id']
-            else:
-                category_id = db.create_category(category_name, user_id)
+        try:
+            importance = parse_importance(data.get('importance', 'normal'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        note_id = db.create_note(title, content, category_id, is_todo, importance, color, user_id)
+        note_id = db.create_note(title, content, None, is_todo, importance, color, user_id,
+                                 category_name=category_name)
         note = db.get_note_by_id(note_id, user_id)
         
-        return jsonify(note), 201
+        response = jsonify(note)
+        response.set_etag(note_etag(note))
+        return response, 201
+
+    @app.route('/api/sync', methods=['GET'])
+    @auth.api_auth_required
+    def api_sync():
+        # Changes since the seq of the previous response; since=0 (the default) is a full sync.
+        # A response with more changes to come also has a cursor to continue from.
+        since = request.args.get('since', '0')
+        cursor = request.args.get('cursor') or None
+        limit = request.args.get('limit')
+        if not since.isdigit():
+            return jsonify({'error': 'since must be a non-negative integer'}), 400
+        
+        if limit is None:
+            limit = current_app.config['SYNC_PAGE_SIZE']
+        elif limit.isdigit() and int(limit) > 0:
+            limit = min(int(limit), current_app.config['API_PAGE_MAX'])
+        else:
+            return jsonify({'error': 'limit must be a positive integer'}), 400
+        
+        if cursor is not None:
+            try:
+                db.decode_change_cursor(cursor)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+        
+        try:
+            changes = db.get_changes(g.user_id, int(since), limit, cursor)
+        except ValueError as e:
+            # Typically a client of a restored database; it has to start over with since=0
+            return jsonify({'error': str(e)}), 409
+        
+        response = jsonify(changes)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+
+    @app.route('/api/notes/stream', methods=['GET'])
+    @auth.api_auth_required
+    def api_notes_stream():
+        if not current_app.config['EVENTS_ENABLED']:
+            return jsonify({'error': 'Change feed is disabled'}), 404
+        user_id = g.user_id
+        broker = events.get_broker()
+        heartbeat = current_app.config['EVENTS_HEARTBEAT']
+        deadline = time.monotonic() + current_app.config['EVENTS_STREAM_TIMEOUT']
+        
+        # Subscribe first, so nothing published while catching up is missed
+        subscription = broker.subscribe(user_id)
+        last_event_id = request.headers.get('Last-Event-ID', '')
+        if last_event_id.isdigit():
+            last_id = int(last_event_id)
+            backlog = broker.events_since(user_id, last_id)
+            if backlog is None and db.get_user_version(user_id)[0] == last_id:
+                backlog = []
+            first = None if backlog is not None else 'reset'
+            backlog = backlog or []
+        else:
+            last_id = None
+            backlog = []
+            first = 'ready'
+        if first:
+            # Nothing to resume from: the client must (re)load its notes
+            last_id = db.get_user_version(user_id)[0]
+        
+        def stream():
+            sent = last_id
+            yield 'retry: 3000\n\n'
+            if first:
+                yield events.format_event(sent, first, {'version': sent})
+            for event_id, data in backlog:
+                sent = event_id
+                yield events.format_event(event_id, 'change', data)
+            
+            while time.monotonic() < deadline:
+                event = subscription.get(heartbeat)
+                if subscription.overflowed:
+                    yield events.format_event(None, 'reset', {})
+                    return
+                if event is None:
+                    yield ': keep-alive\n\n'
+                    continue
+                event_id, data = event
+                if event_id <= sent:
+                    continue
+                sent = event_id
+                yield events.format_event(event_id, 'change', data)
+        
+        response = current_app.response_class(stream(), mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'
+        response.call_on_close(subscription.close)
+        return response
+
+    @app.route('/api/notes/batch', methods=['POST'])
+    @auth.api_auth_required
+    def api_batch_notes():
+        user_id = g.user_id
+        data = request.json
+        operations = data.get('operations') if isinstance(data, dict) else None
+        
+        if not isinstance(operations, list) or not operations:
+            return jsonify({'error': 'operations must be a non-empty list'}), 400
+        
+        max_operations = current_app.config['BATCH_MAX_OPERATIONS']
+        if len(operations) > max_operations:
+            return jsonify({'error': f'At most {max_operations} operations per batch'}), 400
+        
+        # Validate everything up front: an invalid operation rejects the whole batch
+        normalized = []
+        errors = []
+        for index, item in enumerate(operations):
+            try:
+                normalized.append(parse_batch_operation(item))
+            except ValueError as e:
+                errors.append({'index': index, 'error': str(e)})
+        
+        if errors:
+            return jsonify({'error': 'Invalid operations, nothing was applied', 'errors': errors}), 400
+        
+        try:
+            results = db.apply_note_batch(user_id, normalized)
+        except Exception:
+            return jsonify({'error': 'Batch failed, nothing was applied'}), 500
+        
+        return jsonify({'results': results})
+
+    @app.route('/api/export', methods=['GET'])
+    @auth.api_auth_required
+    def api_export_notes():
+        fmt = transfer.format_for(request.args.get('format', 'ndjson'))
+        if fmt is None:
+            return jsonify({'error': 'format must be ndjson or csv'}), 400
+        
+        # Rows are read from the database as the response is sent
+        batches = db.iter_export_notes(g.user_id, current_app.config['EXPORT_FETCH_SIZE'])
+        response = current_app.response_class(
+            stream_with_context(transfer.export_chunks(batches, fmt)),
+            mimetype=transfer.FORMATS[fmt]
+        )
+        response.headers['Content-Disposition'] = f'attachment; filename=notesmart-notes.{fmt}'
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+
+    @app.route('/api/import', methods=['POST'])
+    @auth.api_auth_required
+    def api_import_notes():
+        # Either a multipart upload in 'file' or the raw request body
+        upload = request.files.get('file')
+        if upload is not None:
+            fmt = transfer.format_for(request.args.get('format'), upload.mimetype, upload.filename)
+            stream = upload.stream
+        else:
+            fmt = transfer.format_for(request.args.get('format'), request.mimetype)
+            stream = request.stream
+        if fmt is None:
+            return jsonify({'error': 'Upload NDJSON or CSV, or set format=ndjson or format=csv'}), 415
+        
+        config = current_app.config
+        try:
+            report = transfer.run_import(g.user_id, stream, fmt,
+                                         config['IMPORT_BATCH_SIZE'], config['IMPORT_MAX_ERRORS'])
+        except transfer.ImportFailed as e:
+            status = 500 if e.__cause__ is not None else 400
+            return jsonify(dict(e.report, error=str(e))), status
+        
+        return jsonify(report)
 
     @app.route('/api/notes/<int:note_id>', methods=['GET'])
-    @auth.login_required
+    @auth.api_auth_required
     def api_get_note(note_id):
-        if 'user_id' not in session:
-            return jsonify({'error': 'Authentication required'}), 401
-            
-        user_id = session['user_id']
+        user_id = g.user_id
         note = db.get_note_by_id(note_id, user_id)
         
         if not note:
             return jsonify({'error': 'Note not found'}), 404
-            
-        return jsonify(note)
+        
+        etag = note_etag(note)
+        response = not_modified(etag)
+        if response:
+            return response
+        return with_validators(jsonify(note), etag)
 
     @app.route('/api/notes/<int:note_id>', methods=['PUT'])
-    @auth.login_required
+    @auth.api_auth_required
     def api_update_note(note_id):
-        if 'user_id' not in session:
-            return jsonify({'error': 'Authentication required'}), 401
-            
-        user_id = session['user_id']
+        user_id = g.user_id
         note = db.get_note_by_id(note_id, user_id)
         
         if not note:
             return jsonify({'error': 'Note not found'}), 404
+        
+        # Optimistic concurrency: If-Match must name the note's current version
+        expected_version = None
+        if request.if_match and not request.if_match.star_tag:
+            if not request.if_match.contains(note_etag(note)):
+                return jsonify({'error': 'Note has been modified'}), 412
+            expected_version = note['version']
             
         data = request.json
-        updates = {}
-        
-        if 'title' in data:
-            updates['title'] = data['title']
-        if 'content' in data:
-            updates['content'] = data['content']
-        if 'is_todo' in data:
-            updates['is_todo'] = 1 if data['is_todo'] else 0
-        if 'completed' in data:
-            updates['completed'] = 1 if data['completed'] else 0
-        if 'importance' in data:
-            updates['importance'] = data['importance']
-        if 'color' in data:
-            updates['color'] = data['color']
-        
-        if 'category' in data:
-            category_name = data['category']
-            if category_name:
-                category = db.get_category_by_name(category_name, user_id)
-                if category:
-                    updates['category_id'] = category['id']
-                else:
-                    updates['category_id'] = db.create_category(category_name, user_id)
-            else:
-                updates['category_id'] = None
+        try:
+            updates = note_updates_from(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        db.update_note(note_id, user_id, updates)
+        category_name = data.get('category')
+        if 'category' in data and not category_name:
+            updates['category_id'] = None
+        
+        changed = db.update_note(note_id, user_id, updates, expected_version, category_name)
+        if (updates or category_name) and expected_version is not None and not changed:
+            return jsonify({'error': 'Note has been modified'}), 412
         updated_note = db.get_note_by_id(note_id, user_id)
         
-        return jsonify(updated_note)
+        return with_validators(jsonify(updated_note), note_etag(updated_note))
 
     @app.route('/api/notes/<int:note_id>', methods=['DELETE'])
-    @auth.login_required
+    @auth.api_auth_required
     def api_delete_note(note_id):
-        if 'user_id' not in session:
-            return jsonify({'error': 'Authentication required'}), 401
-            
-        user_id = session['user_id']
+        user_id = g.user_id
         note = db.get_note_by_id(note_id, user_id)
         
         if not note:
@@ -416,22 +778,22 @@ def register_routes(app):
         return '', 204
 
     @app.route('/api/categories', methods=['GET'])
-    @auth.login_required
+    @auth.api_auth_required
     def api_get_categories():
-        if 'user_id' not in session:
-            return jsonify({'error': 'Authentication required'}), 401
-            
-        user_id = session['user_id']
+        user_id = g.user_id
+        version, last_modified = db.get_user_version(user_id)
+        etag = listing_etag('categories', user_id, version)
+        response = not_modified(etag, last_modified)
+        if response:
+            return response
+        
         categories = db.get_categories_by_user(user_id)
-        return jsonify(categories)
+        return with_validators(jsonify(categories), etag, last_modified)
 
     @app.route('/api/categories', methods=['POST'])
-    @auth.login_required
+    @auth.api_auth_required
     def api_create_category():
-        if 'user_id' not in session:
-            return jsonify({'error': 'Authentication required'}), 401
-            
-        user_id = session['user_id']
+        user_id = g.user_id
         data = request.json
         
         if not data or not data.get('name'):
@@ -439,23 +801,15 @@ def register_routes(app):
             
         name = data['name']
         
-        # Check if category already exists
-        existing = db.get_category_by_name(name, user_id)
-        if existing:
-            return jsonify(existing), 200
-            
-        category_id = db.create_category(name, user_id)
+        category_id, created = db.upsert_category(name, user_id)
         category = db.get_category_by_id(category_id, user_id)
         
-        return jsonify(category), 201
+        return jsonify(category), 201 if created else 200
 
     @app.route('/api/categories/<int:category_id>', methods=['DELETE'])
-    @auth.login_required
+    @auth.api_auth_required
     def api_delete_category(category_id):
-        if 'user_id' not in session:
-            return jsonify({'error': 'Authentication required'}), 401
-            
-        user_id = session['user_id']
+        user_id = g.user_id
         category = db.get_category_by_id(category_id, user_id)
         
         if not category:
@@ -463,4 +817,83 @@ def register_routes(app):
             
         db.delete_category(category_id, user_id)
         
-        return '', 204
\ No newline at end of file
+        return '', 204
+
+    @app.route('/api/token', methods=['POST'])
+    def api_token():
+        data = request.get_json(silent=True) or {}
+        username = data.get('username')
+        password = data.get('password')
+        
+        if not username or not password:
+            return jsonify({'error': 'username and password are required'}), 400
+        
+        retry_after = auth.throttle_attempt(username)
+        if retry_after:
+            return jsonify({'error': 'Too many attempts'}), 429, {'Retry-After': str(math.ceil(retry_after))}
+        
+        success, result = auth.authenticate(username, password)
+        if not success:
+            return jsonify({'error': result}), 401
+        
+        return jsonify(tokens.issue_tokens(result['id'])), 200, {'Cache-Control': 'no-store'}
+
+    @app.route('/api/token/refresh', methods=['POST'])
+    def api_refresh_token():
+        data = request.get_json(silent=True) or {}
+        if not data.get('refresh_token'):
+            return jsonify({'error': 'refresh_token is required'}), 400
+        
+        try:
+            new_tokens = tokens.refresh_tokens(data['refresh_token'])
+        except tokens.TokenError as e:
+            return jsonify({'error': str(e)}), 401
+        
+        return jsonify(new_tokens), 200, {'Cache-Control': 'no-store'}
+
+    @app.route('/api/token/revoke', methods=['POST'])
+    def api_revoke_token():
+        data = request.get_json(silent=True) or {}
+        token = data.get('token')
+        if not token:
+            return jsonify({'error': 'token is required'}), 400
+        
+        # Holding a token is enough to revoke it; unknown or already
+        # invalid tokens are accepted silently, as in RFC 7009
+        for kind in (tokens.REFRESH, tokens.ACCESS):
+            try:
+                payload = tokens.load_token(token, kind)
+            except tokens.TokenError:
+                continue
+            tokens.revoke(payload)
+            break
+        
+        return '', 204
+
+    @app.route('/admin/metrics')
+    def admin_metrics():
+        # Admins only, or a scraper presenting METRICS_TOKEN
+        if not (metrics.valid_scrape_token(request) or auth.is_admin(auth.current_user())):
+            return 'Forbidden', 403
+        
+        extra = metrics.pool_samples(db.get_pool().metrics())
+        replica_set = db.get_replicas()
+        if replica_set is not None:
+            extra += metrics.replica_samples(replica_set.stats())
+        query_cache = db.get_query_cache()
+        if query_cache is not None:
+            extra += metrics.cache_samples('query_cache', query_cache.stats())
+        user_cache_stats = auth.user_cache_stats()
+        if user_cache_stats is not None:
+            extra += metrics.cache_samples('user_cache', user_cache_stats)
+        category_cache = db.get_category_id_cache()
+        if category_cache is not None:
+            extra += metrics.cache_samples('category_cache', category_cache.stats())
+        fragment_cache = fragments.get_fragment_cache()
+        if fragment_cache is not None:
+            extra += metrics.cache_samples('fragment_cache', fragment_cache.stats())
+        
+        response = make_response(metrics.get_registry().render(extra))
+        response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+        response.headers['Cache-Control'] = 'no-store'
+        return response
\ No newline at end of file
@@ -1,4 +1,10 @@
+-- Fresh-install equivalent of the migrations in migrations.py; keep the two in
+-- sync. Existing databases should be upgraded with `flask db upgrade` instead.
+
 -- Drop tables if they exist
+DROP TABLE IF EXISTS schema_migrations;
+DROP TABLE IF EXISTS tombstone;
+DROP TABLE IF EXISTS revoked_token;
 DROP TABLE IF EXISTS note;
 DROP TABLE IF EXISTS category;
 DROP TABLE IF EXISTS user;
@@ -8,7 +14,9 @@ CREATE TABLE user (
     id INT AUTO_INCREMENT PRIMARY KEY,
     username VARCHAR(64) UNIQUE NOT NULL,
     email VARCHAR(120) UNIQUE NOT NULL,
-    password_hash VARCHAR(255) NOT NULL
+    password_hash VARCHAR(255) NOT NULL,
+    data_version BIGINT NOT NULL DEFAULT 0,
+    data_modified DATETIME NULL
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- Create category table
@@ -16,6 +24,7 @@ CREATE TABLE category (
     id INT AUTO_INCREMENT PRIMARY KEY,
     name VARCHAR(64) NOT NULL,
     user_id INT NOT NULL,
+    change_seq BIGINT NOT NULL DEFAULT 0,
     FOREIGN KEY (user_id) REFERENCES user(id) ON DELETE CASCADE,
     UNIQUE KEY user_category (user_id, name)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -29,17 +38,60 @@ CREATE TABLE note (
     updated_date DATETIME NOT NULL,
     is_todo TINYINT(1) NOT NULL DEFAULT 0,
     completed TINYINT(1) NOT NULL DEFAULT 0,
-    importance VARCHAR(20) DEFAULT 'normal',
+    importance_rank TINYINT NOT NULL DEFAULT 1,
     color VARCHAR(20) DEFAULT 'blue',
     category_id INT,
     user_id INT NOT NULL,
+    version INT NOT NULL DEFAULT 1,
+    change_seq BIGINT NOT NULL DEFAULT 0,
     FOREIGN KEY (category_id) REFERENCES category(id) ON DELETE SET NULL,
     FOREIGN KEY (user_id) REFERENCES user(id) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- Create indexes for performance
-CREATE INDEX idx_note_user_id ON note(user_id);
 CREATE INDEX idx_note_category_id ON note(category_id);
-CREATE INDEX idx_note_is_todo ON note(is_todo);
-CREATE INDEX idx_note_completed ON note(completed);
-CREATE INDEX idx_note_importance ON note(importance);
\ No newline at end of file
+CREATE FULLTEXT INDEX idx_note_fulltext ON note(title, content);
+CREATE INDEX idx_note_user_updated ON note(user_id, updated_date, id);
+CREATE INDEX idx_note_user_category_updated ON note(user_id, category_id, updated_date, id);
+CREATE INDEX idx_note_user_todo_rank ON note(user_id, is_todo, completed, importance_rank, updated_date, id);
+CREATE INDEX idx_note_user_change ON note(user_id, change_seq);
+CREATE INDEX idx_category_user_change ON category(user_id, change_seq);
+
+-- Create revoked API token table
+CREATE TABLE revoked_token (
+    jti CHAR(32) PRIMARY KEY,
+    user_id INT NOT NULL,
+    expires_at DATETIME NOT NULL,
+    FOREIGN KEY (user_id) REFERENCES user(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+CREATE INDEX idx_revoked_token_expires ON revoked_token(expires_at);
+
+-- Create tombstone table of deleted notes and categories for delta sync
+CREATE TABLE tombstone (
+    entity ENUM('note', 'category') NOT NULL,
+    entity_id INT NOT NULL,
+    user_id INT NOT NULL,
+    change_seq BIGINT NOT NULL,
+    PRIMARY KEY (entity, entity_id),
+    FOREIGN KEY (user_id) REFERENCES user(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+CREATE INDEX idx_tombstone_user_change ON tombstone(user_id, change_seq);
+
+-- Record the migrations this file already includes
+CREATE TABLE schema_migrations (
+    version INT PRIMARY KEY,
+    description VARCHAR(255) NOT NULL,
+    applied_at DATETIME NOT NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+INSERT INTO schema_migrations (version, description, applied_at) VALUES
+    (1, 'Create user, category and note tables', NOW()),
+    (2, 'Add FULLTEXT index on note title and content', NOW()),
+    (3, 'Replace single-column note indexes with composite ones', NOW()),
+    (4, 'Add user data_version and note version', NOW()),
+    (5, 'Add revoked_token table', NOW()),
+    (6, 'Replace note importance label with importance_rank', NOW()),
+    (7, 'Add change_seq and tombstone table for delta sync', NOW()),
+    (8, 'Give existing notes and categories a change_seq each', NOW());
\ No newline at end of file
@@ -0,0 +1,63 @@
+// Keeps open pages in step with changes made in other tabs and devices,
+// using the /api/notes/stream change feed instead of polling. The page's
+// body has data-live-updates only when the server enables the feed.
+window.NoteSmartLive = (function() {
+    // Ids of notes this page is changing itself, so their events are ignored
+    const expected = new Set();
+    let stale = false;
+
+    function expect(noteIds) {
+        noteIds.forEach(id => expected.add(id));
+    }
+
+    function isOwnChange(changes) {
+        const notes = changes.filter(change => change.entity === 'note');
+        if (notes.length === 0 || !notes.every(change => expected.has(change.id))) {
+            return false;
+        }
+        notes.forEach(change => expected.delete(change.id));
+        return true;
+    }
+
+    function showNotice() {
+        if (document.getElementById('live-notice')) {
+            return;
+        }
+        const notice = document.createElement('div');
+        notice.id = 'live-notice';
+        notice.className = 'alert alert-success';
+        notice.innerHTML = 'Your notes were changed elsewhere. <a href="#">Refresh</a>';
+        notice.querySelector('a').addEventListener('click', function(e) {
+            e.preventDefault();
+            window.location.reload();
+        });
+        document.querySelector('main .container').prepend(notice);
+    }
+
+    function markStale() {
+        // A hidden tab simply reloads when it is shown again
+        if (document.hidden) {
+            stale = true;
+        } else {
+            showNotice();
+        }
+    }
+
+    document.addEventListener('visibilitychange', function() {
+        if (!document.hidden && stale) {
+            window.location.reload();
+        }
+    });
+
+    if (window.EventSource && 'liveUpdates' in document.body.dataset) {
+        const source = new EventSource('/api/notes/stream');
+        source.addEventListener('change', function(e) {
+            if (!isOwnChange(JSON.parse(e.data).changes)) {
+                markStale();
+            }
+        });
+        source.addEventListener('reset', markStale);
+    }
+
+    return { expect: expect };
+})();
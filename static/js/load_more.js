@@ -0,0 +1,38 @@
+// Appends the next page of a list in place instead of navigating. The
+// #load-more link's page is fetched with fragment=1 and its HTML added to
+// the element its data-target names; the link then moves on to the page
+// after (from the X-Next-Cursor header), or goes away after the last one.
+document.addEventListener('DOMContentLoaded', function() {
+    const loadMore = document.getElementById('load-more');
+    if (!loadMore) {
+        return;
+    }
+    
+    loadMore.addEventListener('click', function(e) {
+        e.preventDefault();
+        const url = new URL(loadMore.href);
+        url.searchParams.set('fragment', '1');
+        
+        fetch(url)
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error('Failed to load more');
+                }
+                const nextCursor = response.headers.get('X-Next-Cursor');
+                return response.text().then(html => ({ html, nextCursor }));
+            })
+            .then(({ html, nextCursor }) => {
+                document.querySelector(loadMore.dataset.target).insertAdjacentHTML('beforeend', html);
+                if (nextCursor) {
+                    const nextUrl = new URL(loadMore.href);
+                    nextUrl.searchParams.set('cursor', nextCursor);
+                    loadMore.href = nextUrl.toString();
+                } else {
+                    loadMore.parentElement.remove();
+                }
+            })
+            .catch(error => {
+                console.error('Error:', error);
+            });
+    });
+});
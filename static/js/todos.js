@@ -1,42 +1,98 @@
-// JavaScript to handle to-do completion with the proper PUT method
+// JavaScript to handle to-do completion through the batch API
 document.addEventListener('DOMContentLoaded', function() {
-    // Find all checkbox forms
-    const checkboxForms = document.querySelectorAll('.checkbox-form');
+    const todosList = document.querySelector('.todos-list');
     
-    checkboxForms.forEach(form => {
-        const checkbox = form.querySelector('input[type="checkbox"]');
+    // Toggles made in quick succession are sent together in one request
+    const pendingChanges = new Map();
+    let flushTimer = null;
+    
+    function formFor(noteId) {
+        return document.querySelector(`.checkbox-form[data-note-id="${noteId}"]`);
+    }
+    
+    // Put a to-do whose change failed back in its last saved state, unless
+    // a newer change to it is waiting to be sent
+    function rollBack(noteId) {
+        if (pendingChanges.has(noteId)) {
+            return;
+        }
+        const item = formFor(noteId).closest('.todo-item');
+        item.querySelector('input[type="checkbox"]').checked = item.classList.contains('completed');
+    }
+    
+    // keepalive lets the request outlive the page when it is being left
+    function flushChanges(keepalive) {
+        clearTimeout(flushTimer);
+        flushTimer = null;
+        if (pendingChanges.size === 0) {
+            return;
+        }
+        const operations = Array.from(pendingChanges, ([noteId, completed]) => ({
+            op: 'complete',
+            id: noteId,
+            completed: completed
+        }));
+        pendingChanges.clear();
         
-        checkbox.addEventListener('change', function(e) {
-            // Prevent default form submission
-            e.preventDefault();
-            
-            // Get the note ID from the form's action URL
-            const noteId = form.getAttribute('data-note-id');
-            
-            // Get the completed state from the checkbox
-            const completed = checkbox.checked;
-            
-            // Send a PUT request to update the note
-            fetch(`/api/notes/${noteId}`, {
-                method: 'PUT',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify({
-                    completed: completed
-                })
+        // Don't treat our own changes as coming from elsewhere
+        if (window.NoteSmartLive) {
+            NoteSmartLive.expect(operations.map(op => op.id));
+        }
+        
+        fetch('/api/notes/batch', {
+            method: 'POST',
+            keepalive: keepalive === true,
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({
+                operations: operations
             })
-            .then(response => {
-                if (response.ok) {
-                    // Reload the page to show updated state
-                    window.location.reload();
+        })
+        .then(response => {
+            if (!response.ok) {
+                throw new Error('Failed to update to-dos');
+            }
+            return response.json();
+        })
+        .then(data => {
+            // Show the updated state without reloading the page
+            data.results.forEach(result => {
+                if (result.status === 'updated') {
+                    const op = operations.find(op => op.id === result.id);
+                    formFor(result.id).closest('.todo-item').classList.toggle('completed', op.completed);
                 } else {
-                    console.error('Failed to update to-do');
+                    rollBack(result.id);
                 }
-            })
-            .catch(error => {
-                console.error('Error:', error);
             });
+        })
+        .catch(error => {
+            // Nothing in the batch was applied
+            console.error('Error:', error);
+            operations.forEach(op => rollBack(op.id));
         });
+    }
+    
+    // Send toggles still waiting when the page is left
+    window.addEventListener('pagehide', function() {
+        flushChanges(true);
+    });
+    
+    // Listened for on the list, so to-dos appended by "More to-dos" are covered too
+    todosList.addEventListener('change', function(e) {
+        const form = e.target.closest('.checkbox-form');
+        if (!form) {
+            return;
+        }
+        // Prevent default form submission
+        e.preventDefault();
+        
+        // Get the note ID from the form's data attribute
+        const noteId = parseInt(form.getAttribute('data-note-id'), 10);
+        
+        // Queue the completed state and send it shortly
+        pendingChanges.set(noteId, e.target.checked);
+        clearTimeout(flushTimer);
+        flushTimer = setTimeout(flushChanges, 400);
     });
 });
\ No newline at end of file
@@ -0,0 +1,120 @@
+import os
+import pymysql
+import pytest
+from app import create_app
+from config import Config
+import db
+
+class TestConfig(Config):
+    TESTING = True
+    DEBUG = False
+    SECRET_KEY = 'test'
+    LOG_FORMAT = 'text'
+    LOG_LEVEL = 'WARNING'
+
+class FakeCursor:
+    """Cursor stand-in answering each statement with its connection's responder."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.rowcount = 0
+        self.lastrowid = 0
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        pass
+
+    def execute(self, query, args=None):
+        query = ' '.join(query.split())
+        self.conn.statements.append((query, args))
+        result = self.conn.responder(query, args) if self.conn.responder else None
+        # A responder returns rows, or the rowcount of a write
+        if isinstance(result, int):
+            self._rows, self.rowcount = [], result
+        else:
+            self._rows = list(result or [])
+            self.rowcount = len(self._rows) or 1
+        self.conn.last_id += 1
+        self.lastrowid = self.conn.last_id
+
+    def executemany(self, query, args):
+        for row in args:
+            self.execute(query, row)
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def fetchmany(self, size=None):
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+class FakeConnection:
+    """Connection stand-in recording the statements run on it."""
+
+    def __init__(self, responder=None):
+        self.responder = responder
+        self.statements = []
+        self.last_id = 100
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self, *args):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def queries(self, prefix=''):
+        return [query for query, _ in self.statements if query.startswith(prefix)]
+
+@pytest.fixture
+def app():
+    return create_app(TestConfig)
+
+@pytest.fixture
+def mysql_app():
+    """An app on a freshly migrated MySQL database named by TEST_DB_NAME.
+    
+    The database is dropped and recreated, so point TEST_DB_NAME at a
+    scratch database; the DB_* settings give the server and credentials.
+    Tests using this are skipped when TEST_DB_NAME is not set.
+    """
+    name = os.environ.get('TEST_DB_NAME')
+    if not name:
+        pytest.skip('TEST_DB_NAME is not set')
+
+    class MySQLConfig(TestConfig):
+        DB_NAME = name
+
+    app = create_app(MySQLConfig)
+    conn = pymysql.connect(host=app.config['DB_HOST'], port=app.config['DB_PORT'],
+                           user=app.config['DB_USER'], password=app.config['DB_PASSWORD'])
+    with conn.cursor() as cursor:
+        cursor.execute(f'DROP DATABASE IF EXISTS {name}')
+    conn.close()
+    with app.app_context():
+        db.init_db()
+        db.close_db()
+    yield app
+    db_pool = app.extensions.get('db_pool')
+    if db_pool is not None:
+        db_pool.close_all()
+
+@pytest.fixture
+def fake_db(app, monkeypatch):
+    """Serve every db.get_db() call, primary or replica, from one FakeConnection."""
+    conn = FakeConnection()
+    monkeypatch.setattr(db, 'get_db', lambda *args, **kwargs: conn)
+    return conn
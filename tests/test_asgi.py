@@ -0,0 +1,51 @@
+import asyncio
+import json
+from datetime import datetime
+import pytest
+
+# The ASGI entry point's optional dependencies
+pytest.importorskip('aiomysql')
+pytest.importorskip('asgiref')
+import asgi
+
+NOTES = [{'id': 3, 'title': 'c', 'updated_date': datetime(2024, 1, 3)},
+         {'id': 2, 'title': 'b', 'updated_date': datetime(2024, 1, 2)}]
+
+def respond(query, params):
+    if query.startswith('SELECT data_version'):
+        return [{'data_version': 5, 'data_modified': None}]
+    if query.startswith('SELECT'):
+        return [dict(note) for note in NOTES]
+    return []
+
+def asgi_get(app, query_string):
+    """Run the native list_notes handler; returns (status, JSON body)."""
+    server = asgi.AsyncNoteSmart(app)
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    async def user_version(user_id):
+        return 5, None
+
+    async def fetch(query, params, records=False):
+        return respond(' '.join(query.split()), params)
+
+    server.user_version = user_version
+    server.fetch = fetch
+    scope = {'type': 'http', 'method': 'GET', 'path': '/api/notes', 'headers': [],
+             'query_string': query_string.encode('latin-1')}
+    asyncio.run(server.list_notes(scope, send, 1))
+    return sent[0]['status'], json.loads(sent[1]['body'])
+
+@pytest.mark.parametrize('query_string', ['', 'cursor=', 'limit=', 'category=', 'cursor=&limit=1',
+                                          'category=&search=&fields='])
+def test_list_notes_matches_the_flask_route(app, fake_db, query_string):
+    fake_db.responder = respond
+    with app.test_client() as client:
+        with client.session_transaction() as session:
+            session['user_id'] = 1
+        response = client.get(f'/api/notes?{query_string}')
+
+    assert asgi_get(app, query_string) == (response.status_code, response.get_json())
@@ -0,0 +1,39 @@
+from assets import minify_css, minify_js
+
+def test_regex_after_keywords_is_kept_intact():
+    source = '''function f(s) {
+    if (typeof /x/ === 'object') {
+        void /  y  /;
+    }
+    switch (s) {
+        case /a  b/.test(s) && s:
+            throw /  c  //* not a comment */;
+    }
+    for (const m of /a  b/g.exec(s) || []) {}
+    return /  a\\/b  /.test(s);
+}
+'''
+    minified = minify_js(source)
+    for regex in ('typeof /x/', 'void /  y  /', 'case /a  b/', 'throw /  c  /', 'of /a  b/g',
+                  'return /  a\\/b  /'):
+        assert regex in minified
+    assert 'not a comment' not in minified
+
+def test_division_is_not_taken_for_a_regex():
+    source = '''const half = total / 2;   // halves
+const ratio = (a) /  b / c;
+const rate = obj.return / 2; /* kept apart */ const x = 'a  b';
+'''
+    assert minify_js(source) == '''const half = total / 2;
+const ratio = (a) / b / c;
+const rate = obj.return / 2; const x = 'a  b';
+'''
+
+def test_css_strings_are_kept():
+    source = '''/* header */
+.a  >  .b {
+    content: "x ;  y";
+    color: red;
+}
+'''
+    assert minify_css(source) == '.a>.b{content: "x ;  y";color: red}\n'
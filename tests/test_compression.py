@@ -0,0 +1,42 @@
+import gzip
+from werkzeug.test import Client
+from werkzeug.wrappers import Response
+import compression
+
+def make_client(body, content_type='text/html', length=True, min_size=500):
+    def app(environ, start_response):
+        headers = [('Content-Type', content_type)]
+        if length:
+            headers.append(('Content-Length', str(len(body))))
+        start_response('200 OK', headers)
+        return [body]
+    middleware = compression.CompressionMiddleware(app, ['text/html', 'application/json'], min_size=min_size,
+                                                   encodings=['gzip'])
+    return Client(middleware, Response)
+
+def get(client, **headers):
+    return client.get('/', headers={'Accept-Encoding': 'gzip', **headers})
+
+def test_large_responses_are_compressed():
+    body = b'<p>note</p>' * 100
+    response = get(make_client(body))
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert gzip.decompress(response.get_data()) == body
+
+def test_small_responses_vary_on_accept_encoding():
+    for length in (True, False):
+        response = get(make_client(b'<p>note</p>', length=length))
+        assert 'Content-Encoding' not in response.headers
+        assert response.headers['Vary'] == 'Accept-Encoding'
+        assert response.get_data() == b'<p>note</p>'
+
+def test_responses_vary_without_accept_encoding():
+    response = make_client(b'<p>note</p>' * 100).get('/')
+    assert 'Content-Encoding' not in response.headers
+    assert response.headers['Vary'] == 'Accept-Encoding'
+
+def test_other_types_pass_through():
+    response = get(make_client(b'\x89PNG' * 200, content_type='image/png'))
+    assert 'Content-Encoding' not in response.headers
+    assert 'Vary' not in response.headers
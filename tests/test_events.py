@@ -0,0 +1,42 @@
+import events
+
+def make_broker(**kwargs):
+    return events.EventBroker(events.LocalBackend(), buffer_size=3, **kwargs)
+
+def test_reconnecting_client_resumes_from_the_buffer():
+    broker = make_broker()
+    for version in range(1, 6):
+        broker.publish(1, version, {'version': version})
+    assert [event_id for event_id, _ in broker.events_since(1, 3)] == [4, 5]
+    assert broker.events_since(1, 5) == []
+    # Older than the buffer reaches back
+    assert broker.events_since(1, 1) is None
+
+def test_idle_users_buffers_are_dropped(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr('cache.time.monotonic', lambda: clock[0])
+    broker = make_broker(buffer_ttl=60)
+    broker.publish(1, 1, {})
+    broker.publish(2, 1, {})
+    clock[0] += 50
+    broker.publish(1, 2, {})
+    clock[0] += 20
+    assert broker.events_since(1, 1) == [(2, {})]
+    assert broker.events_since(2, 0) is None
+    assert len(broker._buffers) == 1
+
+def test_buffers_are_kept_for_the_most_recently_active_users():
+    broker = make_broker(buffer_users=2)
+    for user_id in (1, 2, 3):
+        broker.publish(user_id, 1, {})
+    assert broker.events_since(1, 0) is None
+    assert broker.events_since(3, 0) == [(1, {})]
+
+def test_feed_is_disabled_by_default(app, fake_db):
+    with app.test_client() as client:
+        with client.session_transaction() as session:
+            session['user_id'] = 1
+        response = client.get('/api/notes/stream')
+        assert response.status_code == 404
+        assert 'data-live-updates' not in client.get('/login').get_data(as_text=True)
+    assert 'event_broker' not in app.extensions
@@ -0,0 +1,23 @@
+import commands
+import db
+from benchmarks.common import seed_user
+
+def test_every_query_uses_an_index(mysql_app):
+    with mysql_app.test_request_context():
+        conn = db.get_db()
+        # Several users, so that filtering by user_id is selective
+        for total in (500, 1000, 2000):
+            user_id = seed_user(conn, total)
+        with conn.cursor() as cursor:
+            cursor.execute('SELECT id FROM category WHERE user_id = %s LIMIT 1', (user_id,))
+            category_id = cursor.fetchone()['id']
+            cursor.execute('SELECT id FROM note WHERE user_id = %s LIMIT 1', (user_id,))
+            note_id = cursor.fetchone()['id']
+            cursor.execute('ANALYZE TABLE user, category, note, tombstone, revoked_token')
+            cursor.fetchall()
+
+        plans = commands.explain_queries(user_id, note_id, category_id)
+
+        assert plans
+        assert commands.full_scans(plans) == []
+        db.close_db()
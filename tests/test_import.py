@@ -0,0 +1,63 @@
+import pymysql
+import pytest
+import db
+
+NOTE = {
+    'title': 'Imported', 'content': '', 'category': 'Work', 'is_todo': False, 'completed': False,
+    'importance': 'normal', 'color': 'blue', 'created_date': '2024-01-01 00:00:00',
+    'updated_date': '2024-01-01 00:00:00',
+}
+
+def test_failed_import_forgets_cached_category_ids(app, fake_db):
+    def respond(query, params):
+        if query.startswith('SELECT LAST_INSERT_ID() AS version'):
+            return [{'version': 2}]
+        if query.startswith('SELECT id FROM category WHERE user_id = %s AND id IN'):
+            return [{'id': 7}]
+        if query.startswith('INSERT INTO note'):
+            # The cached category was deleted by another process
+            raise pymysql.err.IntegrityError(1452, 'Cannot add or update a child row')
+        return []
+    fake_db.responder = respond
+
+    with app.test_request_context():
+        db._remember_categories(1, {'Work': 7})
+        with pytest.raises(pymysql.err.IntegrityError):
+            db.import_notes(1, [NOTE], {})
+        assert fake_db.rollbacks == 1
+        assert db._cached_category_ids(1) == {}
+
+def deleted_and_recreated(query, params):
+    """Responder for a database where category 7, 'Work', was replaced by category 9."""
+    if query.startswith('SELECT LAST_INSERT_ID() AS version'):
+        return [{'version': 2}]
+    if query.startswith('SELECT id FROM category WHERE user_id = %s AND id IN'):
+        return [{'id': 9}] if 9 in params else []
+    if query.startswith('SELECT id, name FROM category'):
+        return [{'id': 9, 'name': 'Work'}]
+    return 1
+
+def test_import_resolves_cached_categories_deleted_elsewhere(app, fake_db):
+    fake_db.responder = deleted_and_recreated
+    categories = {}
+
+    with app.test_request_context():
+        db._remember_categories(1, {'Work': 7})
+        db.import_notes(1, [NOTE], categories)
+        assert db._cached_category_ids(1) == {'Work': 9}
+
+    assert categories == {'Work': 9}
+    query, params = fake_db.statements[-1]
+    assert query.startswith('INSERT INTO note') and params[-3] == 9
+
+def test_note_write_upserts_cached_categories_deleted_elsewhere(app, fake_db):
+    fake_db.responder = deleted_and_recreated
+
+    with app.test_request_context():
+        db._remember_categories(1, {'Work': 7})
+        db.create_note('Note', '', None, False, 'normal', 'blue', 1, category_name='Work')
+
+    # The stale id was not used; the name was resolved again
+    assert fake_db.queries('INSERT INTO category')
+    query, params = fake_db.statements[-1]
+    assert query.startswith('INSERT INTO note') and params[-3] != 7
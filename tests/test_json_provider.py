@@ -0,0 +1,27 @@
+import json
+from datetime import datetime
+import pytest
+from app import create_app
+from tests.conftest import TestConfig
+import db
+import json_provider
+
+ROWS = db.as_records([('id',), ('title',), ('updated_date',)],
+                     [(1, 'a', datetime(2024, 1, 2, 3, 4, 5)), (2, 'b', None)])
+EXPECTED = [{'id': 1, 'title': 'a', 'updated_date': 'Tue, 02 Jan 2024 03:04:05 GMT'},
+            {'id': 2, 'title': 'b', 'updated_date': None}]
+
+@pytest.fixture(params=['', 'json_provider.FastJSONProvider', 'without orjson'])
+def json_app(request, monkeypatch):
+    class Config(TestConfig):
+        JSON_PROVIDER = request.param if request.param != 'without orjson' else 'json_provider.FastJSONProvider'
+    if request.param == 'without orjson':
+        monkeypatch.setattr(json_provider, 'orjson', None)
+    return create_app(Config)
+
+def test_records_are_written_as_objects(json_app):
+    assert json.loads(json_app.json.dumps(ROWS)) == EXPECTED
+    assert json.loads(json_app.json.dumps({'notes': ROWS, 'next_cursor': None})) == \
+        {'notes': EXPECTED, 'next_cursor': None}
+    with json_app.app_context():
+        assert json_app.json.response(ROWS).get_json() == EXPECTED
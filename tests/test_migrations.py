@@ -0,0 +1,29 @@
+import db
+import migrations
+from benchmarks.common import get_or_create_user
+
+def test_sequence_changes_numbers_each_users_rows(mysql_app):
+    with mysql_app.test_request_context():
+        conn = db.get_db()
+        users = [get_or_create_user(conn, name) for name in ('seq_a', 'seq_b')]
+        with conn.cursor() as cursor:
+            cursor.execute('UPDATE user SET data_version = 10 WHERE id = %s', (users[1],))
+            for user_id in users:
+                cursor.executemany('INSERT INTO category (name, user_id) VALUES (%s, %s)',
+                                   [(f'c{i}', user_id) for i in range(2)])
+                cursor.executemany(
+                    '''INSERT INTO note (title, content, created_date, updated_date, user_id) 
+                       VALUES (%s, '', NOW(), NOW(), %s)''',
+                    [(f'n{i}', user_id) for i in range(3)])
+            conn.commit()
+
+            migrations.sequence_changes(cursor, unsequenced_only=True)
+            conn.commit()
+
+            for user_id, start in zip(users, (0, 10)):
+                cursor.execute('SELECT change_seq FROM category WHERE user_id = %s ORDER BY id', (user_id,))
+                assert [row['change_seq'] for row in cursor.fetchall()] == [start + 1, start + 2]
+                cursor.execute('SELECT change_seq FROM note WHERE user_id = %s ORDER BY id', (user_id,))
+                assert [row['change_seq'] for row in cursor.fetchall()] == [start + 3, start + 4, start + 5]
+                assert db.get_user_version(user_id)[0] == start + 5
+        db.close_db()
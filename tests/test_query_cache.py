@@ -0,0 +1,117 @@
+import pytest
+import db
+from cache import MISSING, DictBackend, QueryCache, TTLCache
+
+NOTE = {
+    'title': 'Imported', 'content': '', 'category': 'Work', 'is_todo': False, 'completed': False,
+    'importance': 'normal', 'color': 'blue', 'created_date': '2024-01-01 00:00:00',
+    'updated_date': '2024-01-01 00:00:00',
+}
+
+# Each write path, and the cached namespaces it changes
+WRITES = {
+    'create': (lambda: db.create_note('New', '', None, False, 'normal', 'blue', 1), ['notes']),
+    'update': (lambda: db.update_note(1, 1, {'title': 'Changed'}), ['notes']),
+    'delete': (lambda: db.delete_note(1, 1), ['notes']),
+    'batch': (lambda: db.apply_note_batch(1, [{'op': 'complete', 'id': 1, 'completed': True}]), ['notes']),
+    'import': (lambda: db.import_notes(1, [NOTE], {}), ['notes', 'categories']),
+    'category delete': (lambda: db.delete_category(1, 1), ['notes', 'categories']),
+}
+
+READS = {
+    'notes': lambda: db.get_notes_by_user(1),
+    'categories': lambda: db.get_categories_by_user(1),
+}
+
+class Tables:
+    """One user's note and category rows, answering reads with their current names."""
+
+    def __init__(self):
+        self.name = 'before'
+
+    def __call__(self, query, params):
+        if query.startswith('SELECT LAST_INSERT_ID() AS version'):
+            return [{'version': 2}]
+        if query.startswith('SELECT') and 'FROM note' in query:
+            return [{'id': 1, 'version': 1, 'title': self.name}]
+        if query.startswith('SELECT') and 'FROM category' in query:
+            return [{'id': 1, 'name': 'Work', 'label': self.name}]
+        return 1
+
+def read(app, worker, namespace):
+    app.extensions['query_cache'] = worker
+    with app.test_request_context():
+        rows = READS[namespace]()
+        db.close_db()
+    return rows[0].get('title', rows[0].get('label'))
+
+def write(app, worker, run):
+    app.extensions['query_cache'] = worker
+    with app.test_request_context():
+        run()
+        db.close_db()
+
+@pytest.fixture
+def workers(app, fake_db):
+    """Two workers' query caches, sharing one DictBackend."""
+    app.config['QUERY_CACHE_ENABLED'] = True
+    fake_db.responder = Tables()
+    shared = DictBackend()
+    return [QueryCache(TTLCache(), shared=shared, ttl=60) for _ in range(2)]
+
+@pytest.mark.parametrize('name', WRITES)
+def test_writes_invalidate_every_worker(app, fake_db, workers, name):
+    run, namespaces = WRITES[name]
+    for worker in workers:
+        for namespace in READS:
+            assert read(app, worker, namespace) == 'before'
+    fake_db.responder.name = 'after'
+    # Served from the cache until a write invalidates it
+    assert read(app, workers[1], 'notes') == 'before'
+
+    write(app, workers[0], run)
+
+    for worker in workers:
+        for namespace in READS:
+            expected = 'after' if namespace in namespaces else 'before'
+            assert read(app, worker, namespace) == expected, (worker, namespace)
+
+def test_results_are_shared_between_workers(app, fake_db, workers):
+    assert read(app, workers[0], 'notes') == 'before'
+    fake_db.responder.name = 'after'
+    # The second worker's first lookup finds the first worker's result
+    assert read(app, workers[1], 'notes') == 'before'
+    assert workers[1].stats()['hits'] == 1
+
+def test_generations_are_bounded_and_expire(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr('cache.time.monotonic', lambda: clock[0])
+    local = QueryCache(TTLCache(maxsize=2), ttl=30)
+    shared = DictBackend()
+    sharing = QueryCache(TTLCache(maxsize=2), shared=shared, ttl=30)
+    for user_id in range(5):
+        for cache in (local, sharing):
+            cache.lookup('notes', user_id, ())
+    sharing.invalidate(1, 'notes')
+    assert len(local._generations) == 2
+
+    # Shared tokens outlive the entries stored under them, then expire
+    clock[0] += 31
+    assert shared.get('gen:notes:1') is not None
+    clock[0] += 300
+    assert shared.get('gen:notes:1') is None and shared.get('gen:notes:4') is None
+
+def test_expired_generation_starts_afresh(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr('cache.time.monotonic', lambda: clock[0])
+    cache = QueryCache(TTLCache(), shared=DictBackend(), ttl=30, generation_ttl=60)
+    _, key = cache.lookup('notes', 1, ())
+    cache.store(key, 'before')
+    clock[0] += 61
+    # A fresh token: the old result is no longer reachable
+    value, key = cache.lookup('notes', 1, ())
+    assert value is MISSING
+    cache.store(key, 'after')
+    assert cache.lookup('notes', 1, ())[0] == 'after'
+    cache.invalidate(1, 'notes')
+    assert cache.lookup('notes', 1, ())[0] is MISSING
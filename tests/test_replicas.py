@@ -0,0 +1,147 @@
+import pymysql
+import pytest
+from flask import g, session
+import db
+import replicas
+from tests.conftest import FakeConnection
+
+class FakePool:
+    """ConnectionPool stand-in handing out one connection."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.discarded = 0
+
+    def acquire(self):
+        return self.conn
+
+    def release(self, conn, discard=False):
+        self.discarded += discard
+
+    def close_all(self):
+        pass
+
+def replica_status(lag):
+    """Responder for a server replicating lag seconds behind (None: replication stopped)."""
+    def respond(query, params):
+        if query == 'SHOW REPLICA STATUS':
+            return [{'Seconds_Behind_Source': lag}]
+        return [{'id': 1, 'name': 'from replica'}]
+    return respond
+
+def no_replication_client(query, params):
+    if query == 'SHOW REPLICA STATUS':
+        raise pymysql.err.OperationalError(
+            1227, 'Access denied; you need (at least one of) the SUPER, REPLICATION CLIENT privilege(s)')
+    return []
+
+def make_replica(name, responder):
+    return replicas.Replica(name, FakePool(FakeConnection(responder)))
+
+@pytest.fixture
+def primary(app):
+    conn = FakeConnection(lambda query, params: [{'id': 1, 'name': 'from primary'}])
+    app.extensions['db_pool'] = FakePool(conn)
+    return conn
+
+@pytest.fixture
+def replica_set(app, primary):
+    app.config['DB_REPLICAS'] = ['r1', 'r2']
+    replica_set = replicas.ReplicaSet([make_replica('r1', replica_status(0)), make_replica('r2', replica_status(1))],
+                                      max_lag=5, check_interval=60)
+    app.extensions['db_replicas'] = replica_set
+    return replica_set
+
+def test_choose_round_robins_over_healthy_replicas(replica_set):
+    chosen = [replica_set.choose().name for _ in range(4)]
+    assert chosen == ['r1', 'r2', 'r1', 'r2']
+    assert replica_set.stats()['healthy'] == 2
+
+def test_lagging_replica_is_ejected_until_it_catches_up(replica_set):
+    lagging = replica_set.replicas[1]
+    lagging.pool.conn.responder = replica_status(30)
+    replica_set.check(lagging)
+    assert not lagging.healthy and lagging.lag == 30
+    assert {replica_set.choose().name for _ in range(4)} == {'r1'}
+
+    lagging.pool.conn.responder = replica_status(2)
+    replica_set.check(lagging)
+    assert lagging.healthy
+    assert replica_set.stats()['ejections'] == 1
+
+def test_stopped_replication_ejects(replica_set):
+    replica = replica_set.replicas[0]
+    replica.pool.conn.responder = replica_status(None)
+    replica_set.check(replica)
+    assert not replica.healthy and replica.error == 'replication is stopped'
+
+def test_replica_without_replication_client_privilege_is_ejected(replica_set):
+    replica = replica_set.replicas[0]
+    replica.pool.conn.responder = no_replication_client
+    replica_set.check(replica)
+    assert not replica.healthy
+    assert 'REPLICATION CLIENT' in replica.error
+    assert replica.pool.discarded == 1
+
+def test_reads_fall_back_to_the_primary_without_healthy_replicas(app, replica_set, primary):
+    for replica in replica_set.replicas:
+        replica.pool.conn.responder = no_replication_client
+        replica.checked_at = None
+    with app.test_request_context():
+        assert db.get_db(read=True, user_id=1) is primary
+    assert replica_set.stats()['fallback_reads'] == 1
+
+def test_reads_go_to_a_replica_and_writes_pin_the_user(app, replica_set, primary):
+    with app.test_request_context():
+        assert db.get_db(read=True, user_id=1) is replica_set.replicas[0].pool.conn
+        assert db.get_db() is primary
+        db._pin_to_primary(1)
+        # This request, and this user's requests in this process, now read the primary
+        assert db.get_db(read=True, user_id=1) is primary
+        db.close_db()
+    with app.test_request_context():
+        assert db.get_db(read=True, user_id=1) is primary
+        assert db.get_db(read=True, user_id=2) is not primary
+        db.close_db()
+
+def test_write_pins_expire(app, replica_set, primary, monkeypatch):
+    app.config['DB_READ_YOUR_WRITES'] = 5
+    clock = [1000.0]
+    monkeypatch.setattr('cache.time.monotonic', lambda: clock[0])
+    with app.test_request_context():
+        db._pin_to_primary(1)
+    clock[0] += 4
+    with app.test_request_context():
+        assert db._read_from_primary(1)
+    clock[0] += 2
+    with app.test_request_context():
+        assert not db._read_from_primary(1)
+
+def test_session_pin_expires(app, replica_set, primary, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('db.time.time', lambda: now[0])
+    with app.test_request_context():
+        session['user_id'] = 1
+        db._pin_to_primary(1)
+        until = session['_primary_until']
+    assert until == 1000.0 + app.config['DB_READ_YOUR_WRITES']
+    # Another worker, without the in-process pin, sees the session's deadline
+    with app.test_request_context():
+        session['_primary_until'] = until
+        assert db._read_from_primary(None)
+        now[0] = until + 1
+        assert not db._read_from_primary(None)
+
+def test_replica_reads_are_not_stored_in_the_query_cache(app, replica_set, primary):
+    app.config['QUERY_CACHE_ENABLED'] = True
+    with app.test_request_context():
+        assert db.get_categories_by_user(1)[0]['name'] == 'from replica'
+        db.close_db()
+    with app.test_request_context():
+        g.db_primary_only = True
+        # Not served the replica's result from the cache
+        assert db.get_categories_by_user(1)[0]['name'] == 'from primary'
+        db.close_db()
+    with app.test_request_context():
+        assert db.get_categories_by_user(1)[0]['name'] == 'from primary'
+        db.close_db()
@@ -0,0 +1,122 @@
+import re
+import pytest
+import db
+
+class SyncTables:
+    """In-memory note, category and tombstone rows answering the queries of db.get_changes()."""
+
+    def __init__(self, data_version):
+        self.data_version = data_version
+        self.rows = {'note': [], 'category': [], 'tombstone': []}
+
+    def add(self, table, change_seq, count, entity=None):
+        for _ in range(count):
+            row_id = sum(len(rows) for rows in self.rows.values()) + 1
+            if table == 'tombstone':
+                self.rows[table].append({'entity': entity, 'entity_id': row_id, 'user_id': 1,
+                                         'change_seq': change_seq})
+            else:
+                self.rows[table].append({'id': row_id, 'user_id': 1, 'change_seq': change_seq})
+
+    def _select(self, subquery, params):
+        """Rows of the table a _change_range() condition selects, given its 7 params."""
+        table = re.search(r'FROM (\w+)', subquery).group(1)
+        entity = re.search(r"entity = '(\w+)'", subquery)
+        id_column = 'entity_id' if table == 'tombstone' else 'id'
+        user_id, seq, _, low_id, end_seq, _, high_id = params
+        return [row for row in self.rows[table]
+                if row['user_id'] == user_id and (entity is None or row['entity'] == entity.group(1))
+                and (row['change_seq'] > seq or (row['change_seq'] == seq and row[id_column] > low_id))
+                and (row['change_seq'] < end_seq or (row['change_seq'] == end_seq and row[id_column] <= high_id))]
+
+    def __call__(self, query, params):
+        if query.startswith('SELECT data_version'):
+            return [{'data_version': self.data_version}]
+        if ' UNION ALL ' in query or query.startswith('(SELECT change_seq'):
+            keys = []
+            params = list(params)
+            for subquery in query.split(' UNION ALL '):
+                kind = int(re.search(r'(\d+) AS kind', subquery).group(1))
+                id_column = 'entity_id' if 'FROM tombstone' in subquery else 'id'
+                rows = sorted(self._select(subquery, params[:7]), key=lambda row: (row['change_seq'], row[id_column]))
+                keys += [{'change_seq': row['change_seq'], 'kind': kind, 'id': row[id_column]}
+                         for row in rows[:params[7]]]
+                params = params[8:]
+            keys.sort(key=lambda key: (key['change_seq'], key['kind'], key['id']))
+            return keys[:params[0]]
+        if query.startswith('SELECT'):
+            return self._select(query, params)
+        return []
+
+def sync_all(tables, limit, since=0):
+    """Follow get_changes() pages until no more remain; returns the responses."""
+    pages = []
+    cursor = None
+    while True:
+        page = db.get_changes(1, since, limit, cursor)
+        pages.append(page)
+        assert len(page['notes']) + len(page['categories']) + len(page['deleted']['notes']) + \
+            len(page['deleted']['categories']) <= limit
+        if not page['more']:
+            return pages
+        assert len(pages) < 100, 'sync does not terminate'
+        since, cursor = page['seq'], page['cursor']
+
+@pytest.fixture
+def tables(fake_db):
+    fake_db.responder = SyncTables(data_version=7)
+    return fake_db.responder
+
+def test_pages_within_one_change_seq(tables):
+    # One write (e.g. an import batch) changed more rows than fit in a page
+    tables.add('category', 5, 3)
+    tables.add('note', 5, 1200)
+    tables.add('note', 6, 10)
+    tables.add('note', 7, 2)
+
+    pages = sync_all(tables, limit=500)
+
+    assert len(pages) == 3
+    notes = [note['id'] for page in pages for note in page['notes']]
+    assert len(notes) == len(set(notes)) == 1212
+    assert sum(len(page['categories']) for page in pages) == 3
+    # Cursors advance strictly, seq never goes back and ends at data_version
+    positions = [db.decode_change_cursor(page['cursor']) for page in pages[:-1]]
+    assert positions == sorted(positions) and len(set(map(tuple, positions))) == len(positions)
+    seqs = [page['seq'] for page in pages]
+    assert seqs == sorted(seqs) and seqs[-1] == 7
+
+def test_unnumbered_rows_do_not_repeat_the_first_page(tables):
+    # Rows written outside db.py all have change_seq 0
+    tables.add('note', 0, 1100)
+
+    pages = sync_all(tables, limit=500)
+
+    assert [len(page['notes']) for page in pages] == [500, 500, 100]
+    assert pages[-1]['seq'] == 7
+
+def test_seq_moves_forward_when_rows_have_their_own_seq(tables):
+    tables.data_version = 1200
+    for seq in range(1, 1201):
+        tables.add('note', seq, 1)
+
+    pages = sync_all(tables, limit=500)
+
+    assert [page['seq'] for page in pages] == [500, 1000, 1200]
+
+def test_incremental_sync_includes_deletions(tables):
+    tables.add('note', 3, 5)
+    tables.add('note', 6, 2)
+    tables.add('tombstone', 7, 1, entity='note')
+    tables.add('tombstone', 7, 1, entity='category')
+
+    page = db.get_changes(1, 5, 500)
+
+    assert page['seq'] == 7 and not page['more'] and page['cursor'] is None
+    assert [note['id'] for note in page['notes']] == [6, 7]
+    assert page['deleted'] == {'notes': [8], 'categories': [9]}
+
+def test_invalid_cursors_are_rejected():
+    for cursor in ('!!', db.encode_cursor([1, 2]), db.encode_cursor([1, 9, 3]), db.encode_cursor([1, 'a', 3])):
+        with pytest.raises(ValueError):
+            db.decode_change_cursor(cursor)
@@ -0,0 +1,31 @@
+from datetime import datetime
+import db
+
+def todo(note_id, title):
+    return {'id': note_id, 'title': title, 'preview': '', 'importance': 'normal', 'importance_rank': 1,
+            'completed': 0, 'category_name': None, 'version': 1, 'updated_date': datetime(2024, 1, note_id)}
+
+def respond(query, params):
+    if query.startswith('SELECT') and 'FROM note' in query:
+        # The page after a cursor holds the second to-do
+        return [todo(2, 'Second')] if len(params) > 3 else [todo(1, 'First'), todo(2, 'Second')]
+    return []
+
+def test_more_todos_returns_the_next_items_as_a_fragment(app, fake_db):
+    app.config['TODOS_PAGE_SIZE'] = 1
+    fake_db.responder = respond
+    with app.test_client() as client:
+        with client.session_transaction() as session:
+            session['user_id'] = 1
+        page = client.get('/todos').get_data(as_text=True)
+        assert 'First' in page and 'Second' not in page
+        assert 'id="load-more"' in page and 'data-target=".todos-list"' in page
+
+        cursor = db.encode_cursor([1, '2024-01-01 00:00:00', 1])
+        response = client.get(f'/todos?cursor={cursor}&fragment=1')
+
+    html = response.get_data(as_text=True)
+    assert 'Second' in html and 'First' not in html
+    # Only the items, to append to the list on the page
+    assert '<html' not in html and 'todos-list' not in html
+    assert 'X-Next-Cursor' not in response.headers
@@ -0,0 +1,39 @@
+import pytest
+import tokens
+
+@pytest.fixture
+def revocations(fake_db):
+    """Revoked token ids, as the revoked_token table of fake_db holds them."""
+    revoked = set()
+
+    def respond(query, params):
+        if query.startswith('SELECT jti FROM revoked_token'):
+            return [{'jti': jti} for jti in revoked]
+        if query.startswith('INSERT IGNORE INTO revoked_token'):
+            if params[0] in revoked:
+                return 0
+            revoked.add(params[0])
+            return 1
+        return 0
+
+    fake_db.responder = respond
+    return revoked
+
+def test_refresh_rotates_the_refresh_token(app, revocations):
+    with app.test_request_context():
+        pair = tokens.issue_tokens(1)
+        new_pair = tokens.refresh_tokens(pair['refresh_token'])
+        assert tokens.load_token(new_pair['access_token'], tokens.ACCESS)['uid'] == 1
+        with pytest.raises(tokens.TokenError):
+            tokens.refresh_tokens(pair['refresh_token'])
+
+def test_concurrent_refresh_with_one_token_succeeds_once(app, revocations, monkeypatch):
+    with app.test_request_context():
+        pair = tokens.issue_tokens(1)
+        # Both requests pass load_token before either revocation is recorded
+        payload = tokens.load_token(pair['refresh_token'], tokens.REFRESH)
+        monkeypatch.setattr(tokens, 'load_token', lambda token, kind: dict(payload))
+
+        assert tokens.refresh_tokens(pair['refresh_token'])['refresh_token']
+        with pytest.raises(tokens.TokenError):
+            tokens.refresh_tokens(pair['refresh_token'])
@@ -0,0 +1,125 @@
+import threading
+import time
+import uuid
+from datetime import timedelta
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
+from flask import current_app
+import db
+import logging
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+ACCESS = 'access'
+REFRESH = 'refresh'
+
+class TokenError(Exception):
+    """Raised for a token that is forged, expired, revoked or of the wrong kind."""
+
+class RevocationList:
+    """In-process copy of the revoked token ids, reloaded every ``ttl`` seconds.
+
+    Between reloads, membership checks are a set lookup; tokens revoked by
+    this process are added immediately, those revoked by other processes are
+    seen after the next reload.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._jtis = frozenset()
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def stale(self):
+        return self._loaded_at is None or time.monotonic() - self._loaded_at >= self.ttl
+
+    def replace(self, jtis):
+        with self._lock:
+            self._jtis = frozenset(jtis)
+            self._loaded_at = time.monotonic()
+
+    def add(self, jti):
+        with self._lock:
+            self._jtis = self._jtis | {jti}
+
+    def __contains__(self, jti):
+        return jti in self._jtis
+
+def get_revocation_list():
+    """Get the app's RevocationList without reloading it."""
+    revocations = current_app.extensions.get('token_revocations')
+    if revocations is None:
+        revocations = current_app.extensions.setdefault(
+            'token_revocations', RevocationList(current_app.config['API_REVOCATION_REFRESH'])
+        )
+    return revocations
+
+def _serializer():
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt='notesmart-api-token')
+
+def _max_age(kind):
+    if kind == ACCESS:
+        return current_app.config['API_ACCESS_TOKEN_TTL']
+    return current_app.config['API_REFRESH_TOKEN_TTL']
+
+def issue_tokens(user_id):
+    """Create a new access/refresh token pair for a user."""
+    serializer = _serializer()
+    return {
+        'access_token': serializer.dumps({'uid': user_id, 'typ': ACCESS, 'jti': uuid.uuid4().hex}),
+        'refresh_token': serializer.dumps({'uid': user_id, 'typ': REFRESH, 'jti': uuid.uuid4().hex}),
+        'token_type': 'Bearer',
+        'expires_in': _max_age(ACCESS),
+        'refresh_expires_in': _max_age(REFRESH),
+    }
+
+def load_token(token, kind):
+    """Check a token's signature, age, kind and revocation; returns its payload.
+
+    The payload holds uid, typ, jti and exp (naive UTC expiry). Access
+    tokens are checked against the cached revocation list (skipped when
+    API_REVOCATION_REFRESH is 0) and need no database query between
+    reloads; refresh tokens always see the current list.
+    """
+    max_age = _max_age(kind)
+    try:
+        payload, issued_at = _serializer().loads(token, max_age=max_age, return_timestamp=True)
+    except SignatureExpired:
+        raise TokenError('Token has expired')
+    except BadSignature:
+        raise TokenError('Invalid token')
+    if not isinstance(payload, dict) or payload.get('typ') != kind:
+        raise TokenError('Invalid token')
+
+    revocations = get_revocation_list()
+    if kind == REFRESH or (revocations.ttl and revocations.stale()):
+        revocations.replace(db.get_revoked_token_ids())
+    if (kind == REFRESH or revocations.ttl) and payload['jti'] in revocations:
+        raise TokenError('Token has been revoked')
+
+    payload['exp'] = (issued_at + timedelta(seconds=max_age)).replace(tzinfo=None)
+    return payload
+
+def revoke(payload):
+    """Revoke a token given its payload from load_token().
+
+    Returns False if the token had already been revoked, e.g. by a
+    concurrent request.
+    """
+    revoked = db.revoke_token(payload['jti'], payload['uid'], payload['exp'])
+    get_revocation_list().add(payload['jti'])
+    logger.debug("Revoked %s token %s of user %s", payload['typ'], payload['jti'], payload['uid'])
+    return bool(revoked)
+
+def refresh_tokens(refresh_token):
+    """Exchange a refresh token for a new token pair; the old refresh token is revoked.
+
+    Each refresh token is good for one exchange: of concurrent requests
+    presenting the same token, only the one whose revocation the database
+    records gets a new pair.
+    """
+    payload = load_token(refresh_token, REFRESH)
+    if not revoke(payload):
+        logger.warning("Refresh token %s of user %s was used twice", payload['jti'], payload['uid'])
+        raise TokenError('Token has been revoked')
+    return issue_tokens(payload['uid'])
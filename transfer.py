@@ -0,0 +1,241 @@
+import csv
+import io
+import json
+import time
+from datetime import datetime
+import db
+import logging
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# Note fields in exports (and in CSV column order); imports ignore id
+EXPORT_FIELDS = ('id', 'title', 'content', 'category', 'is_todo', 'completed',
+                 'importance', 'color', 'created_date', 'updated_date')
+
+# Supported formats and their content types
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Column sizes from schema.sql
+MAX_TITLE_LENGTH = 100
+MAX_CATEGORY_LENGTH = 64
+MAX_ATTRIBUTE_LENGTH = 20
+
+_TRUE = {'1', 'true', 't', 'yes', 'y'}
+_FALSE = {'', '0', 'false', 'f', 'no', 'n'}
+
+class ImportFailed(Exception):
+    """Raised when an import stops part way; batches before it stay imported."""
+
+    def __init__(self, message, report):
+        super().__init__(message)
+        self.report = report
+
+def format_for(name=None, content_type=None, filename=None):
+    """Pick an import/export format from an explicit name, content type or file name.
+
+    Returns None if none of them identifies a supported format.
+    """
+    if name:
+        return name if name in FORMATS else None
+    for fmt, mimetype in FORMATS.items():
+        if content_type and content_type.split(';')[0].strip() == mimetype:
+            return fmt
+        if filename and filename.lower().endswith('.' + fmt):
+            return fmt
+    return None
+
+# Export
+def export_record(row):
+    """Turn a row from db.iter_export_notes into an export record."""
+    return {
+        'id': row['id'],
+        'title': row['title'],
+        'content': row['content'] or '',
+        'category': row['category_name'],
+        'is_todo': bool(row['is_todo']),
+        'completed': bool(row['completed']),
+        'importance': row['importance'],
+        'color': row['color'],
+        'created_date': row['created_date'].strftime(DATE_FORMAT),
+        'updated_date': row['updated_date'].strftime(DATE_FORMAT),
+    }
+
+def export_chunks(batches, fmt):
+    """Encode batches of export rows, yielding one string per batch."""
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, EXPORT_FIELDS)
+        writer.writeheader()
+        yield buffer.getvalue()
+        for rows in batches:
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(export_record(row) for row in rows)
+            yield buffer.getvalue()
+    else:
+        for rows in batches:
+            yield ''.join(
+                json.dumps(export_record(row), ensure_ascii=False, separators=(',', ':')) + '\n'
+                for row in rows
+            )
+
+# Import
+def _parse_bool(value, field):
+    if isinstance(value, bool) or value is None:
+        return bool(value)
+    if isinstance(value, int):
+        return value != 0
+    text = str(value).strip().lower()
+    if text in _TRUE:
+        return True
+    if text in _FALSE:
+        return False
+    raise ValueError(f'{field} must be true or false')
+
+def _parse_date(value, field):
+    if isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+        except ValueError:
+            raise ValueError(f'{field} must be a date like 2024-01-31 12:00:00')
+        if parsed.tzinfo is not None:
+            # Stored dates are server local time, like those of new notes
+            parsed = parsed.astimezone().replace(tzinfo=None)
+        return parsed.strftime(DATE_FORMAT)
+    raise ValueError(f'{field} must be a date like 2024-01-31 12:00:00')
+
+def _parse_text(record, field, default, max_length):
+    value = record.get(field)
+    if value is None or value == '':
+        return default
+    value = str(value)
+    if max_length and len(value) > max_length:
+        raise ValueError(f'{field} must be at most {max_length} characters')
+    return value
+
+def _parse_importance(value):
+    if value is None or value == '':
+        return 'normal'
+    if not isinstance(value, str) or value not in db.IMPORTANCE_RANKS:
+        raise ValueError(f"importance must be one of {', '.join(db.IMPORTANCE_LABELS)}")
+    return value
+
+def parse_import_record(record, now):
+    """Validate one imported record and normalize it for db.import_notes.
+
+    now is used for missing dates. Raises ValueError describing the first
+    problem found.
+    """
+    if not isinstance(record, dict):
+        raise ValueError('Record must be an object')
+    title = _parse_text(record, 'title', None, MAX_TITLE_LENGTH)
+    if not title:
+        raise ValueError('Title is required')
+
+    created_date = now
+    if record.get('created_date'):
+        created_date = _parse_date(record['created_date'], 'created_date')
+    updated_date = created_date
+    if record.get('updated_date'):
+        updated_date = _parse_date(record['updated_date'], 'updated_date')
+
+    return {
+        'title': title,
+        'content': _parse_text(record, 'content', '', None),
+        'category': _parse_text(record, 'category', None, MAX_CATEGORY_LENGTH),
+        'is_todo': _parse_bool(record.get('is_todo'), 'is_todo'),
+        'completed': _parse_bool(record.get('completed'), 'completed'),
+        'importance': _parse_importance(record.get('importance')),
+        'color': _parse_text(record, 'color', 'blue', MAX_ATTRIBUTE_LENGTH),
+        'created_date': created_date,
+        'updated_date': updated_date,
+    }
+
+def _raw_records(stream, fmt):
+    """Yield (line number, record or ValueError) from a binary stream, one at a time."""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='' if fmt == 'csv' else None)
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line_number, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError:
+            yield line_number, ValueError('Invalid JSON')
+
+def read_notes(stream, fmt):
+    """Parse an NDJSON or CSV upload incrementally.
+
+    Yields (line number, note, error) for each record: a note for
+    db.import_notes, or an error message if the record is invalid.
+    Malformed UTF-8 raises UnicodeDecodeError.
+    """
+    now = datetime.now().strftime(DATE_FORMAT)
+    for line_number, record in _raw_records(stream, fmt):
+        if isinstance(record, ValueError):
+            yield line_number, None, str(record)
+            continue
+        try:
+            note = parse_import_record(record, now)
+        except ValueError as e:
+            yield line_number, None, str(e)
+            continue
+        yield line_number, note, None
+
+def run_import(user_id, stream, fmt, batch_size=500, max_errors=100):
+    """Import notes from an NDJSON or CSV stream in batches of batch_size.
+
+    Invalid records are skipped and the first max_errors of them listed.
+    Each batch is committed on its own. Returns a report of the counts and
+    throughput; raises ImportFailed (carrying the report so far) if the
+    upload cannot be read or a batch fails.
+    """
+    report = {'imported': 0, 'skipped': 0, 'categories_created': 0, 'batches': 0, 'errors': []}
+    categories = {}
+    batch = []
+    started = time.perf_counter()
+
+    def flush():
+        report['categories_created'] += db.import_notes(user_id, batch, categories)
+        report['imported'] += len(batch)
+        report['batches'] += 1
+        batch.clear()
+
+    line_number = 0
+    try:
+        for line_number, note, error in read_notes(stream, fmt):
+            if error:
+                report['skipped'] += 1
+                if len(report['errors']) < max_errors:
+                    report['errors'].append({'line': line_number, 'error': error})
+                continue
+            batch.append(note)
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise ImportFailed(f'Unreadable {fmt} after line {line_number}: {e}', _finish(report, started))
+    except Exception as e:
+        raise ImportFailed(f'Import failed after line {line_number}', _finish(report, started)) from e
+
+    _finish(report, started)
+    logger.info("Imported %s notes for user %s in %.2fs (%s notes/s, %s skipped)",
+                report['imported'], user_id, report['seconds'], report['notes_per_second'], report['skipped'])
+    return report
+
+def _finish(report, started):
+    seconds = time.perf_counter() - started
+    report['seconds'] = round(seconds, 3)
+    report['notes_per_second'] = round(report['imported'] / seconds) if seconds > 0 else 0
+    return report